@@ -1,2 +1,3 @@
-from .rnaindel_lib import *
-from .bambino_lib import *
+from .lazy_import import lazy_exports as _lazy_exports
+
+_lazy_exports(globals(), [".rnaindel_lib", ".bambino_lib"])
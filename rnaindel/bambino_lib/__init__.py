@@ -1 +1,3 @@
-from .bambino import *
+from ..lazy_import import lazy_exports as _lazy_exports
+
+_lazy_exports(globals(), [".bambino"])
@@ -1,23 +1,261 @@
 #!/usr/bin/env python3
 
 import os
+import re
 import sys
 import shlex
+import pysam
+import tempfile
+import threading
 import subprocess
 from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+heap_size = re.compile(r"^([0-9]+)([kKmMgG]?)$")
+heap_units = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
 
-def bambino(bam, fasta, output_file, heap_memory="6000m"):
+# keep each JVM usable: fewer JVMs run in parallel if the heap is small
+min_shard_heap_mb = 1000
 
+
+def bambino(bam, fasta, output_file, heap_memory="6000m", num_of_processes=1):
+    """Call variants by Bambino
+
+    With num_of_processes > 1, one JVM runs per chromosome shard in parallel,
+    each with heap_memory / num_of_processes of heap (see parallel_jvms).
+    Shard outputs are concatenated in the order of chromosomes in the BAM header.
+
+    Args:
+        bam (str): path to bam
+        fasta (str): path to fasta
+        output_file (str): Bambino output file
+        heap_memory (str): maximum heap space in total
+        num_of_processes (int): number of JVMs run in parallel
+    Returns:
+        None: output_file will be written out
+    """
+    set_classpath()
+    shards = shard_plan(bam, heap_memory, num_of_processes)
+
+    if len(shards) == 1:
+        cmd_str = bambino_command(bam, fasta, output_file, heap_memory)
+        stdout, stderr, return_code = run_shell_command(cmd_str)
+        exit_on_failure(stderr, return_code)
+    else:
+        with tempfile.TemporaryDirectory() as shard_dir:
+            shard_outputs = [
+                os.path.join(shard_dir, "bambino.{}.txt".format(i))
+                for i in range(len(shards))
+            ]
+            cmds = [
+                bambino_command(bam, fasta, out, shard_heap, chr=chr)
+                for (chr, shard_heap, mapped), out in zip(shards, shard_outputs)
+            ]
+
+            num_of_jvms = parallel_jvms(heap_memory, num_of_processes)
+            with ThreadPoolExecutor(max_workers=num_of_jvms) as executor:
+                futures = {
+                    i: executor.submit(run_shell_command, cmds[i])
+                    for i in largest_first(shards)
+                }
+                for i in range(len(shards)):
+                    stdout, stderr, return_code = futures[i].result()
+                    exit_on_failure(stderr, return_code)
+
+            concatenate_outputs(shard_outputs, output_file)
+
+    print("indel calling completed successfully.", file=sys.stderr)
+
+
+def bambino_stream(bam, fasta, parser, heap_memory="6000m", num_of_processes=1):
+    """Call variants by Bambino and parse the output while calling
+
+    Each JVM writes to a named pipe read by parser in a separate thread,
+    so no output file is written and the output is never held in full.
+    Falls back to a temporary file where named pipes are not available.
+
+    Args:
+        bam (str): path to bam
+        fasta (str): path to fasta
+        parser (function): takes an iterable of output lines (including
+                           the header line) and returns the parsed result
+        heap_memory (str): maximum heap space in total
+        num_of_processes (int): number of JVMs run in parallel
+    Returns:
+        results (list): parser results for shards in the order of
+                        chromosomes in the BAM header
+    """
+    shards = shard_plan(bam, heap_memory, num_of_processes)
+    num_of_jvms = parallel_jvms(heap_memory, num_of_processes)
+    results = dict(bambino_shards(shards, bam, fasta, parser, num_of_jvms))
+
+    return [results[chr] for chr, shard_heap, mapped in shards]
+
+
+def bambino_shards(shards, bam, fasta, parser, num_of_processes=1):
+    """Run Bambino on the shards and yield parsed outputs as shards complete
+
+    JVMs are started on the first iteration.
+
+    Args:
+        shards (list): see shard_plan
+        bam (str): path to bam
+        fasta (str): path to fasta
+        parser (function): see bambino_stream
+        num_of_processes (int): number of JVMs run in parallel
+    Yields:
+        chr (str): chromosome of the shard, None for the whole bam
+        result (any): parser result for the shard
+    """
+    set_classpath()
+
+    run_shard = partial(run_streaming_shard, bam=bam, fasta=fasta, parser=parser)
+    # the pipes are removed even if a shard fails or the caller stops early
+    with tempfile.TemporaryDirectory() as shard_dir:
+        with ThreadPoolExecutor(max_workers=num_of_processes) as executor:
+            futures = {}
+            for i in largest_first(shards):
+                chr, shard_heap, mapped = shards[i]
+                output = os.path.join(shard_dir, "bambino.{}".format(i))
+                futures[executor.submit(run_shard, output, chr, shard_heap)] = chr
+
+            for future in as_completed(futures):
+                stderr, return_code, result = future.result()
+                exit_on_failure(stderr, return_code)
+                yield futures[future], result
+
+    print("indel calling completed successfully.", file=sys.stderr)
+
+
+def run_streaming_shard(output, chr, heap_memory, bam, fasta, parser):
+    """Run Bambino on a shard with its output read by parser
+
+    Args:
+        output (str): path for the named pipe (or temporary file)
+        chr (str): chromosome of the shard, None for the whole bam
+        heap_memory (str): maximum heap space of the JVM
+        bam, fasta (str): paths to bam and fasta
+        parser (function): see bambino_stream
+    Returns:
+        stderr (str), return_code (int), result (any): result of parser
+    """
+    cmd_str = bambino_command(bam, fasta, output, heap_memory, chr=chr)
+
+    if not hasattr(os, "mkfifo"):
+        stdout, stderr, return_code = run_shell_command(cmd_str)
+        result = None
+        if return_code == 0:
+            with open(output) as f:
+                result = parser(f)
+        return stderr, return_code, result
+
+    os.mkfifo(output)
+
+    return run_with_pipe(cmd_str, output, parser)
+
+
+def run_with_pipe(cmd_str, pipe, parser):
+    """Run a command writing to the named pipe read by parser
+
+    Both ends of the pipe are opened here, so the reader neither waits for
+    the command to open the pipe nor sees the end of the output before the
+    command exits (even if the command exits without opening the pipe).
+
+    Args:
+        cmd_str (str): command writing to pipe
+        pipe (str): path to the named pipe
+        parser (function): see bambino_stream
+    Returns:
+        stderr (str), return_code (int), result (any): result of parser
+    """
+    read_fd = os.open(pipe, os.O_RDONLY | os.O_NONBLOCK)
+    os.set_blocking(read_fd, True)
+    write_fd = os.open(pipe, os.O_WRONLY)
+
+    received = {}
+    reader = threading.Thread(target=read_pipe, args=(read_fd, parser, received))
+    reader.start()
+    try:
+        stdout, stderr, return_code = run_shell_command(cmd_str)
+    finally:
+        os.close(write_fd)
+        reader.join()
+
+    if "error" in received and return_code == 0:
+        raise received["error"]
+
+    return stderr, return_code, received.get("result")
+
+
+def read_pipe(fd, parser, received):
+    with os.fdopen(fd) as f:
+        try:
+            received["result"] = parser(f)
+        except Exception as e:
+            received["error"] = e
+            # keep draining so that the writer does not block
+            for line in f:
+                pass
+
+
+def set_classpath():
     # Add Bambino home dir to CLASSPATH
     bambino_home = os.path.dirname(os.path.realpath(__file__))
     try:
         classpath = os.environ["CLASSPATH"]
-        os.environ["CLASSPATH"] = "{}/*:{}".format(bambino_home, classpath)
+        if bambino_home not in classpath:
+            os.environ["CLASSPATH"] = "{}/*:{}".format(bambino_home, classpath)
     except KeyError:
         os.environ["CLASSPATH"] = "{}/*".format(bambino_home)
 
-    # Unpaired Bambino command
+
+def shard_plan(bam, heap_memory, num_of_processes):
+    """Shards run in parallel
+
+    Args:
+        bam (str): path to bam
+        heap_memory (str): maximum heap space in total
+        num_of_processes (int): number of JVMs run in parallel
+    Returns:
+        shards (list): [(chr (str), heap_memory (str), mapped reads (int))]
+                       in the header order
+                       [(None, heap_memory, 0)] for a single whole-bam run
+    """
+    num_of_jvms = parallel_jvms(heap_memory, num_of_processes)
+    if num_of_jvms < num_of_processes:
+        print(
+            "{} of heap space: {} callers run in parallel.".format(
+                heap_memory, num_of_jvms
+            ),
+            file=sys.stderr,
+        )
+
+    shards = chromosome_shards(bam) if num_of_jvms > 1 else []
+    if len(shards) < 2:
+        return [(None, heap_memory, 0)]
+
+    shard_heap = split_heap_memory(heap_memory, num_of_jvms)
+
+    return [(chr, shard_heap, mapped) for chr, mapped in shards]
+
+
+def largest_first(shards):
+    """Submission order to balance the load: the largest shards first"""
+    return sorted(range(len(shards)), key=lambda i: -shards[i][2])
+
+
+def bambino_command(bam, fasta, output_file, heap_memory, chr=None):
+    """Unpaired Bambino command
+
+    Args:
+        bam (str): path to bam
+        fasta (str): path to fasta
+        output_file (str): Bambino output file
+        heap_memory (str): maximum heap space
+        chr (str): restrict calling to the chromosome if specified
+    Returns:
+        cmd_str (str)
+    """
     cmd_str = (
         "java -Xmx{} Ace2.SAMStreamingSNPFinder -of {} -fasta {} -min-mapq 1 "
         "-optional-tags XT!=R -bam {} -tn T -min-quality 20 "
@@ -30,13 +268,98 @@ def bambino(bam, fasta, output_file, heap_memory="6000m"):
             heap_memory, output_file, fasta, bam
         )
     )
-    stdout, stderr, return_code = run_shell_command(cmd_str)
+    if chr:
+        cmd_str += " -chr {}".format(chr)
+
+    return cmd_str
+
+
+def exit_on_failure(stderr, return_code):
     if return_code != 0:
         print("Failed while calling indels.", file=sys.stderr)
         print(stderr, file=sys.stderr)
         sys.exit(return_code)
-    else:
-        print("indel calling completed successfully.", file=sys.stderr)
+
+
+def chromosome_shards(bam):
+    """Chromosomes with mapped reads
+
+    Args:
+        bam (str): path to bam (indexed)
+    Returns:
+        shards (list): [(chr (str), mapped reads (int))] in the header order
+    """
+    bam_data = pysam.AlignmentFile(bam)
+    try:
+        stats = bam_data.get_index_statistics()
+    except ValueError:
+        # no index available: call over the whole bam
+        return []
+    finally:
+        bam_data.close()
+
+    return [(stat.contig, stat.mapped) for stat in stats if stat.mapped > 0]
+
+
+def parallel_jvms(heap_memory, num_of_processes):
+    """Number of JVMs run in parallel within heap_memory in total
+
+    Args:
+        heap_memory (str): java -Xmx value such as '6000m' or '6g'
+        num_of_processes (int)
+    Returns:
+        num_of_jvms (int): num_of_processes, or fewer to give each JVM
+                           min_shard_heap_mb or more
+    """
+    m = heap_size.match(heap_memory)
+    if not m:
+        return num_of_processes
+
+    size_mb = int(m.group(1)) * heap_units[m.group(2).lower()] // (1024 * 1024)
+
+    return max(min(num_of_processes, size_mb // min_shard_heap_mb), 1)
+
+
+def split_heap_memory(heap_memory, num_of_processes):
+    """Divide heap space among parallel JVMs
+
+    Args:
+        heap_memory (str): java -Xmx value such as '6000m' or '6g'
+        num_of_processes (int)
+    Returns:
+        shard_heap (str): in MB, such as '1500m'
+    """
+    m = heap_size.match(heap_memory)
+    if not m:
+        return heap_memory
+
+    size = int(m.group(1)) * heap_units[m.group(2).lower()]
+    shard_size = size // num_of_processes // (1024 * 1024)
+
+    return "{}m".format(shard_size)
+
+
+def concatenate_outputs(shard_outputs, output_file):
+    """Concatenate Bambino outputs with the header line written once
+
+    Args:
+        shard_outputs (list): paths to shard outputs in order
+        output_file (str): path to the concatenated output
+    Returns:
+        None
+    """
+    header_written = False
+    with open(output_file, "w") as out:
+        for shard_output in shard_outputs:
+            if not os.path.isfile(shard_output):
+                continue
+            with open(shard_output) as f:
+                for line in f:
+                    if line.startswith("NormalSample\t"):
+                        if header_written:
+                            continue
+                        header_written = True
+                    out.write(line)
 
 
 def run_shell_command(command_string):
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Packages exporting the names of their submodules on first access
+
+Importing rnaindel should not load pandas, numpy and pysam: 'rnaindel -h',
+'--version' and argument errors return without them. The packages
+therefore export the names of their submodules, as by
+'from .submodule import *' in the given order, when a name not yet in
+the package is first accessed (PEP 562). A submodule imported directly
+(e.g., 'import rnaindel.rnaindel_lib.indel_classifier') is bound on the
+package under its own name, which a function of the same name would
+shadow after 'from .submodule import *'. Accessing such a submodule
+therefore also exports the names of the submodules. On Python
+older than 3.7, the submodules are imported with the package.
+
+'lazy_exports' is the main routine of this module
+"""
+
+import sys
+import importlib
+from types import ModuleType
+
+
+def lazy_exports(namespace, submodules):
+    """Export the names of the submodules on first access
+
+    Args:
+        namespace (dict): globals() of the package __init__
+        submodules (list): relative names of the submodules in the export order
+    Returns:
+        None: __getattr__ and __dir__ are set in namespace
+    """
+    package = namespace["__name__"]
+    state = {"exported": False}
+
+    def export_all():
+        if state["exported"]:
+            return
+
+        state["exported"] = True
+        try:
+            for submodule in submodules:
+                module = importlib.import_module(submodule, package)
+                for name in dir(module):
+                    if not name.startswith("_"):
+                        namespace[name] = getattr(module, name)
+        except BaseException:
+            state["exported"] = False
+            raise
+
+    if sys.version_info < (3, 7):
+        export_all()
+        return
+
+    def __getattr__(name):
+        if not name.startswith("__"):
+            export_all()
+            if name in namespace:
+                return namespace[name]
+        raise AttributeError("module {!r} has no attribute {!r}".format(package, name))
+
+    def __dir__():
+        export_all()
+        return sorted(namespace)
+
+    namespace["__getattr__"] = __getattr__
+    namespace["__dir__"] = __dir__
+    namespace["_lazy_export_all"] = export_all
+    namespace["_lazy_submodule_names"] = frozenset(
+        submodule.lstrip(".") for submodule in submodules
+    )
+    sys.modules[package].__class__ = LazyExportModule
+
+
+class LazyExportModule(ModuleType):
+    """Package exporting the names of its submodules before a submodule
+    bound by a direct import is returned in place of its namesake"""
+
+    def __getattribute__(self, name):
+        getattribute = super().__getattribute__
+        value = getattribute(name)
+        if (
+            name in getattribute("_lazy_submodule_names")
+            and isinstance(value, ModuleType)
+            and name in vars(value)
+        ):
+            getattribute("_lazy_export_all")()
+            value = getattribute(name)
+
+        return value
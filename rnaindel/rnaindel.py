@@ -2,46 +2,307 @@
 
 import os
 import sys
+import json
+import shutil
 import pathlib
 import logging
 import warnings
 import argparse
+import multiprocessing
+import multiprocessing.connection
 import tempfile
-import pandas as pd
 from functools import partial
+from contextlib import ExitStack
+from contextlib import contextmanager
 from .version import __version__
 
+# modules (and pandas, numpy and pysam) are loaded when a stage runs
 import rnaindel.bambino_lib as bl
 import rnaindel.rnaindel_lib as rl
 
 warnings.filterwarnings("ignore", category=UserWarning)
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "compile-data":
+        rl.compile_data(sys.argv[2:], __version__)
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "classify":
+        classify(sys.argv[2:])
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        batch(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        bench(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "bench-scaling":
+        bench_scaling(sys.argv[2:])
+        return
+
     args = get_args()
     create_logger(args.log_dir)
+    # arrays in the compiled bundle are mapped on first use
+    rl.load_data_bundle(args.data_dir.rstrip("/"), __version__)
+    run(args)
+
+
+def run(args):
+    """Analysis of a sample with the stages profiled, loci traced,
+    hot path operations counted and processes profiled if requested,
+    and with the time budget per candidate indel if given
+
+    Args:
+        args (argparse.Namespace): command line arguments
+    Returns:
+        None: args.output_vcf (and args.profile_report, args.locus_trace,
+              args.metrics, args.cprofile, args.memory_report) will be written out
+    """
+    # before worker processes are started
+    if args.locus_budget:
+        rl.open_locus_budget(args.locus_budget)
+
+    try:
+        with reports_written(args):
+            analyze(args)
+    finally:
+        # also after a failed analysis, so nothing is left open in the process
+        rl.close_annotation_cache()
+        rl.close_call_cache()
+        rl.close_checkpoints()
+        rl.close_locus_budget()
+
+
+@contextmanager
+def reports_written(args):
+    """Open the reports requested by args and write them when the block ends
+
+    The reports are written even if the block stops early (e.g., by exiting
+    when no indels are left to analyze). The stage profile and the memory
+    report record whether it completed.
+
+    Args:
+        args (argparse.Namespace): command line arguments
+    Yields:
+        None: args.profile_report, args.locus_trace, args.metrics,
+              args.cprofile and args.memory_report will be written out
+    """
+    state = {"completed": False}
+    with ExitStack() as stack:
+        # callbacks run in reverse: the process profile is closed first
+        if args.metrics:
+            rl.open_metrics()
+            stack.callback(rl.close_metrics)
+            stack.callback(rl.write_metrics, args.metrics)
+        if args.locus_trace:
+            rl.open_locus_trace()
+            stack.callback(rl.close_locus_trace)
+            stack.callback(rl.write_locus_trace, args.locus_trace, args.locus_trace_top)
+        if args.memory_report:
+            rl.open_memory_report()
+            stack.callback(rl.close_memory_report)
+            stack.callback(
+                lambda: rl.write_memory_report(args.memory_report, state["completed"])
+            )
+        if args.profile_report:
+            rl.open_stage_profile(args.process_num)
+            stack.callback(rl.close_stage_profile)
+            stack.callback(
+                lambda: rl.write_stage_profile(args.profile_report, state["completed"])
+            )
+        if args.cprofile:
+            rl.open_process_profile(args.cprofile)
+            stack.callback(rl.close_process_profile)
+
+        yield
+        state["completed"] = True
+
+
+def analyze(args):
+    """Analysis of a sample
+
+    Args:
+        args (argparse.Namespace): command line arguments
+    Returns:
+        None: args.output_vcf will be written out
+    """
+    import pandas as pd
+
     data_dir = args.data_dir.rstrip("/")
+    rl.clear_annotation_memo()
+    rl.clear_over_budget()
+    if args.annotation_cache:
+        rl.open_annotation_cache(args.annotation_cache, args.annotation_cache_size)
     refgene = "{}/refgene/refCodingExon.bed.gz".format(data_dir)
     dbsnp = "{}/dbsnp/dbsnp.indel.vcf.gz".format(data_dir)
     clinvar = "{}/clinvar/clinvar.indel.vcf.gz".format(data_dir)
     model_dir = "{}/models".format(data_dir)
     
+    if args.checkpoint_dir:
+        rl.open_checkpoints(args.checkpoint_dir, resume=args.resume)
+
+    # Preprocessing to Analysis 2
+    df, df_filtered_premerge, anno, chr_prefixed = run_stage(
+        "features",
+        [
+            args.bam,
+            args.fasta,
+            refgene,
+            args.input_vcf,
+            args.caller,
+            args.coding_regions_only,
+            args.uniq_mapq,
+            args.max_depth,
+            args.locus_budget,
+        ],
+        lambda: preprocess(args, refgene),
+    )
+    df = run_stage(
+        "protein",
+        [refgene],
+        lambda: rl.indel_protein_processor(df, anno, refgene),
+        rows=len(df),
+    )
+    # Analysis 3: merging equivalent indels
+    df, df_filtered_postmerge = run_stage(
+        "equivalence",
+        [args.fasta, refgene],
+        lambda: rl.indel_equivalence_solver(df, anno, args.fasta, refgene, chr_prefixed),
+        rows=len(df),
+    )
+    # Analysis 4: dbSNP annotation
+    df = run_stage(
+        "snp",
+        [dbsnp, clinvar],
+        lambda: rl.indel_snp_annotator(df, args.fasta, dbsnp, clinvar, chr_prefixed),
+        rows=len(df),
+    )
+    # Analysis 5: concatenating invalid(filtered) entries
+    df_filtered = pd.concat(
+        [df_filtered_premerge, df_filtered_postmerge],
+        axis=0,
+        ignore_index=True,
+        sort=True,
+    )
+
+    # features for classification only runs ('rnaindel classify')
+    if args.export_features:
+        measured(
+            "feature_export",
+            len(df),
+            lambda: rl.export_features(
+                args.export_features,
+                df,
+                df_filtered,
+                anno,
+                chr_prefixed,
+                args.bam,
+                args.fasta,
+                __version__,
+            ),
+        )
+
+    # Analysis 6 and later
+    classify_and_report(df, df_filtered, anno, chr_prefixed, args, refgene, model_dir)
+
+    print("rnaindel completed successfully.", file=sys.stderr)
+
+
+def preprocess(args, refgene):
+    """Indel calling (or VCF input), annotation and sequence features
+
+    Args:
+        args (argparse.Namespace): command line arguments
+        refgene (str): path to refCodingExon.bed.gz
+    Returns:
+        df (pandas.DataFrame): as returned by indel_sequence_processor
+        df_filtered_premerge (pandas.DataFrame): as returned by indel_sequence_processor
+        anno (pandas.DataFrame): as returned by indel_annotator
+        chr_prefixed (bool): True if chromosome names are "chr"-prefixed in BAM
+    """
+    import pysam
+
     # Preprocessing 
     # Variant calling will be performed if no external VCF is supplied
     if not args.input_vcf:
-        # indel calling
-        bambino_output = os.path.join(tempfile.mkdtemp(), "bambino.txt")
-        bl.bambino(args.bam, args.fasta, bambino_output, args.heap_memory)
-        
-        # preprocess indels from the built-in caller
-        df, chr_prefixed = rl.indel_preprocessor(
-            bambino_output, args.bam, refgene, args.fasta
-        )
-        df = rl.indel_rescuer(
-            df, args.fasta, args.bam, chr_prefixed, num_of_processes=args.process_num
-        )
-        
-        # delete the temp file
-        os.remove(bambino_output)
+        exon_data = rl.get_coding_exon_index(refgene)
+        restricted_dir = None
+
+        # calls from a previous run on the same inputs
+        cached, call_key = None, None
+        if args.call_cache:
+            rl.open_call_cache(args.call_cache, args.call_cache_size)
+            call_key, call_inputs = rl.call_cache_key(
+                args.bam,
+                args.fasta,
+                args.caller,
+                refgene if args.coding_regions_only else None,
+            )
+            cached = rl.cached_calls(call_key)
+
+        # calls are cached before screened by exons
+        screening = None if call_key else exon_data
+
+        # the restricted BAM is removed even if calling fails
+        try:
+            if cached:
+                chrs, calls = cached
+            elif args.caller == "pysam":
+                # in-process caller reading only coding regions if requested
+                regions = None
+                if args.coding_regions_only:
+                    regions = rl.coding_regions(
+                        exon_data, pysam.AlignmentFile(args.bam).references, 100
+                    )
+                chrs = rl.calling_chromosomes(args.bam, regions)
+                calls = rl.call_indels(
+                    chrs,
+                    args.bam,
+                    args.fasta,
+                    exon_data=screening,
+                    regions=regions,
+                    num_of_processes=args.process_num,
+                )
+            else:
+                # reads outside coding regions are not passed to the caller
+                calling_bam = args.bam
+                if args.coding_regions_only:
+                    restricted_dir = tempfile.mkdtemp()
+                    calling_bam = rl.restrict_bam_to_coding_regions(
+                        args.bam, refgene, restricted_dir
+                    )
+
+                # indel calling with the output parsed while streamed
+                shards = bl.shard_plan(calling_bam, args.heap_memory, args.process_num)
+                chrs = [chr for chr, shard_heap, mapped in shards]
+                parser = partial(rl.parse_bambino_output, exon_data=screening)
+                num_of_jvms = bl.parallel_jvms(args.heap_memory, args.process_num)
+                calls = bl.bambino_shards(
+                    shards, calling_bam, args.fasta, parser, num_of_jvms
+                )
+
+            if call_key:
+                if not cached:
+                    calls = rl.store_calls(call_key, call_inputs, chrs, calls)
+                calls = rl.screen_calls(calls, exon_data)
+
+            # Preprocessing to Analysis 2 shard by shard as calls become available
+            df, df_filtered_premerge, anno, chr_prefixed = rl.shard_pipeline(
+                chrs,
+                calls,
+                args.bam,
+                refgene,
+                args.fasta,
+                args.uniq_mapq,
+                num_of_processes=args.process_num,
+                max_depth=args.max_depth,
+            )
+        finally:
+            if restricted_dir:
+                shutil.rmtree(restricted_dir)
     else:
         # preprocess indels from external VCF
         df, chr_prefixed = rl.indel_vcf_preprocessor(
@@ -57,61 +318,472 @@ def main():
             external_vcf=True,
         )
 
-    # Analysis 1: indel annotation
-    df = rl.indel_annotator(df, refgene, args.fasta, chr_prefixed)
-    # Analysis 2: feature calculation using
-    df, df_filtered_premerge = rl.indel_sequence_processor(
-        df, args.fasta, args.bam, args.uniq_mapq, chr_prefixed
-    )
-    df = rl.indel_protein_processor(df, refgene)
-    # Analysis 3: merging equivalent indels
-    df, df_filtered_postmerge = rl.indel_equivalence_solver(
-        df, args.fasta, refgene, chr_prefixed
-    )
-    # Analysis 4: dbSNP annotation
-    df = rl.indel_snp_annotator(df, args.fasta, dbsnp, clinvar, chr_prefixed)
-    # Analysis 5: prediction
-    df = rl.indel_classifier(df, model_dir, num_of_processes=args.process_num)
+        # Analysis 1: indel annotation
+        df, anno = rl.indel_annotator(df, refgene, args.fasta, chr_prefixed)
+        # Analysis 2: feature calculation using
+        df, df_filtered_premerge = rl.indel_sequence_processor(
+            df,
+            anno,
+            args.fasta,
+            args.bam,
+            args.uniq_mapq,
+            chr_prefixed,
+            max_depth=args.max_depth,
+        )
 
-    # Analysis 6: concatenating invalid(filtered) entries
-    df_filtered = pd.concat(
-        [df_filtered_premerge, df_filtered_postmerge],
-        axis=0,
-        ignore_index=True,
-        sort=True,
+    return df, df_filtered_premerge, anno, chr_prefixed
+
+
+def classify_and_report(df, df_filtered, anno, chr_prefixed, args, refgene, model_dir):
+    """Prediction, optional reclassification, postprocessing and VCF output
+
+    Args:
+        df (pandas.DataFrame): indels with features
+        df_filtered (pandas.DataFrame): filtered indels
+        anno (pandas.DataFrame): annotation table
+        chr_prefixed (bool): True if chromosome names are "chr"-prefixed in BAM
+        args (argparse.Namespace): with bam, fasta, output_vcf,
+                                   non_somatic_panel and process_num
+        refgene (str): path to refCodingExon.bed.gz
+        model_dir (str): path to models
+    Returns:
+        None: args.output_vcf will be written out
+    """
+    # Analysis 6: prediction
+    df = run_stage(
+        "classification",
+        [model_dir],
+        lambda: rl.indel_classifier(df, model_dir, num_of_processes=args.process_num),
+        rows=len(df),
     )
 
     # Analysis 7(Optional): custom refinement of somatic prediction
     if args.non_somatic_panel:
-        df = rl.indel_reclassifier(df, args.fasta, chr_prefixed, args.non_somatic_panel)
+        df = run_stage(
+            "reclassification",
+            [args.non_somatic_panel],
+            lambda: rl.indel_reclassifier(
+                df, args.fasta, chr_prefixed, args.non_somatic_panel
+            ),
+            rows=len(df),
+        )
 
     # PostProcessing & VCF formatting
-    df, df_filtered = rl.indel_postprocessor(
-        df, df_filtered, refgene, args.fasta, chr_prefixed
+    df, df_filtered, anno = run_stage(
+        "postprocessing",
+        [args.fasta, refgene],
+        lambda: rl.indel_postprocessor(
+            df, df_filtered, anno, refgene, args.fasta, chr_prefixed
+        ),
+        rows=len(df),
     )
-    rl.indel_vcf_writer(
-        df,
-        df_filtered,
-        args.bam,
-        args.fasta,
-        chr_prefixed,
-        args.output_vcf,
-        __version__,
+    measured(
+        "vcf_output",
+        len(df) + len(df_filtered),
+        lambda: rl.indel_vcf_writer(
+            df,
+            df_filtered,
+            anno,
+            args.bam,
+            args.fasta,
+            chr_prefixed,
+            args.output_vcf,
+            __version__,
+        ),
     )
 
-    print("rnaindel completed successfully.", file=sys.stderr)
 
+def run_stage(stage, inputs, run, rows=None):
+    """Run a stage checkpointed (--checkpoint-dir) and measured
 
-def get_args():
-    parser = argparse.ArgumentParser(prog="rnaindel")
-    parser.add_argument(
-        "-b",
-        "--bam",
-        metavar="FILE",
-        required=True,
-        type=partial(check_file, file_name="BAM file (.bam)"),
-        help="input tumor RNA-Seq bam file (must be STAR-mapped).",
+    Args:
+        stage (str): stage name
+        inputs (list): see checkpoint.checkpointed
+        run (function): runs the stage
+        rows (int): number of input rows
+    Returns:
+        outputs: as returned by run
+    """
+    return measured(stage, rows, lambda: rl.checkpointed(stage, inputs, run))
+
+
+def measured(stage, rows, run):
+    """Run a stage profiled (--profile-report) and memory traced (--memory-report)
+
+    Args:
+        stage (str): stage name
+        rows (int): number of input rows
+        run (function): runs the stage
+    Returns:
+        outputs: as returned by run
+    """
+    return rl.profiled(stage, rows, lambda: rl.memory_traced(stage, run))
+
+
+def classify(argv):
+    """Entry point of 'rnaindel classify'
+
+    Runs the analysis from prediction on features
+    exported with --export-features.
+
+    Args:
+        argv (list): command line arguments after 'classify'
+    Returns:
+        None
+    """
+    args = get_classify_args(argv)
+    create_logger(args.log_dir)
+    data_dir = args.data_dir.rstrip("/")
+    rl.load_data_bundle(data_dir, __version__)
+    rl.clear_annotation_memo()
+    refgene = "{}/refgene/refCodingExon.bed.gz".format(data_dir)
+    model_dir = "{}/models".format(data_dir)
+
+    try:
+        df, df_filtered, anno, manifest = rl.load_features(args.input_dir, __version__)
+    except ValueError as e:
+        sys.exit("Error: {}.".format(e))
+
+    # paths recorded at export unless given
+    if not args.bam:
+        args.bam = check_file(manifest["bam"], "BAM file")
+    if not args.fasta:
+        args.fasta = check_file(manifest["fasta"], "FASTA file")
+
+    with reports_written(args):
+        classify_and_report(
+            df, df_filtered, anno, manifest["chr_prefixed"], args, refgene, model_dir
+        )
+
+    print("rnaindel classify completed successfully.", file=sys.stderr)
+
+
+def batch(argv):
+    """Entry point of 'rnaindel batch'
+
+    Samples in the manifest are analyzed in processes forked from this
+    process after the shared data are loaded, so each sample starts with
+    the modules imported and the data in memory. A new process per sample
+    also gives each sample a fresh state (e.g., the random seed), so the
+    results are identical to separate runs.
+
+    Args:
+        argv (list): command line arguments after 'batch'
+    Returns:
+        None
+    """
+    args = get_args(argv, batch=True)
+    create_logger(args.log_dir)
+    samples = read_manifest(args.manifest)
+
+    data_dir = args.data_dir.rstrip("/")
+    rl.load_data_bundle(data_dir, __version__)
+
+    # counted over the samples, which are forked from this process
+    if args.metrics:
+        rl.open_metrics()
+    rl.warm_up(data_dir)
+
+    ctx = multiprocessing.get_context("fork")
+    running, failed = {}, []
+    for bam, input_vcf, output_vcf in samples:
+        while len(running) >= args.jobs:
+            wait_for_sample(running, failed)
+
+        sample_args = argparse.Namespace(**vars(args))
+        sample_args.bam = bam
+        sample_args.input_vcf = input_vcf
+        sample_args.output_vcf = output_vcf
+        sample_args.export_features = None
+        sample_args.checkpoint_dir = None
+        sample_args.resume = False
+        sample_args.profile_report = None
+        sample_args.locus_trace = None
+        sample_args.metrics = None
+        sample_args.cprofile = None
+        sample_args.memory_report = None
+
+        proc = ctx.Process(target=run, args=(sample_args,))
+        proc.start()
+        running[proc] = "{} ({})".format(bam, output_vcf)
+
+    while running:
+        wait_for_sample(running, failed)
+
+    rl.write_metrics(args.metrics)
+    rl.close_metrics()
+
+    print(
+        "rnaindel batch: {} of {} samples completed.".format(
+            len(samples) - len(failed), len(samples)
+        ),
+        file=sys.stderr,
     )
+    if failed:
+        sys.exit(1)
+
+
+def serve(argv):
+    """Entry point of 'rnaindel serve'
+
+    Serves classification requests on a Unix socket or a localhost port
+    with the models and the data loaded (see classification_service).
+
+    Args:
+        argv (list): command line arguments after 'serve'
+    Returns:
+        None
+    """
+    args = get_serve_args(argv)
+    create_logger(args.log_dir)
+    data_dir = args.data_dir.rstrip("/")
+    rl.load_data_bundle(data_dir, __version__)
+
+    # before the workers of the service are started
+    if args.locus_budget:
+        rl.open_locus_budget(args.locus_budget)
+    if args.cprofile:
+        rl.open_process_profile(args.cprofile)
+
+    service = rl.ClassificationService(
+        args.fasta,
+        data_dir,
+        mapq=args.uniq_mapq,
+        non_somatic_panel=args.non_somatic_panel,
+        num_of_processes=args.process_num,
+        max_depth=args.max_depth,
+    )
+
+    if args.socket:
+        address = args.socket
+    else:
+        address = "http://127.0.0.1:{}".format(args.port)
+    print("rnaindel serve: listening on {}".format(address), file=sys.stderr)
+
+    try:
+        rl.serve_requests(service, socket_path=args.socket, port=args.port)
+    finally:
+        # the workers dumped their stats when the service was closed
+        rl.close_process_profile()
+
+
+def bench(argv):
+    """Entry point of 'rnaindel bench'
+
+    Times the sequence and pileup kernels on synthetic inputs
+    (see micro_benchmark) and exits with 1 if a kernel is slower
+    than the baseline by more than the threshold.
+
+    Args:
+        argv (list): command line arguments after 'bench'
+    Returns:
+        None
+    """
+    args = get_bench_args(argv)
+
+    baseline = None
+    if args.baseline:
+        try:
+            baseline = rl.load_benchmark_run(args.baseline)
+        except (IOError, OSError, ValueError) as e:
+            sys.exit("Error: baseline not loaded: {}".format(e))
+
+    try:
+        run = rl.run_benchmarks(args.benchmark, args.repeats, args.min_time)
+    except ValueError as e:
+        sys.exit("Error: {}.".format(e))
+
+    changes = None
+    if baseline:
+        changes = rl.compare_with_baseline(run, baseline, args.threshold)
+    rl.benchmark_report(run, changes)
+
+    if args.history:
+        rl.append_history(args.history, run)
+    if args.save_baseline:
+        rl.write_benchmark_run(args.save_baseline, run)
+
+    slower = [name for name, (change, is_slower) in (changes or {}).items() if is_slower]
+    if slower:
+        print(
+            "rnaindel bench: slower than the baseline: {}".format(", ".join(slower)),
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+def bench_scaling(argv):
+    """Entry point of 'rnaindel bench-scaling'
+
+    Generates a synthetic data set (or reuses one generated with the same
+    parameters) and runs the pipeline on it once for each number of
+    processes, each run in a process forked from this process for a
+    fresh state. The throughput, parallel efficiency and memory of the
+    runs are reported (see scaling_benchmark).
+
+    Args:
+        argv (list): command line arguments after 'bench-scaling'
+    Returns:
+        None
+    """
+    args = get_bench_scaling_args(argv)
+    create_logger(args.log_dir)
+
+    parameters = {
+        "seed": args.seed,
+        "num_of_candidates": args.candidates,
+        "depth": args.depth,
+        "num_of_chromosomes": args.chromosomes,
+    }
+    try:
+        synthetic = rl.load_synthetic_data(args.out_dir)
+        if any(synthetic[key] != value for key, value in parameters.items()):
+            raise ValueError("generated with other parameters")
+    except ValueError:
+        print("Generating synthetic data in {}.".format(args.out_dir), file=sys.stderr)
+        rl.generate_synthetic_data(
+            args.out_dir, args.candidates, args.depth, args.chromosomes, args.seed
+        )
+        synthetic = rl.load_synthetic_data(args.out_dir)
+
+    rl.load_data_bundle(synthetic["data_dir"], __version__)
+
+    run_dir = os.path.join(args.out_dir, "scaling")
+    os.makedirs(run_dir, exist_ok=True)
+
+    ctx = multiprocessing.get_context("fork")
+    runs = []
+    for num_of_processes in args.process_nums:
+        output_vcf = os.path.join(run_dir, "p{}.vcf".format(num_of_processes))
+        profile_report = os.path.join(run_dir, "p{}.json".format(num_of_processes))
+        run_argv = [
+            "-b",
+            synthetic["bam"],
+            "-f",
+            synthetic["fasta"],
+            "-d",
+            synthetic["data_dir"],
+            "-o",
+            output_vcf,
+            "-p",
+            str(num_of_processes),
+            "--caller",
+            args.caller,
+            "--profile-report",
+            profile_report,
+        ]
+        if args.input_vcf:
+            run_argv += ["-c", synthetic["vcf"]]
+
+        print("Running with {} processes.".format(num_of_processes), file=sys.stderr)
+        proc = ctx.Process(target=run, args=(get_args(run_argv),))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            sys.exit(
+                "Error: run with {} processes failed (exit code {}).".format(
+                    num_of_processes, proc.exitcode
+                )
+            )
+
+        with open(profile_report) as f:
+            runs.append((num_of_processes, json.load(f), output_vcf))
+
+    results = rl.scaling_results(runs, synthetic["num_of_candidates"])
+    rl.scaling_table(results)
+    if args.report:
+        rl.write_scaling_report(args.report, synthetic, results)
+
+
+def wait_for_sample(running, failed):
+    """Wait until a sample process exits
+
+    Args:
+        running (dict): {process: sample}. the exited process is removed
+        failed (list): sample is appended if failed
+    Returns:
+        None
+    """
+    multiprocessing.connection.wait([proc.sentinel for proc in running])
+    for proc in list(running):
+        if proc.exitcode is None:
+            continue
+        sample = running.pop(proc)
+        if proc.exitcode != 0:
+            print(
+                "Failed to analyze {} (exit code {}).".format(sample, proc.exitcode),
+                file=sys.stderr,
+            )
+            failed.append(sample)
+
+
+def read_manifest(manifest):
+    """Samples in the batch manifest
+
+    Tab-delimited lines of BAM, input VCF ('-' or empty if calling
+    by the built-in caller) and output VCF. Lines starting with '#'
+    are skipped.
+
+    Args:
+        manifest (str): path to manifest
+    Returns:
+        samples (list): [(bam, input_vcf or None, output_vcf)]
+    """
+    samples = []
+    with open(manifest) as f:
+        for i, line in enumerate(f, 1):
+            if not line.strip() or line.startswith("#"):
+                continue
+
+            fields = [field.strip() for field in line.rstrip("\n").split("\t")]
+            if len(fields) != 3 or not fields[0] or not fields[2]:
+                sys.exit(
+                    "Error: line {} of {}: expected BAM, input VCF "
+                    "and output VCF.".format(i, manifest)
+                )
+
+            bam, input_vcf, output_vcf = fields
+            check_file(bam, "BAM file (.bam) at line {}".format(i))
+            if input_vcf in ("", "-"):
+                input_vcf = None
+            else:
+                check_file(input_vcf, "VCF (.vcf) file at line {}".format(i))
+            samples.append((bam, input_vcf, output_vcf))
+
+    if not samples:
+        sys.exit("Error: no samples in {}.".format(manifest))
+
+    return samples
+
+
+def get_args(argv=None, batch=False):
+    """Command line arguments of 'rnaindel' (batch=False) or 'rnaindel batch'"""
+    parser = argparse.ArgumentParser(prog="rnaindel batch" if batch else "rnaindel")
+    if batch:
+        parser.add_argument(
+            "--manifest",
+            metavar="FILE",
+            required=True,
+            type=partial(check_file, file_name="Manifest file"),
+            help="tab-delimited BAM, input VCF ('-' if none) and output VCF per line",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            metavar="INT",
+            default=1,
+            type=check_pos_int,
+            help="number of samples analyzed concurrently (default: 1)",
+        )
+    else:
+        parser.add_argument(
+            "-b",
+            "--bam",
+            metavar="FILE",
+            required=True,
+            type=partial(check_file, file_name="BAM file (.bam)"),
+            help="input tumor RNA-Seq bam file (must be STAR-mapped).",
+        )
     parser.add_argument(
         "-f",
         "--fasta",
@@ -128,17 +800,18 @@ def get_args():
         help="data directory contains refgene, dbsnp and clinvar databases and models",
         type=check_folder_existence,
     )
-    parser.add_argument(
-        "-o", "--output-vcf", metavar="FILE", required=True, help="output vcf file"
-    )
-    # input VCF from other callers (optional)
-    parser.add_argument(
-        "-c",
-        "--input-vcf",
-        metavar="FILE",
-        type=partial(check_file, file_name="VCF (.vcf) file"),
-        help="input vcf file from other callers",
-    )
+    if not batch:
+        parser.add_argument(
+            "-o", "--output-vcf", metavar="FILE", required=True, help="output vcf file"
+        )
+        # input VCF from other callers (optional)
+        parser.add_argument(
+            "-c",
+            "--input-vcf",
+            metavar="FILE",
+            type=partial(check_file, file_name="VCF (.vcf) file"),
+            help="input vcf file from other callers",
+        )
     parser.add_argument(
         "-q",
         "--uniq-mapq",
@@ -147,6 +820,22 @@ def get_args():
         type=check_mapq,
         help="STAR mapping quality MAPQ for unique mappers (default: 255)",
     )
+    parser.add_argument(
+        "--max-depth",
+        metavar="INT",
+        type=check_pos_int,
+        help="max number of reads without indels analyzed per indel. "
+        "reads are reservoir-sampled at deeper loci and still counted "
+        "for ref_count and alt_count (default: no limit)",
+    )
+    parser.add_argument(
+        "--locus-budget",
+        metavar="SEC",
+        type=check_pos_float,
+        help="seconds per indel for rescue and for feature calculation. "
+        "indels over the budget are analyzed with fallback values and flagged "
+        "OTB (default: no limit)",
+    )
     parser.add_argument(
         "-p",
         "--process-num",
@@ -167,7 +856,10 @@ def get_args():
         "--heap-memory",
         metavar="STR",
         default="6000m",
-        help="maximum heap space (defalt: 6000m)",
+        help=(
+            "maximum heap space shared by parallel callers, "
+            "at most one caller per 1000m (defalt: 6000m)"
+        ),
     )
     parser.add_argument(
         "-l",
@@ -176,15 +868,406 @@ def get_args():
         type=check_folder_existence,
         help="directory for storing log files",
     )
+    parser.add_argument(
+        "--caller",
+        choices=["bambino", "pysam"],
+        default="bambino",
+        help="built-in caller: bambino (requires Java) or pysam (default: bambino)",
+    )
+    parser.add_argument(
+        "--coding-regions-only",
+        action="store_true",
+        help="call indels only in reads overlapping coding exons (built-in callers)",
+    )
+    parser.add_argument(
+        "--annotation-cache",
+        metavar="FILE",
+        help="SQLite file to store annotation results reused across samples",
+    )
+    parser.add_argument(
+        "--annotation-cache-size",
+        metavar="INT",
+        default=2048,
+        type=check_pos_int,
+        help="maximum size of the annotation cache in MB (default: 2048)",
+    )
+    parser.add_argument(
+        "--call-cache",
+        metavar="DIR",
+        help="directory to store calls of the built-in callers reused across runs",
+    )
+    parser.add_argument(
+        "--call-cache-size",
+        metavar="INT",
+        default=10240,
+        type=check_pos_int,
+        help="maximum size of the call cache in MB (default: 10240)",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="write counts of BAM/FASTA fetches, database queries, model loads "
+        "and cache hits to FILE (Prometheus text format if ending with .prom, "
+        "JSON otherwise)",
+    )
+    if not batch:
+        parser.add_argument(
+            "--export-features",
+            metavar="DIR",
+            help="directory to export the features for 'rnaindel classify'",
+        )
+        parser.add_argument(
+            "--checkpoint-dir",
+            metavar="DIR",
+            help="directory to write the output of each analysis stage to",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="skip stages with a valid checkpoint in --checkpoint-dir",
+        )
+        parser.add_argument(
+            "--profile-report",
+            metavar="FILE",
+            help="write wall time, CPU time, peak RSS and rows of each stage "
+            "to FILE (TSV if ending with .tsv, JSON otherwise)",
+        )
+        parser.add_argument(
+            "--locus-trace",
+            metavar="FILE",
+            help="write the time and work of the slowest candidate indels "
+            "to FILE (TSV if ending with .tsv, JSON otherwise)",
+        )
+        parser.add_argument(
+            "--locus-trace-top",
+            metavar="INT",
+            default=100,
+            type=check_pos_int,
+            help="number of loci in --locus-trace (default: 100)",
+        )
+        parser.add_argument(
+            "--cprofile",
+            metavar="DIR",
+            help="profile the main process and the pool workers with cProfile "
+            "and write the stats of each process and the merged stats to DIR",
+        )
+        parser.add_argument(
+            "--memory-report",
+            metavar="FILE",
+            help="write the traced peak, top allocation sites and peak RSS "
+            "of the main and child processes for each stage to FILE (JSON)",
+        )
     parser.add_argument(
         "--version",
         action="version",
         version="%(prog)s {version}".format(version=__version__),
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if not batch and args.resume and not args.checkpoint_dir:
+        parser.error("--resume requires --checkpoint-dir")
+    return args
+
+
+def get_classify_args(argv):
+    parser = argparse.ArgumentParser(prog="rnaindel classify")
+    parser.add_argument(
+        "-i",
+        "--input-dir",
+        metavar="DIR",
+        required=True,
+        type=check_folder_existence,
+        help="directory of features exported with --export-features",
+    )
+    parser.add_argument(
+        "-d",
+        "--data-dir",
+        metavar="DIR",
+        required=True,
+        help="data directory contains refgene, dbsnp and clinvar databases and models",
+        type=check_folder_existence,
+    )
+    parser.add_argument(
+        "-o", "--output-vcf", metavar="FILE", required=True, help="output vcf file"
+    )
+    parser.add_argument(
+        "-f",
+        "--fasta",
+        metavar="FILE",
+        type=partial(check_file, file_name="FASTA file"),
+        help="reference genome FASTA file (default: as used for the export)",
+    )
+    parser.add_argument(
+        "-b",
+        "--bam",
+        metavar="FILE",
+        help="bam file for the sample name in VCF (default: as used for the export)",
+    )
+    parser.add_argument(
+        "-p",
+        "--process-num",
+        metavar="INT",
+        default=1,
+        type=check_pos_int,
+        help="number of processes (default: 1)",
+    )
+    parser.add_argument(
+        "-n",
+        "--non-somatic-panel",
+        metavar="FILE",
+        type=partial(check_file, file_name="Panel of non-somatic (.vcf)"),
+        help="user-defined panel of non-somatic indels in VCF format",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-dir",
+        metavar="DIR",
+        type=check_folder_existence,
+        help="directory for storing log files",
+    )
+    parser.add_argument(
+        "--profile-report",
+        metavar="FILE",
+        help="write wall time, CPU time, peak RSS and rows of each stage "
+        "to FILE (TSV if ending with .tsv, JSON otherwise)",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="write counts of FASTA fetches, database queries and model loads "
+        "to FILE (Prometheus text format if ending with .prom, JSON otherwise)",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="DIR",
+        help="profile the main process and the pool workers with cProfile "
+        "and write the stats of each process and the merged stats to DIR",
+    )
+    parser.add_argument(
+        "--memory-report",
+        metavar="FILE",
+        help="write the traced peak, top allocation sites and peak RSS "
+        "of the main and child processes for each stage to FILE (JSON)",
+    )
+    # loci are not traced without feature calculation
+    parser.set_defaults(locus_trace=None, locus_trace_top=None)
+    return parser.parse_args(argv)
+
+
+def get_bench_args(argv):
+    parser = argparse.ArgumentParser(prog="rnaindel bench")
+    parser.add_argument(
+        "-k",
+        "--benchmark",
+        metavar="NAME",
+        action="append",
+        help="benchmark to run (repeatable, default: all). "
+        "editdistance, linguistic_complexity, dna_strength, repeat, "
+        "indel_equivalence, extract_indel_reads, decompose_indel_read, most_common, "
+        "startup",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeats",
+        metavar="INT",
+        default=5,
+        type=check_pos_int,
+        help="number of timings per benchmark (default: 5)",
+    )
+    parser.add_argument(
+        "--min-time",
+        metavar="FLOAT",
+        default=0.2,
+        type=float,
+        help="minimum seconds of a timing (default: 0.2)",
+    )
+    parser.add_argument(
+        "--history",
+        metavar="FILE",
+        help="JSON file the results are appended to",
+    )
+    parser.add_argument(
+        "--baseline",
+        metavar="FILE",
+        help="results to compare with (a file written by --save-baseline, "
+        "or the last run in a --history file)",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        metavar="FILE",
+        help="write the results to FILE for later --baseline",
+    )
+    parser.add_argument(
+        "--threshold",
+        metavar="FLOAT",
+        default=0.2,
+        type=float,
+        help="slowdown flagged against the baseline (default: 0.2 for 20%%)",
+    )
+    args = parser.parse_args(argv)
+    if args.min_time <= 0 or args.threshold < 0:
+        parser.error("--min-time must be positive and --threshold non-negative")
     return args
 
 
+def get_bench_scaling_args(argv):
+    parser = argparse.ArgumentParser(prog="rnaindel bench-scaling")
+    parser.add_argument(
+        "-o",
+        "--out-dir",
+        metavar="DIR",
+        required=True,
+        help="directory for the synthetic data and the outputs of the runs",
+    )
+    parser.add_argument(
+        "--candidates",
+        metavar="INT",
+        default=1000,
+        type=check_pos_int,
+        help="number of planted indels (default: 1000)",
+    )
+    parser.add_argument(
+        "--depth",
+        metavar="INT",
+        default=20,
+        type=check_pos_int,
+        help="mean read depth over the coding exons (default: 20)",
+    )
+    parser.add_argument(
+        "--chromosomes",
+        metavar="INT",
+        default=8,
+        type=check_pos_int,
+        help="number of chromosomes, 1 to 22 (default: 8)",
+    )
+    parser.add_argument(
+        "--seed",
+        metavar="INT",
+        default=1,
+        type=int,
+        help="seed of the synthetic data (default: 1)",
+    )
+    parser.add_argument(
+        "-p",
+        "--process-nums",
+        metavar="INT,INT,...",
+        default=[1, 2, 4],
+        type=check_pos_int_list,
+        help="comma-separated numbers of processes to run with (default: 1,2,4)",
+    )
+    parser.add_argument(
+        "--caller",
+        default="pysam",
+        choices=["bambino", "pysam"],
+        help="built-in caller (default: pysam, which needs no Java)",
+    )
+    parser.add_argument(
+        "-c",
+        "--input-vcf",
+        action="store_true",
+        help="classify the planted indels instead of calling",
+    )
+    parser.add_argument(
+        "--report",
+        metavar="FILE",
+        help="write the results to FILE (TSV if ending with .tsv, JSON otherwise)",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-dir",
+        metavar="DIR",
+        type=check_folder_existence,
+        help="directory for storing log files",
+    )
+    args = parser.parse_args(argv)
+    if args.chromosomes > 22:
+        parser.error("--chromosomes must be 1 to 22")
+    return args
+
+
+def get_serve_args(argv):
+    parser = argparse.ArgumentParser(prog="rnaindel serve")
+    listen = parser.add_mutually_exclusive_group(required=True)
+    listen.add_argument(
+        "--socket", metavar="FILE", help="Unix socket to serve requests on"
+    )
+    listen.add_argument(
+        "--port",
+        metavar="INT",
+        type=check_pos_int,
+        help="port on 127.0.0.1 to serve requests on",
+    )
+    parser.add_argument(
+        "-f",
+        "--fasta",
+        metavar="FILE",
+        required=True,
+        type=partial(check_file, file_name="FASTA file"),
+        help="reference genome FASTA file.",
+    )
+    parser.add_argument(
+        "-d",
+        "--data-dir",
+        metavar="DIR",
+        required=True,
+        help="data directory contains refgene, dbsnp and clinvar databases and models",
+        type=check_folder_existence,
+    )
+    parser.add_argument(
+        "-q",
+        "--uniq-mapq",
+        metavar="INT",
+        default=255,
+        type=check_mapq,
+        help="STAR mapping quality MAPQ for unique mappers (default: 255)",
+    )
+    parser.add_argument(
+        "--max-depth",
+        metavar="INT",
+        type=check_pos_int,
+        help="max number of reads without indels analyzed per indel. "
+        "reads are reservoir-sampled at deeper loci and still counted "
+        "for ref_count and alt_count (default: no limit)",
+    )
+    parser.add_argument(
+        "--locus-budget",
+        metavar="SEC",
+        type=check_pos_float,
+        help="seconds per indel for rescue and for feature calculation. "
+        "indels over the budget are analyzed with fallback values and flagged "
+        "OTB (default: no limit)",
+    )
+    parser.add_argument(
+        "-p",
+        "--process-num",
+        metavar="INT",
+        default=1,
+        type=check_pos_int,
+        help="number of processes (default: 1)",
+    )
+    parser.add_argument(
+        "-n",
+        "--non-somatic-panel",
+        metavar="FILE",
+        type=partial(check_file, file_name="Panel of non-somatic (.vcf)"),
+        help="user-defined panel of non-somatic indels in VCF format",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="DIR",
+        help="profile the main process and the workers of the service with "
+        "cProfile and write the stats of each process and the merged stats "
+        "to DIR when the service stops",
+    )
+    parser.add_argument(
+        "-l",
+        "--log-dir",
+        metavar="DIR",
+        type=check_folder_existence,
+        help="directory for storing log files",
+    )
+    return parser.parse_args(argv)
+
+
 def create_logger(log_dir):
     logger = logging.getLogger("")
     logger.setLevel(logging.INFO)
@@ -207,7 +1290,18 @@ def create_logger(log_dir):
 def check_pos_int(val):
     val = int(val)
     if val <= 0:
-        sys.exit("Error: The number of processes must be a positive integer.")
+        sys.exit("Error: {} is not a positive integer.".format(val))
+    return val
+
+
+def check_pos_int_list(val):
+    return sorted(set(check_pos_int(v) for v in val.split(",")))
+
+
+def check_pos_float(val):
+    val = float(val)
+    if val <= 0:
+        sys.exit("Error: {} is not a positive number.".format(val))
     return val
 
 
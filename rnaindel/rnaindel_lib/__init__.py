@@ -1,19 +1,47 @@
-from .indel_annotator import *
-from .indel_classifier import *
-from .indel_curator import *
-from .indel_equivalence_solver import *
-from .indel_features import *
-from .indel_postprocessor import *
-from .indel_preprocessor import *
-from .indel_protein_processor import *
-from .indel_sequence_processor import *
-from .indel_reclassifier import *
-from .indel_sequence import *
-from .indel_snp_annotator import *
-from .indel_vcf_preprocessor import *
-from .left_aligner import *
-from .most_common import *
-from .sequence_properties import *
-from .indel_vcf_writer import *
-from .indel_vcf import *
-from .indel_rescuer import *
+# names of the submodules are exported on first access (see lazy_import)
+from ..lazy_import import lazy_exports as _lazy_exports
+
+_lazy_exports(
+    globals(),
+    [
+        ".indel_annotator",
+        ".indel_classifier",
+        ".indel_curator",
+        ".indel_equivalence_solver",
+        ".indel_features",
+        ".indel_postprocessor",
+        ".indel_preprocessor",
+        ".indel_protein_processor",
+        ".indel_sequence_processor",
+        ".indel_reclassifier",
+        ".indel_sequence",
+        ".indel_snp_annotator",
+        ".indel_vcf_preprocessor",
+        ".left_aligner",
+        ".most_common",
+        ".sequence_properties",
+        ".indel_vcf_writer",
+        ".indel_vcf",
+        ".indel_rescuer",
+        ".coding_exon_index",
+        ".data_bundle",
+        ".annotation_cache",
+        ".calling_regions",
+        ".indel_caller",
+        ".shard_pipeline",
+        ".call_cache",
+        ".checkpoint",
+        ".feature_table",
+        ".shared_data",
+        ".classification_service",
+        ".stage_profile",
+        ".locus_trace",
+        ".hot_path_metrics",
+        ".process_profile",
+        ".memory_report",
+        ".micro_benchmark",
+        ".locus_budget",
+        ".synthetic_data",
+        ".scaling_benchmark",
+    ],
+)
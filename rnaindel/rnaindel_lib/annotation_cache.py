@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""Annotation memo within a run and on-disk cache shared across samples
+
+Results of annotate_indels are memoized by (chr, pos, is_ins, indel_seq)
+within a run so that indels unchanged by left-alignment are not
+re-annotated in indel_postprocessor.
+
+Annotation of an indel depends only on the indel, the coding exon
+database and the reference genome. Results of annotate_indels are
+stored in an SQLite file keyed by the normalized indel
+(chr:pos:is_ins:indel_seq) and a fingerprint of refgene, FASTA and
+the rnaindel version. The total size of the stored results is kept
+under a limit by evicting the least recently used entries.
+
+'open_annotation_cache' and 'cached_annotations' are the main routines of this module
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+from ..version import __version__
+from .data_bundle import sha256sum
+from .hot_path_metrics import incr
+
+logger = logging.getLogger(__name__)
+
+# evict down to this fraction of the size limit
+EVICTION_TARGET = 0.9
+
+# the cache currently in use
+_annotation_cache = None
+
+# results in this run {(refgene, fasta, chr_prefixed): {indel key: annotation}}
+_run_memo = {}
+
+# lookups of the memo since the last clear_annotation_memo
+_memo_stats = {"hits": 0, "misses": 0}
+
+
+def open_annotation_cache(path, max_size_mb):
+    """Use the cache file at path (created if not exists)
+
+    Args:
+        path (str): path to the SQLite file
+        max_size_mb (int): limit for the total size of stored results in MB
+    Returns:
+        cache (AnnotationCache)
+    """
+    global _annotation_cache
+    close_annotation_cache()
+
+    _annotation_cache = AnnotationCache(path, max_size_mb * 1024 * 1024)
+    return _annotation_cache
+
+
+def close_annotation_cache():
+    global _annotation_cache
+    if _annotation_cache is not None:
+        _annotation_cache.close()
+        _annotation_cache = None
+
+
+def clear_annotation_memo():
+    _run_memo.clear()
+    _memo_stats["hits"] = _memo_stats["misses"] = 0
+
+
+def annotation_memo_stats():
+    """Entries, hits and misses (annotated) of the memo"""
+    stats = dict(_memo_stats)
+    stats["entries"] = sum(len(memo) for memo in _run_memo.values())
+    return stats
+
+
+def indel_key(chr, pos, idl_type, idl_seq):
+    return "{}:{}:{}:{}".format(chr, pos, idl_type, idl_seq)
+
+
+def cached_annotations(keys, annotate, refgene, fasta, chr_prefixed):
+    """Annotation results with the memo and the cache looked up first
+
+    Args:
+        keys (list): (chr, pos, idl_type, idl_seq) of indels
+        annotate (function): takes a key and returns the annotation (list of tuples)
+        refgene (str): path to refCodingExon.bed.gz
+        fasta (str): path to fasta
+        chr_prefixed (bool): True if chromosome names in BAM are "chr"-prefixed
+    Returns:
+        results (list): annotation for each key
+    """
+    memo = _run_memo.setdefault((refgene, fasta, chr_prefixed), {})
+    missing = list(set(indel_key(*key) for key in keys) - set(memo))
+
+    cache = _annotation_cache
+    if cache is not None and missing:
+        fingerprint = cache.fingerprint(refgene, fasta, chr_prefixed)
+        found = cache.get_many(fingerprint, missing)
+        memo.update(found)
+        incr("annotation_cache_hits", len(found))
+        incr("annotation_cache_misses", len(missing) - len(found))
+        logger.info(
+            "annotation cache: {} hits, {} misses".format(
+                len(found), len(missing) - len(found)
+            )
+        )
+
+    results, computed = [], {}
+    for key in keys:
+        k = indel_key(*key)
+        res = memo.get(k)
+        if res is None:
+            res = annotate(key)
+            memo[k] = computed[k] = res
+            _memo_stats["misses"] += 1
+            incr("annotation_memo_misses")
+        else:
+            _memo_stats["hits"] += 1
+            incr("annotation_memo_hits")
+        results.append(res)
+
+    if cache is not None and computed:
+        cache.put_many(fingerprint, computed)
+
+    return results
+
+
+class AnnotationCache(object):
+    """SQLite-backed annotation cache
+
+    Attributes:
+        path (str): path to the SQLite file
+        max_size (int): limit for the total size of stored results in bytes
+    """
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self._fingerprints = {}
+
+        # concurrent runs wait for each other's writes
+        self.conn = sqlite3.connect(path, timeout=600)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS annotation ("
+                "fingerprint TEXT, indel TEXT, value TEXT, "
+                "size INTEGER, last_used INTEGER, "
+                "PRIMARY KEY (fingerprint, indel))"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS annotation_last_used "
+                "ON annotation (last_used)"
+            )
+
+    def close(self):
+        self.conn.close()
+
+    def fingerprint(self, refgene, fasta, chr_prefixed):
+        """Identifies the data the annotation depends on
+
+        Args:
+            refgene (str): path to refCodingExon.bed.gz
+            fasta (str): path to fasta
+            chr_prefixed (bool): True if chromosome names in BAM are "chr"-prefixed
+        Returns:
+            fingerprint (str): hex digest
+        """
+        args = (refgene, fasta, chr_prefixed)
+        fingerprint = self._fingerprints.get(args)
+        if fingerprint is None:
+            h = hashlib.sha256()
+            h.update(__version__.encode())
+            h.update(sha256sum(refgene).encode())
+            # the index identifies the reference build
+            fai = fasta + ".fai"
+            if os.path.isfile(fai):
+                h.update(sha256sum(fai).encode())
+            else:
+                h.update(str(os.path.getsize(fasta)).encode())
+            h.update(str(chr_prefixed).encode())
+            fingerprint = h.hexdigest()
+            self._fingerprints[args] = fingerprint
+
+        return fingerprint
+
+    def get_many(self, fingerprint, indels):
+        """Look up stored results
+
+        Args:
+            fingerprint (str)
+            indels (list): indel keys
+        Returns:
+            found (dict): {indel key: annotation (list of tuples)}
+        """
+        found = {}
+        uniq = list(set(indels))
+        # stay under the limit of host parameters per statement
+        for i in range(0, len(uniq), 500):
+            chunk = uniq[i : i + 500]
+            rows = self.conn.execute(
+                "SELECT indel, value FROM annotation WHERE fingerprint = ? "
+                "AND indel IN ({})".format(",".join("?" * len(chunk))),
+                [fingerprint] + chunk,
+            ).fetchall()
+            for indel, value in rows:
+                found[indel] = [tuple(isoform) for isoform in json.loads(value)]
+
+        if found:
+            with self.conn:
+                use = self.next_use()
+                self.conn.executemany(
+                    "UPDATE annotation SET last_used = ? "
+                    "WHERE fingerprint = ? AND indel = ?",
+                    [(use + i, fingerprint, indel) for i, indel in enumerate(found)],
+                )
+
+        return found
+
+    def put_many(self, fingerprint, results):
+        """Store results and evict old entries if over the size limit
+
+        Args:
+            fingerprint (str)
+            results (dict): {indel key: annotation (list of tuples)}
+        Returns:
+            None
+        """
+        if not results:
+            return
+
+        with self.conn:
+            use = self.next_use()
+            records = []
+            for i, (indel, res) in enumerate(results.items()):
+                value = json.dumps(res)
+                records.append(
+                    (fingerprint, indel, value, len(indel) + len(value), use + i)
+                )
+
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO annotation VALUES (?, ?, ?, ?, ?)", records
+            )
+            self.evict()
+
+    def next_use(self):
+        """Next value of the use counter
+
+        last_used orders the entries by their last use. A counter rather
+        than the time keeps the entries stored or hit in one run apart.
+        """
+        return (
+            self.conn.execute(
+                "SELECT COALESCE(MAX(last_used), 0) FROM annotation"
+            ).fetchone()[0]
+            + 1
+        )
+
+    def evict(self):
+        """Delete least recently used entries while over the size limit"""
+        total = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM annotation"
+        ).fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        target = total - int(self.max_size * EVICTION_TARGET)
+        freed, rowids = 0, []
+        cur = self.conn.execute(
+            "SELECT rowid, size FROM annotation ORDER BY last_used, rowid"
+        )
+        for rowid, size in cur:
+            if freed >= target:
+                break
+            freed += size
+            rowids.append(rowid)
+        cur.close()
+
+        for i in range(0, len(rowids), 500):
+            chunk = rowids[i : i + 500]
+            self.conn.execute(
+                "DELETE FROM annotation WHERE rowid IN ({})".format(
+                    ",".join("?" * len(chunk))
+                ),
+                chunk,
+            )
+        logger.info(
+            "annotation cache: evicted {} entries ({} bytes)".format(len(rowids), freed)
+        )
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""Cache of indel calls reused across runs on the same BAM
+
+Calls of the built-in callers depend only on the BAM, the FASTA, the
+caller and its fixed parameters (and refCodingExon.bed.gz with
+--coding-regions-only). Calls are stored per shard, before the
+exon-window screening, under a key derived from these inputs:
+
+    <cache dir>/<key>/calls.pkl          calls by shard
+    <cache dir>/<key>/provenance.json    inputs, versions and timing
+
+Entries are written to a temporary directory and renamed into place,
+so an entry is either complete or absent. Entries are read under a
+shared lock and the total size is kept under a limit by removing the
+least recently used entries under an exclusive lock.
+
+'open_call_cache', 'cached_calls' and 'store_calls' are the main routines of this module
+"""
+
+import os
+import json
+import time
+import pysam
+import pickle
+import shutil
+import socket
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+from ..version import __version__
+from ..bambino_lib.bambino import bambino_command
+from .hot_path_metrics import incr
+from .indel_caller import (
+    min_mapq,
+    min_quality,
+    min_flanking_quality,
+    min_alt_count,
+    hq_mismatch_quality,
+    max_hq_mismatches,
+    max_lq_mismatches,
+    min_unique_coverage,
+)
+from .data_bundle import sha256sum
+from .indel_preprocessor import BambinoIndels
+from .indel_preprocessor import screen_by_exon_window
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CALL_CACHE_FORMAT_VERSION = 1
+
+# evict down to this fraction of the size limit
+EVICTION_TARGET = 0.9
+
+# temporary entries left by interrupted runs are removed after a day
+STALE_SECONDS = 24 * 3600
+
+# the cache currently in use
+_call_cache = None
+
+
+def open_call_cache(cache_dir, max_size_mb):
+    """Use the cache directory (created if not exists)
+
+    Args:
+        cache_dir (str): path to the cache directory
+        max_size_mb (int): limit for the total size of entries in MB
+    Returns:
+        cache (CallCache)
+    """
+    global _call_cache
+    _call_cache = CallCache(cache_dir, max_size_mb * 1024 * 1024)
+    return _call_cache
+
+
+def close_call_cache():
+    global _call_cache
+    _call_cache = None
+
+
+def call_cache_key(bam, fasta, caller, refgene=None):
+    """Key of the calls and the inputs they depend on
+
+    Args:
+        bam (str): path to bam
+        fasta (str): path to fasta
+        caller (str): 'bambino' or 'pysam'
+        refgene (str): path to refCodingExon.bed.gz if calling is restricted
+                       to coding regions. None otherwise
+    Returns:
+        key (str): hex digest
+        inputs (dict): identities of the inputs recorded as provenance
+    """
+    inputs = {
+        "format": CALL_CACHE_FORMAT_VERSION,
+        "rnaindel_version": __version__,
+        "caller": caller,
+        "parameters": caller_parameters(caller),
+        "bam": bam_identity(bam),
+        "fasta": fasta_identity(fasta),
+        "refgene": sha256sum(refgene) if refgene else None,
+    }
+    key = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    # the same files moved or linked elsewhere share the key
+    inputs["paths"] = {
+        "bam": os.path.abspath(bam),
+        "fasta": os.path.abspath(fasta),
+        "refgene": os.path.abspath(refgene) if refgene else None,
+    }
+
+    return key, inputs
+
+
+def caller_parameters(caller):
+    """Fixed parameters of the caller"""
+    if caller == "pysam":
+        return {
+            "min_mapq": min_mapq,
+            "min_quality": min_quality,
+            "min_flanking_quality": min_flanking_quality,
+            "min_alt_count": min_alt_count,
+            "hq_mismatch_quality": hq_mismatch_quality,
+            "max_hq_mismatches": max_hq_mismatches,
+            "max_lq_mismatches": max_lq_mismatches,
+            "min_unique_coverage": min_unique_coverage,
+        }
+    else:
+        return bambino_command("BAM", "FASTA", "OUTPUT", "HEAP")
+
+
+def file_identity(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": int(st.st_mtime)}
+
+
+def bam_identity(bam):
+    """Size, mtime and checksum of the header text"""
+    identity = file_identity(bam)
+    bam_data = pysam.AlignmentFile(bam)
+    identity["header"] = hashlib.sha256(str(bam_data.header).encode()).hexdigest()
+    bam_data.close()
+
+    return identity
+
+
+def fasta_identity(fasta):
+    """Size, mtime and checksum of the index (sequence names and lengths)"""
+    identity = file_identity(fasta)
+    fai = fasta + ".fai"
+    identity["header"] = sha256sum(fai) if os.path.isfile(fai) else None
+
+    return identity
+
+
+def cached_calls(key):
+    """Calls stored under key in the cache currently in use
+
+    Args:
+        key (str): see call_cache_key
+    Returns:
+        chrs (list): chromosomes of the shards
+        calls (iterator): yields (chr, BambinoIndels) not screened by exons
+        (None if not found)
+    """
+    if _call_cache is None:
+        return None
+
+    found = _call_cache.get(key)
+    if found is None:
+        logger.info("call cache: miss {}".format(key))
+        incr("call_cache_misses")
+        return None
+
+    logger.info("call cache: hit {}".format(key))
+    incr("call_cache_hits")
+    chrs, shards = found
+
+    return chrs, iter(shards)
+
+
+def store_calls(key, inputs, chrs, calls):
+    """Pass calls through and store them once all shards are called
+
+    Args:
+        key (str), inputs (dict): see call_cache_key
+        chrs (list): chromosomes of the shards
+        calls (iterable): yields (chr, BambinoIndels) not screened by exons
+    Yields:
+        chr, calls: as received
+    """
+    start = time.time()
+    shards = []
+    for chr, shard in calls:
+        shards.append((chr, shard))
+        yield chr, shard
+
+    if _call_cache is not None:
+        provenance = dict(inputs)
+        provenance["shards"] = chrs
+        provenance["num_of_indels"] = sum(shard.num_of_indels for chr, shard in shards)
+        provenance["calling_seconds"] = round(time.time() - start, 1)
+        provenance["created"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        provenance["host"] = socket.gethostname()
+        _call_cache.put(key, chrs, shards, provenance)
+
+
+def screen_calls(calls, exon_data):
+    """Drop indels with no exon within the annotation window shard by shard"""
+    for chr, shard in calls:
+        yield chr, shard._replace(df=screen_by_exon_window(shard.df, exon_data))
+
+
+class CallCache(object):
+    """Directory of cached calls
+
+    Attributes:
+        cache_dir (str): path to the cache directory
+        max_size (int): limit for the total size of entries in bytes
+    """
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @contextmanager
+    def lock(self, exclusive=False):
+        """Lock on the cache directory (no-op where fcntl is not available)"""
+        if fcntl is None:
+            yield
+            return
+
+        with open(os.path.join(self.cache_dir, ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get(self, key):
+        """Look up an entry
+
+        Args:
+            key (str)
+        Returns:
+            chrs (list), shards (list): [(chr, BambinoIndels)]
+            (None if not found)
+        """
+        entry = os.path.join(self.cache_dir, key)
+        with self.lock():
+            if not os.path.isdir(entry):
+                return None
+            try:
+                with open(os.path.join(entry, "calls.pkl"), "rb") as f:
+                    stored = pickle.load(f)
+                # marks the entry as recently used
+                os.utime(entry, None)
+            except Exception as e:
+                logger.warning("call cache: unreadable entry {} ({})".format(key, e))
+                return None
+
+        shards = [
+            (chr, BambinoIndels(df, num_of_calls, num_of_indels))
+            for chr, df, num_of_calls, num_of_indels in stored["shards"]
+        ]
+
+        return stored["chrs"], shards
+
+    def put(self, key, chrs, shards, provenance):
+        """Store an entry and evict old entries if over the size limit
+
+        Args:
+            key (str)
+            chrs (list): chromosomes of the shards
+            shards (list): [(chr, BambinoIndels)]
+            provenance (dict): recorded in provenance.json
+        Returns:
+            None
+        """
+        stored = {
+            "chrs": chrs,
+            "shards": [
+                (chr, shard.df, shard.num_of_calls, shard.num_of_indels)
+                for chr, shard in shards
+            ],
+        }
+
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=self.cache_dir)
+        with open(os.path.join(tmp_dir, "calls.pkl"), "wb") as f:
+            pickle.dump(stored, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(tmp_dir, "provenance.json"), "w") as f:
+            json.dump(provenance, f, indent=2, sort_keys=True)
+
+        entry = os.path.join(self.cache_dir, key)
+        with self.lock(exclusive=True):
+            if os.path.isdir(entry):
+                # stored by a concurrent run
+                shutil.rmtree(tmp_dir)
+            else:
+                os.rename(tmp_dir, entry)
+                logger.info("call cache: stored {}".format(key))
+            self.evict(keep=key)
+
+    def entries(self):
+        """[(last used, size in bytes, key)] of complete entries"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)
+            )
+            entries.append((os.path.getmtime(path), size, name))
+
+        return entries
+
+    def evict(self, keep=None):
+        """Delete least recently used entries while over the size limit.
+        Called under the exclusive lock.
+
+        Args:
+            keep (str): key of the entry never evicted
+        Returns:
+            None
+        """
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if (
+                name.startswith(".tmp-")
+                and now - os.path.getmtime(path) > STALE_SECONDS
+            ):
+                shutil.rmtree(path, ignore_errors=True)
+
+        entries = sorted(self.entries())
+        total = sum(size for last_used, size, name in entries)
+        if total <= self.max_size:
+            return
+
+        target = int(self.max_size * EVICTION_TARGET)
+        for last_used, size, name in entries:
+            if total <= target:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            total -= size
+            logger.info("call cache: evicted {}".format(name))
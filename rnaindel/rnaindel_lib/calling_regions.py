@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Restrict variant calling to coding regions
+
+Coding exons in refCodingExon.bed.gz are padded and merged into
+calling regions. Reads overlapping the regions are written to a
+temporary BAM, which is passed to the caller instead of the whole BAM.
+
+'restrict_bam_to_coding_regions' is the main routine of this module
+"""
+
+import os
+import pysam
+import logging
+import numpy as np
+from .coding_exon_index import get_coding_exon_index
+
+logger = logging.getLogger(__name__)
+
+
+def restrict_bam_to_coding_regions(bam, refgene, out_dir, padding=100):
+    """Write reads overlapping padded coding exons to a new BAM
+
+    Args:
+        bam (str): path to bam (indexed)
+        refgene (str): path to refCodingExon.bed.gz
+        out_dir (str): directory for the restricted BAM
+        padding (int): nt added to both sides of each exon
+    Returns:
+        restricted_bam (str): path to the restricted and indexed BAM
+    """
+    bam_data = pysam.AlignmentFile(bam)
+    regions = coding_regions(get_coding_exon_index(refgene), bam_data.references, padding)
+
+    restricted_bam = os.path.join(out_dir, "coding_regions.bam")
+    with pysam.AlignmentFile(restricted_bam, "wb", template=bam_data) as out:
+        num_of_reads = write_reads_in_regions(bam_data, regions, out)
+    bam_data.close()
+
+    pysam.index(restricted_bam)
+
+    logger.info(
+        "{} reads in {} coding regions ({} nt) written for variant calling".format(
+            num_of_reads, len(regions), sum(end - start for chr, start, end in regions)
+        )
+    )
+
+    return restricted_bam
+
+
+def coding_regions(exon_data, references, padding):
+    """Merge padded coding exons
+
+    Args:
+        exon_data (CodingExonIndex): coding exon database
+        references (tuple): chromosome names in BAM in the header order
+        padding (int): nt added to both sides of each exon
+    Returns:
+        regions (list): [(chr (str), start (int), end (int))] 0-based, half-open,
+                        in the header order and sorted by start.
+                        chr is named as in BAM
+    """
+    regions = []
+    for chr in references:
+        # refCodingExon.bed.gz is "chr"-prefixed
+        bed_chr = chr if chr.startswith("chr") else "chr" + chr
+        bounds = exon_data.bounds.get(bed_chr)
+        if bounds is None:
+            continue
+
+        first, last = bounds
+        starts = np.maximum(exon_data.exons["start"][first:last] - padding, 0)
+        ends = exon_data.exons["end"][first:last] + padding
+
+        # exons are sorted by start: a new region begins where
+        # the start exceeds all preceding ends
+        max_ends = np.maximum.accumulate(ends)
+        breaks = np.flatnonzero(starts[1:] > max_ends[:-1]) + 1
+        firsts = np.concatenate(([0], breaks))
+        lasts = np.concatenate((breaks, [len(starts)])) - 1
+
+        regions.extend(
+            (chr, int(starts[i]), int(max_ends[j])) for i, j in zip(firsts, lasts)
+        )
+
+    return regions
+
+
+def write_reads_in_regions(bam_data, regions, out):
+    """Write reads overlapping the regions once in the coordinate order
+
+    Args:
+        bam_data (pysam.AlignmentFile): coordinate-sorted and indexed
+        regions (list): merged regions in the header order and sorted by start
+        out (pysam.AlignmentFile): opened for writing
+    Returns:
+        num_of_reads (int)
+    """
+    num_of_reads = 0
+    for read in fetch_reads_in_regions(bam_data, regions):
+        out.write(read)
+        num_of_reads += 1
+
+    return num_of_reads
+
+
+def fetch_reads_in_regions(bam_data, regions):
+    """Iterate over reads overlapping the regions once in the coordinate order
+
+    Args:
+        bam_data (pysam.AlignmentFile): coordinate-sorted and indexed
+        regions (list): merged regions in the header order and sorted by start
+    Yields:
+        read (pysam.AlignedSegment)
+    """
+    prev_chr, prev_end = None, -1
+    for chr, start, end in regions:
+        if chr != prev_chr:
+            prev_end = -1
+
+        for read in bam_data.fetch(chr, start, end):
+            # reads starting before the previous region end were fetched there
+            if read.reference_start < prev_end:
+                continue
+            yield read
+
+        prev_chr, prev_end = chr, end
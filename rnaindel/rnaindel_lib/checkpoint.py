@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Checkpoints of the analysis stages
+
+The output of each stage in main() is written to the checkpoint directory:
+
+    <checkpoint dir>/<stage>.json           key and outputs of the stage
+    <checkpoint dir>/<stage>.<i>.feather    DataFrame outputs
+
+DataFrames are written in Feather if pyarrow is installed and in pickle
+otherwise (or if the DataFrame has columns Feather cannot represent).
+
+The key of a stage is derived from the key of the preceding stage and the
+files (size and mtime) and parameters the stage depends on. With resume,
+stages with a checkpoint of the same key are loaded instead of run.
+
+'open_checkpoints' and 'checkpointed' are the main routines of this module
+"""
+
+import os
+import json
+import hashlib
+import logging
+import pandas as pd
+from ..version import __version__
+from .call_cache import file_identity
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+# holds the index of DataFrames written in Feather
+INDEX_COLUMN = "__checkpoint_index__"
+
+# the checkpoints currently in use
+_checkpoints = None
+
+
+def open_checkpoints(checkpoint_dir, resume=False):
+    """Write (and with resume, read) checkpoints in checkpoint_dir
+
+    Args:
+        checkpoint_dir (str): created if not exists
+        resume (bool): True to load stages with a valid checkpoint
+    Returns:
+        checkpoints (Checkpoints)
+    """
+    global _checkpoints
+    _checkpoints = Checkpoints(checkpoint_dir, resume)
+    return _checkpoints
+
+
+def close_checkpoints():
+    global _checkpoints
+    _checkpoints = None
+
+
+def checkpointed(stage, inputs, run):
+    """Run a stage or load its output from the checkpoint
+
+    Args:
+        stage (str): stage name
+        inputs (list): files, directories and parameters the stage depends on
+                       in addition to the preceding stages
+        run (function): runs the stage. returns a DataFrame or a tuple of
+                        DataFrames and JSON-serializable values
+    Returns:
+        outputs: as returned by run
+    """
+    if _checkpoints is None:
+        return run()
+
+    return _checkpoints.run(stage, inputs, run)
+
+
+def input_identity(value):
+    """Size and mtime for files (and files in directories), value otherwise"""
+    if isinstance(value, str) and os.path.isfile(value):
+        return file_identity(value)
+    elif isinstance(value, str) and os.path.isdir(value):
+        return {
+            name: input_identity(os.path.join(value, name))
+            for name in sorted(os.listdir(value))
+        }
+    else:
+        return value
+
+
+def write_frame(out_dir, name, df):
+    """Write a DataFrame in Feather if possible, pickle otherwise
+
+    Args:
+        out_dir (str): output directory
+        name (str): file name without extension
+        df (pandas.DataFrame)
+    Returns:
+        file_name (str): name.feather or name.pkl
+        fmt (str): 'feather' or 'pickle'
+    """
+    path = os.path.join(out_dir, name)
+    if pyarrow is not None:
+        frame = df.reset_index(drop=True)
+        frame.insert(0, INDEX_COLUMN, df.index)
+        tmp = path + ".feather.tmp"
+        try:
+            frame.to_feather(tmp)
+            os.replace(tmp, path + ".feather")
+            return name + ".feather", "feather"
+        except (pyarrow.ArrowException, TypeError, ValueError) as e:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            logger.info("{} written in pickle ({})".format(name, e))
+
+    tmp = path + ".pkl.tmp"
+    df.to_pickle(tmp)
+    os.replace(tmp, path + ".pkl")
+
+    return name + ".pkl", "pickle"
+
+
+def read_frame(in_dir, file_name, fmt):
+    """Read a DataFrame written by write_frame"""
+    path = os.path.join(in_dir, file_name)
+    if fmt == "feather":
+        frame = pd.read_feather(path)
+        frame.index = pd.Index(frame.pop(INDEX_COLUMN).values)
+        return frame
+    else:
+        return pd.read_pickle(path)
+
+
+class Checkpoints(object):
+    """Checkpoint directory
+
+    Attributes:
+        checkpoint_dir (str)
+        resume (bool): True to load stages with a valid checkpoint
+        key (str): key of the last stage run or loaded
+    """
+
+    def __init__(self, checkpoint_dir, resume=False):
+        self.checkpoint_dir = checkpoint_dir
+        self.resume = resume
+        self.key = "{}:{}".format(CHECKPOINT_FORMAT_VERSION, __version__)
+        if not os.path.isdir(checkpoint_dir):
+            os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def run(self, stage, inputs, run):
+        """See checkpointed"""
+        h = hashlib.sha256(self.key.encode())
+        h.update(stage.encode())
+        h.update(json.dumps([input_identity(i) for i in inputs]).encode())
+        self.key = h.hexdigest()
+
+        if self.resume:
+            outputs = self.load(stage, self.key)
+            if outputs is not None:
+                logger.info("checkpoint: {} loaded".format(stage))
+                return outputs
+
+        outputs = run()
+        self.save(stage, self.key, outputs)
+
+        return outputs
+
+    def path(self, name):
+        return os.path.join(self.checkpoint_dir, name)
+
+    def save(self, stage, key, outputs):
+        """Write the outputs of a stage
+
+        The stage JSON is removed first and written last,
+        so the checkpoint is complete if the JSON exists.
+        """
+        meta_file = self.path(stage + ".json")
+        if os.path.exists(meta_file):
+            os.remove(meta_file)
+
+        is_tuple = isinstance(outputs, tuple)
+        values = outputs if is_tuple else (outputs,)
+
+        meta = {"key": key, "tuple": is_tuple, "outputs": []}
+        for i, value in enumerate(values):
+            if isinstance(value, pd.DataFrame):
+                name, fmt = write_frame(self.checkpoint_dir, "{}.{}".format(stage, i), value)
+                meta["outputs"].append({"file": name, "format": fmt})
+            else:
+                meta["outputs"].append({"value": value})
+
+        tmp = meta_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_file)
+
+        logger.info("checkpoint: {} written".format(stage))
+
+    def load(self, stage, key):
+        """Outputs of a stage if its checkpoint has the key, None otherwise"""
+        meta_file = self.path(stage + ".json")
+        if not os.path.isfile(meta_file):
+            return None
+
+        try:
+            with open(meta_file) as f:
+                meta = json.load(f)
+            if meta["key"] != key:
+                return None
+
+            values = []
+            for output in meta["outputs"]:
+                if "file" in output:
+                    values.append(
+                        read_frame(self.checkpoint_dir, output["file"], output["format"])
+                    )
+                else:
+                    values.append(output["value"])
+        except Exception as e:
+            logger.warning("checkpoint: {} not loaded ({})".format(stage, e))
+            return None
+
+        return tuple(values) if meta["tuple"] else values[0]
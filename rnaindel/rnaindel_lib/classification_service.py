@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+"""Local classification service for interactive use
+
+A long-running process classifies the indels in a region or a handful
+of candidate indels on request. The models and the data directory
+indexes are loaded once (see shared_data) and the worker pool is started
+once, so that a request runs only the analysis stages on the requested
+indels.
+
+Requests are served one at a time over HTTP on localhost or on a Unix
+socket:
+
+    POST /classify  {"bam": path, "region": "chr1:1000-2000"}
+                    {"bam": path, "indels": [{"chr": "chr1", "pos": 1234,
+                                              "ref": "A", "alt": "AT"}]}
+    GET  /stats     numbers of requests, latency and cache statistics
+
+Indels in a region are called by the built-in pysam caller. Candidate
+indels are given in VCF style and analyzed as with an input VCF (-c).
+
+'ClassificationService' and 'serve_requests' are the main routines of this module
+"""
+
+import os
+import re
+import json
+import stat
+import time
+import random
+import signal
+import logging
+import socketserver
+import pandas as pd
+from collections import deque
+from collections import OrderedDict
+from http.server import HTTPServer
+from http.server import BaseHTTPRequestHandler
+from .shared_data import warm_up
+from .shard_pipeline import shard_pipeline
+from .process_profile import process_pool
+from .indel_caller import call_indels_on_chromosome
+from .indel_curator import READ_SAMPLING_SEED
+from .indel_rescuer import indel_rescuer
+from .indel_annotator import indel_annotator
+from .indel_classifier import indel_classifier
+from .indel_classifier import models_in_memory
+from .indel_preprocessor import BambinoIndels
+from .indel_preprocessor import screen_by_exon_window
+from .indel_reclassifier import indel_reclassifier
+from .indel_vcf_writer import indel_vcf_reports
+from .indel_snp_annotator import indel_snp_annotator
+from .indel_postprocessor import indel_postprocessor
+from .indel_vcf_preprocessor import make_data_list
+from .indel_vcf_preprocessor import coding_vcf_indels
+from .indel_protein_processor import indel_protein_processor
+from .indel_sequence_processor import indel_sequence_processor
+from .indel_equivalence_solver import indel_equivalence_solver
+from .coding_exon_index import get_coding_exon_index
+from .annotation_cache import annotation_memo_stats
+from .annotation_cache import clear_annotation_memo
+from .locus_budget import clear_over_budget
+
+logger = logging.getLogger(__name__)
+
+# latencies of the most recent requests kept for the statistics
+LATENCY_WINDOW = 1000
+
+# the annotation memo is cleared before a request when it grows beyond this
+MAX_MEMO_ENTRIES = 100000
+
+region_ptn = re.compile(r"^([^:\s]+):([0-9,]+)-([0-9,]+)$")
+allele_ptn = re.compile(r"^[ACGTNacgtn]+$")
+
+
+class ClassificationService(object):
+    """Data and worker processes kept warm across requests
+
+    Attributes:
+        fasta (str): path to fasta
+        refgene, dbsnp, clinvar, model_dir (str): paths in the data directory
+        mapq (int): MAPQ score for uniquely mapped reads
+        non_somatic_panel (str): path to the panel of non-somatic indels or None
+        max_depth (int): cap on reads without indels per locus or None
+        pool (multiprocessing.Pool): workers for indel_rescuer and indel_classifier
+    """
+
+    def __init__(
+        self,
+        fasta,
+        data_dir,
+        mapq=255,
+        non_somatic_panel=None,
+        num_of_processes=1,
+        max_depth=None,
+    ):
+        self.fasta = fasta
+        self.refgene = "{}/refgene/refCodingExon.bed.gz".format(data_dir)
+        self.dbsnp = "{}/dbsnp/dbsnp.indel.vcf.gz".format(data_dir)
+        self.clinvar = "{}/clinvar/clinvar.indel.vcf.gz".format(data_dir)
+        self.model_dir = "{}/models".format(data_dir)
+        self.mapq = mapq
+        self.non_somatic_panel = non_somatic_panel
+        self.max_depth = max_depth
+
+        warm_up(data_dir)
+        # started after warm_up so that the workers inherit the models
+        self.pool = process_pool(num_of_processes)
+
+        self.started = time.time()
+        self.num_of_requests = 0
+        self.num_of_errors = 0
+        self.num_of_indels = 0
+        self.annotation_hits = 0
+        self.annotation_misses = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def classify(self, request):
+        """Classify the indels of a request
+
+        Args:
+            request (dict): see the module docstring
+        Returns:
+            response (dict): {"indels": [see indel_report],
+                              "latency_ms": {"total": ms, "stages": {stage: ms}},
+                              "cache": {"annotation_hits": int, "annotation_misses": int}}
+        Raises:
+            ValueError: if the request is malformed
+            RuntimeError: if the analysis failed
+        """
+        self.num_of_requests += 1
+        try:
+            response = self.run(request)
+        except Exception:
+            self.num_of_errors += 1
+            raise
+
+        self.num_of_indels += len(response["indels"])
+        self.latencies.append(response["latency_ms"]["total"])
+
+        return response
+
+    def run(self, request):
+        bam = request.get("bam")
+        if not isinstance(bam, str) or not os.path.isfile(bam):
+            raise ValueError("bam not found: {}".format(bam))
+
+        if "region" in request:
+            region = parse_region(request["region"])
+            features = lambda: self.region_features(bam, region)
+        elif "indels" in request:
+            candidates = parse_candidates(request["indels"])
+            features = lambda: self.candidate_features(bam, candidates)
+        else:
+            raise ValueError("either region or indels is required")
+
+        if annotation_memo_stats()["entries"] > MAX_MEMO_ENTRIES:
+            clear_annotation_memo()
+        memo_before = annotation_memo_stats()
+
+        # reads are sampled as in a separate run on the same indels
+        random.seed(READ_SAMPLING_SEED)
+        # flagged over the budget in this request only
+        clear_over_budget()
+
+        start = time.time()
+        stages = OrderedDict()
+        try:
+            indels = self.analyze(features, stages)
+        except SystemExit as e:
+            # stages exit with 0 if no indels are left to analyze
+            if e.code not in (None, 0):
+                raise RuntimeError(str(e.code))
+            indels = []
+
+        memo_after = annotation_memo_stats()
+        hits = memo_after["hits"] - memo_before["hits"]
+        misses = memo_after["misses"] - memo_before["misses"]
+        self.annotation_hits += hits
+        self.annotation_misses += misses
+
+        return {
+            "indels": indels,
+            "latency_ms": {"total": elapsed_ms(start), "stages": stages},
+            "cache": {"annotation_hits": hits, "annotation_misses": misses},
+        }
+
+    def analyze(self, features, stages):
+        """Stages of main() from the feature calculation to the VCF records
+
+        Args:
+            features (function): returns the outputs of preprocess() in main()
+            stages (OrderedDict): elapsed time in ms is set for each stage
+        Returns:
+            indels (list): see indel_report
+        """
+        df, df_filtered_premerge, anno, chr_prefixed = timed(stages, "features", features)
+        df = timed(
+            stages, "protein", lambda: indel_protein_processor(df, anno, self.refgene)
+        )
+        df, df_filtered_postmerge = timed(
+            stages,
+            "equivalence",
+            lambda: indel_equivalence_solver(
+                df, anno, self.fasta, self.refgene, chr_prefixed
+            ),
+        )
+        df = timed(
+            stages,
+            "snp",
+            lambda: indel_snp_annotator(
+                df, self.fasta, self.dbsnp, self.clinvar, chr_prefixed
+            ),
+        )
+        df_filtered = pd.concat(
+            [df_filtered_premerge, df_filtered_postmerge],
+            axis=0,
+            ignore_index=True,
+            sort=True,
+        )
+        df = timed(
+            stages,
+            "classification",
+            lambda: indel_classifier(df, self.model_dir, pool=self.pool),
+        )
+        if self.non_somatic_panel:
+            df = timed(
+                stages,
+                "reclassification",
+                lambda: indel_reclassifier(
+                    df, self.fasta, chr_prefixed, self.non_somatic_panel
+                ),
+            )
+        df, df_filtered, anno = timed(
+            stages,
+            "postprocessing",
+            lambda: indel_postprocessor(
+                df, df_filtered, anno, self.refgene, self.fasta, chr_prefixed
+            ),
+        )
+        df = timed(
+            stages,
+            "report",
+            lambda: indel_vcf_reports(df, df_filtered, anno, self.fasta, chr_prefixed),
+        )
+
+        return [indel_report(row) for i, row in df.iterrows()]
+
+    def region_features(self, bam, region):
+        """Call indels in the region and calculate the features"""
+        chr = region[0]
+        chr, records, num_of_candidates = call_indels_on_chromosome(
+            chr, bam, self.fasta, regions_by_chr={chr: [region]}
+        )
+        df = pd.DataFrame.from_records(records, columns=["chr", "pos", "ref", "alt"])
+        exon_data = get_coding_exon_index(self.refgene)
+        calls = BambinoIndels(
+            screen_by_exon_window(df, exon_data), num_of_candidates, len(df)
+        )
+
+        return shard_pipeline(
+            [chr],
+            [(chr, calls)],
+            bam,
+            self.refgene,
+            self.fasta,
+            self.mapq,
+            pool=self.pool,
+            max_depth=self.max_depth,
+        )
+
+    def candidate_features(self, bam, candidates):
+        """Calculate the features of the candidate indels as for an input VCF"""
+        df = pd.DataFrame(make_data_list(candidates))
+        df, chr_prefixed = coding_vcf_indels(df, bam, self.refgene, self.fasta)
+        df = indel_rescuer(
+            df,
+            self.fasta,
+            bam,
+            chr_prefixed,
+            pool=self.pool,
+            left_aligned=True,
+            external_vcf=True,
+        )
+        df, anno = indel_annotator(df, self.refgene, self.fasta, chr_prefixed)
+        df, df_filtered_premerge = indel_sequence_processor(
+            df, anno, self.fasta, bam, self.mapq, chr_prefixed, max_depth=self.max_depth
+        )
+
+        return df, df_filtered_premerge, anno, chr_prefixed
+
+    def stats(self):
+        """Numbers of requests, latency and cache statistics"""
+        latencies = sorted(self.latencies)
+        if latencies:
+            latency = {
+                "last": self.latencies[-1],
+                "mean": round(sum(latencies) / len(latencies), 1),
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "max": latencies[-1],
+            }
+        else:
+            latency = None
+
+        memo = annotation_memo_stats()
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.num_of_requests,
+            "errors": self.num_of_errors,
+            "indels": self.num_of_indels,
+            "latency_ms": latency,
+            "annotation_memo": {
+                "entries": memo["entries"],
+                "hits": self.annotation_hits,
+                "misses": self.annotation_misses,
+            },
+            "models_in_memory": models_in_memory(),
+        }
+
+
+def parse_region(region):
+    """chr:start-end (1-based, inclusive) to (chr, start, end) (0-based, half-open)"""
+    match = region_ptn.match(region) if isinstance(region, str) else None
+    if not match:
+        raise ValueError("region must be chr:start-end: {}".format(region))
+
+    chr = match.group(1)
+    start, end = [int(match.group(i).replace(",", "")) for i in (2, 3)]
+    if start < 1 or end < start:
+        raise ValueError("invalid region: {}".format(region))
+
+    return chr, start - 1, end
+
+
+def parse_candidates(indels):
+    """Candidate indels to VCF lines
+
+    Args:
+        indels (list): [{"chr": str, "pos": int, "ref": str, "alt": str}] VCF style
+    Returns:
+        lines (list): VCF data lines (see indel_vcf_preprocessor.make_data_list)
+    """
+    if not isinstance(indels, list) or not indels:
+        raise ValueError("indels must be a non-empty list")
+
+    lines = []
+    for indel in indels:
+        try:
+            chr, pos, ref, alt = indel["chr"], indel["pos"], indel["ref"], indel["alt"]
+        except (KeyError, TypeError):
+            raise ValueError("each indel needs chr, pos, ref and alt: {}".format(indel))
+
+        if (
+            not isinstance(chr, str)
+            or not isinstance(pos, int)
+            or pos < 1
+            or not all(isinstance(a, str) and allele_ptn.match(a) for a in (ref, alt))
+        ):
+            raise ValueError("invalid indel: {}".format(indel))
+
+        lines.append("\t".join([chr, str(pos), ".", ref, alt]) + "\n")
+
+    return lines
+
+
+def indel_report(row):
+    """Classification of an indel
+
+    Args:
+        row (pandas.Series): as returned by indel_vcf_reports
+    Returns:
+        report (dict): VCF fields, the predicted class and probabilities
+                       (None for filtered indels) and the annotation
+    """
+    fields = row["vcf"].vcf_record.split("\t")
+
+    predicted_class = row.get("predicted_class")
+    if predicted_class == predicted_class and predicted_class is not None:
+        prob = {
+            "somatic": float(row["prob_s"]),
+            "germline": float(row["prob_g"]),
+            "artifact": float(row["prob_a"]),
+        }
+    else:
+        predicted_class, prob = None, None
+
+    annotation = row["annotation"]
+    return {
+        "chr": fields[0],
+        "pos": int(fields[1]),
+        "id": fields[2],
+        "ref": fields[3],
+        "alt": fields[4],
+        "filter": fields[6],
+        "predicted_class": predicted_class,
+        "prob": prob,
+        "annotation": annotation if annotation == annotation else None,
+        "info": fields[7],
+    }
+
+
+def timed(stages, name, run):
+    start = time.time()
+    outputs = run()
+    stages[name] = elapsed_ms(start)
+    return outputs
+
+
+def elapsed_ms(start):
+    return round((time.time() - start) * 1000, 1)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of sorted values"""
+    return values[max(int(round(q / 100.0 * len(values))) - 1, 0)]
+
+
+class ClassificationRequestHandler(BaseHTTPRequestHandler):
+    """Requests to the service (see the module docstring)"""
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self.respond(200, self.server.service.stats())
+        else:
+            self.respond(404, {"error": "not found: {}".format(self.path)})
+
+    def do_POST(self):
+        if self.path != "/classify":
+            self.respond(404, {"error": "not found: {}".format(self.path)})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode())
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            response = self.server.service.classify(request)
+        except ValueError as e:
+            self.respond(400, {"error": str(e)})
+        except Exception as e:
+            logger.exception("request failed")
+            self.respond(500, {"error": str(e)})
+        else:
+            self.respond(200, response)
+
+    def respond(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # clients on a Unix socket have no address
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return "unix"
+
+    def log_message(self, format, *args):
+        logger.info("{} {}".format(self.address_string(), format % args))
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+class UnixHTTPServer(socketserver.UnixStreamServer):
+    """HTTP server on a Unix socket"""
+
+
+def serve_requests(service, socket_path=None, port=None):
+    """Serve requests until interrupted
+
+    Args:
+        service (ClassificationService)
+        socket_path (str): path to the Unix socket (replaced if exists)
+        port (int): port on 127.0.0.1 if socket_path is None
+    Returns:
+        None
+    """
+    if socket_path:
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, ClassificationRequestHandler)
+    else:
+        server = HTTPServer(("127.0.0.1", port), ClassificationRequestHandler)
+    server.service = service
+
+    # stop as on Ctrl-C so that the socket is removed
+    signal.signal(signal.SIGTERM, interrupt)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+        service.close()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""In-memory interval index of refCodingExon.bed.gz
+
+The coding exon database is parsed once into a structured array
+sorted by chromosome and exon start. Overlap queries follow the
+tabix convention for BED files (0-based half-open intervals)
+so that fetch() is a drop-in replacement for pysam.TabixFile.fetch().
+
+'get_coding_exon_index' is the main routine of this module
+"""
+
+import gzip
+import numpy as np
+from collections import namedtuple
+from .data_bundle import bundled_exons
+
+CodingExon = namedtuple(
+    "CodingExon",
+    [
+        "chr",
+        "start",
+        "end",
+        "accession",
+        "gene_symbol",
+        "exon",
+        "last_exon",
+        "cds_start",
+        "cds_len",
+        "strand",
+        "prev_exon_start",
+        "prev_exon_end",
+        "next_exon_start",
+        "next_exon_end",
+    ],
+)
+
+# string fields are stored as bytes to keep the array compact
+str_fields = ("chr", "accession", "gene_symbol", "strand")
+
+# parsed indexes by path to refCodingExon.bed.gz
+_index_cache = {}
+
+
+def get_coding_exon_index(refgene):
+    """Returns the coding exon index for refgene.
+    The file is parsed only once per process. The pre-built
+    array is used if a compiled data bundle is loaded.
+
+    Args:
+        refgene (str): path to refCodingExon.bed.gz
+    Returns:
+        index (CodingExonIndex)
+    """
+    index = _index_cache.get(refgene)
+    if index is None:
+        exons = bundled_exons(refgene)
+        if exons is not None:
+            index = CodingExonIndex(exons)
+        else:
+            index = CodingExonIndex.from_bed(refgene)
+        _index_cache[refgene] = index
+
+    return index
+
+
+def parse_exon_line(line):
+    """Parse a line of refCodingExon.bed
+
+    Args:
+        line (str): tab-delimited line formatted as:
+                    chr start end acc|gene|exon|last_exon|cds_start|cds_len
+                    strand prev_start|prev_end next_start|next_end
+    Returns:
+        CodingExon (namedtuple)
+    """
+    lst = line.rstrip("\n").split("\t")
+    info = lst[3].split("|")
+    prev_exon = lst[5].split("|")
+    next_exon = lst[6].split("|")
+
+    return CodingExon(
+        lst[0],
+        int(lst[1]),
+        int(lst[2]),
+        info[0],
+        info[1],
+        int(info[2]),
+        int(info[3]),
+        int(info[4]),
+        int(info[5]),
+        lst[4],
+        int(prev_exon[0]),
+        int(prev_exon[1]),
+        int(next_exon[0]),
+        int(next_exon[1]),
+    )
+
+
+def to_exon_array(records):
+    """Convert CodingExon records to a structured array
+    sorted by chromosome (in order of appearance) and start.
+
+    Args:
+        records (list): CodingExon records
+    Returns:
+        exons (np.ndarray): structured array with CodingExon fields
+    """
+    records = list(records)
+    dtype = []
+    for field in CodingExon._fields:
+        if field in str_fields:
+            width = max([len(getattr(rec, field)) for rec in records] + [1])
+            dtype.append((field, "S{}".format(width)))
+        else:
+            dtype.append((field, np.int64))
+
+    exons = np.array(
+        [
+            tuple(v.encode() if isinstance(v, str) else v for v in rec)
+            for rec in records
+        ],
+        dtype=dtype,
+    )
+
+    chr_order = {}
+    for chr in exons["chr"]:
+        chr_order.setdefault(chr, len(chr_order))
+    chr_codes = np.array([chr_order[chr] for chr in exons["chr"]], dtype=np.int64)
+
+    # stable sort keeps the file order for exons sharing a start
+    order = np.lexsort((exons["start"], chr_codes))
+
+    return exons[order]
+
+
+class CodingExonIndex(object):
+    """Sorted interval arrays of coding exons per chromosome
+
+    Attributes:
+        exons (np.ndarray): structured array sorted by chr and start
+        bounds (dict): {chr (str): (first, last + 1) row of the chr in exons}
+        max_ends (dict): {chr (str): np.ndarray of running maximum of ends}
+        max_lens (dict): {chr (str): the longest exon length (int)}
+    """
+
+    def __init__(self, exons):
+        self.exons = exons
+        self.bounds = {}
+        self.max_ends = {}
+        self.max_lens = {}
+        self._acc_len = None
+
+        chrs = exons["chr"]
+        if len(chrs):
+            breaks = np.flatnonzero(chrs[1:] != chrs[:-1]) + 1
+            firsts = np.concatenate(([0], breaks))
+            lasts = np.concatenate((breaks, [len(chrs)]))
+        else:
+            firsts, lasts = [], []
+
+        for first, last in zip(firsts, lasts):
+            chr = chrs[first].decode()
+            starts = exons["start"][first:last]
+            ends = exons["end"][first:last]
+
+            self.bounds[chr] = (int(first), int(last))
+            self.max_ends[chr] = np.maximum.accumulate(ends)
+            self.max_lens[chr] = int((ends - starts).max())
+
+    @classmethod
+    def from_bed(cls, refgene):
+        """Parse refCodingExon.bed.gz
+
+        Args:
+            refgene (str): path to refCodingExon.bed.gz
+        Returns:
+            CodingExonIndex
+        """
+        with gzip.open(refgene, "rt") as f:
+            records = [parse_exon_line(line) for line in f if line.strip()]
+
+        return cls(to_exon_array(records))
+
+    def record(self, i):
+        """Get the i-th exon as CodingExon
+
+        Args:
+            i (int): row in exons
+        Returns:
+            CodingExon (namedtuple)
+        """
+        return CodingExon(
+            *[v.decode() if isinstance(v, bytes) else v for v in self.exons[i].tolist()]
+        )
+
+    def fetch(self, chr, start, end):
+        """Find exons overlapping [start, end)
+
+        Args:
+            chr (str): chromosome name as in refCodingExon.bed.gz
+            start (int): query start
+            end (int): query end
+        Returns:
+            overlapping (list): CodingExon records sorted by start
+                                empty list if none found
+        """
+        bounds = self.bounds.get(chr)
+        if bounds is None:
+            return []
+
+        first, last = bounds
+        starts = self.exons["start"][first:last]
+        ends = self.exons["end"][first:last]
+
+        # an exon overlapping the query starts after (start - longest exon)
+        lo = np.searchsorted(starts, start - self.max_lens[chr], side="right")
+        hi = np.searchsorted(starts, end, side="left")
+
+        return [self.record(first + i) for i in range(lo, hi) if ends[i] > start]
+
+    def has_overlap(self, chrs, starts, ends):
+        """Batch query for overlap with any exon
+
+        Args:
+            chrs (array-like): chromosome names
+            starts (array-like): query starts
+            ends (array-like): query ends
+        Returns:
+            overlaps (np.ndarray): True if [start, end) overlaps an exon
+        """
+        chrs = np.asarray(chrs, dtype=object)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+
+        overlaps = np.zeros(len(chrs), dtype=bool)
+        for chr in set(chrs):
+            bounds = self.bounds.get(chr)
+            if bounds is None:
+                continue
+
+            first, last = bounds
+            exon_starts = self.exons["start"][first:last]
+
+            mask = chrs == chr
+            hi = np.searchsorted(exon_starts, ends[mask], side="left")
+            # running max of ends up to the last exon starting before the query end
+            max_end = np.where(hi > 0, self.max_ends[chr][np.maximum(hi - 1, 0)], -1)
+            overlaps[mask] = max_end > starts[mask]
+
+        return overlaps
+
+    def acc_len(self):
+        """Making a dictionary {accession: CDS_length}
+
+        Args:
+            None
+        Returns:
+            d (dict): {accession (str): coding_seq_length (int)}
+        """
+        if self._acc_len is None:
+            accessions = [acc.decode() for acc in self.exons["accession"].tolist()]
+            self._acc_len = dict(zip(accessions, self.exons["cds_len"].tolist()))
+
+        return self._acc_len
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""Compiled data bundle
+
+'rnaindel compile-data' converts the data directory into a versioned
+bundle stored in <data_dir>/compiled. The bundle consists of
+memory-mappable .npy arrays (coding exons, accession-to-CDS-length table,
+normalized dbSNP and ClinVar indels), uncompressed model pickles and
+manifest.json recording the checksums.
+
+At runtime, only the manifest is read by 'load_data_bundle'. Arrays are
+mapped on first access. Stages ask for the pre-built data with the
+'bundled_*' functions, which return None if the bundle is not loaded
+or the source file is not covered (callers then parse the source).
+
+'compile_data_bundle' and 'load_data_bundle' are the main routines of this module
+"""
+
+import os
+import sys
+import json
+import gzip
+import glob
+import pickle
+import shutil
+import hashlib
+import logging
+import tempfile
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_DIR_NAME = "compiled"
+MANIFEST = "manifest.json"
+
+# columns of the dbSNP/ClinVar table
+snp_int_fields = ("start", "end", "pos", "idl_type", "common")
+snp_str_fields = ("idl_seq", "id", "clin_info")
+
+# the bundle currently in use
+_loaded_bundle = None
+
+
+def source_paths(data_dir):
+    """Paths to the source files in the data directory
+
+    Args:
+        data_dir (str): path to data directory
+    Returns:
+        sources (dict): {key (str): path (str)}
+    """
+    sources = {
+        "refgene": os.path.join(data_dir, "refgene", "refCodingExon.bed.gz"),
+        "dbsnp": os.path.join(data_dir, "dbsnp", "dbsnp.indel.vcf.gz"),
+        "clinvar": os.path.join(data_dir, "clinvar", "clinvar.indel.vcf.gz"),
+    }
+    for model in sorted(glob.glob(os.path.join(data_dir, "models", "*.pkl.gz"))):
+        sources["models/" + os.path.basename(model)] = model
+
+    return sources
+
+
+def sha256sum(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def sklearn_version():
+    try:
+        import sklearn
+
+        return sklearn.__version__
+    except ImportError:
+        return None
+
+
+def pack_strings(strings):
+    """Pack strings into an offset array and a byte blob
+
+    Args:
+        strings (list): str
+    Returns:
+        offsets (np.ndarray): int64, len(strings) + 1
+        blob (np.ndarray): uint8
+    """
+    encoded = [s.encode() for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return offsets, blob
+
+
+class StringColumn(object):
+    """String column stored as offsets and a byte blob"""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i] : self.offsets[i + 1]].tobytes().decode()
+
+
+def snp_table_arrays(path, db):
+    """Normalize dbSNP or ClinVar to column arrays
+
+    Args:
+        path (str): path to dbsnp.indel.vcf.gz or clinvar.indel.vcf.gz
+        db (str): 'dbsnp' or 'clinvar'
+    Returns:
+        arrays (dict): {name (str): np.ndarray}
+                       rows sorted by chr (in order of appearance) and start
+    """
+    from .indel_snp_annotator import read_db_indels
+
+    entries = read_db_indels(path, db)
+
+    chr_order = {}
+    for chr, start, end, entry in entries:
+        chr_order.setdefault(chr, len(chr_order))
+    chr_codes = np.array([chr_order[e[0]] for e in entries], dtype=np.int64)
+    starts = np.array([e[1] for e in entries], dtype=np.int64)
+    order = np.lexsort((starts, chr_codes))
+    entries = [entries[i] for i in order]
+
+    width = max([len(e[0]) for e in entries] + [1])
+    arrays = {
+        "chr": np.array([e[0].encode() for e in entries], dtype="S{}".format(width)),
+        "start": np.array([e[1] for e in entries], dtype=np.int64),
+        "end": np.array([e[2] for e in entries], dtype=np.int64),
+        "pos": np.array([e[3].pos for e in entries], dtype=np.int64),
+        "idl_type": np.array([e[3].idl_type for e in entries], dtype=np.int64),
+        "common": np.array([e[3].common for e in entries], dtype=np.int64),
+        "freq": np.array([e[3].freq for e in entries], dtype=np.float64),
+    }
+    for field in snp_str_fields:
+        offsets, blob = pack_strings([getattr(e[3], field) for e in entries])
+        arrays[field + ".offsets"], arrays[field + ".blob"] = offsets, blob
+
+    return arrays
+
+
+def compile_data_bundle(data_dir, version):
+    """Compile the data directory into <data_dir>/compiled
+
+    The bundle is written to a temporary directory and
+    moved into place when complete.
+
+    Args:
+        data_dir (str): path to data directory
+        version (str): rnaindel version
+    Returns:
+        bundle_dir (str): path to the compiled bundle
+    """
+    from .coding_exon_index import CodingExonIndex
+
+    data_dir = os.path.abspath(data_dir)
+    bundle_dir = os.path.join(data_dir, BUNDLE_DIR_NAME)
+    sources = source_paths(data_dir)
+
+    tmp_dir = tempfile.mkdtemp(prefix=".compiled.", dir=data_dir)
+    try:
+        os.makedirs(os.path.join(tmp_dir, "models"))
+
+        exons = CodingExonIndex.from_bed(sources["refgene"]).exons
+        np.save(os.path.join(tmp_dir, "exons.npy"), exons)
+
+        acc_len = np.array(
+            list(zip(exons["accession"].tolist(), exons["cds_len"].tolist())),
+            dtype=[("accession", exons.dtype["accession"]), ("cds_len", np.int64)],
+        )
+        np.save(os.path.join(tmp_dir, "acc_len.npy"), acc_len)
+
+        for db in ("dbsnp", "clinvar"):
+            os.makedirs(os.path.join(tmp_dir, db))
+            for name, arr in snp_table_arrays(sources[db], db).items():
+                np.save(os.path.join(tmp_dir, db, name + ".npy"), arr)
+
+        for key, path in sources.items():
+            if key.startswith("models/"):
+                with gzip.open(path, "rb") as f:
+                    model = pickle.load(f)
+                out = os.path.join(tmp_dir, key[: -len(".gz")])
+                with open(out, "wb") as f:
+                    pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        files = {}
+        for root, dirs, names in os.walk(tmp_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, tmp_dir)
+                files[rel] = {"size": os.path.getsize(path), "sha256": sha256sum(path)}
+
+        manifest = {
+            "format_version": BUNDLE_FORMAT_VERSION,
+            "rnaindel_version": version,
+            "sklearn_version": sklearn_version(),
+            "sources": {
+                key: {
+                    "path": os.path.relpath(path, data_dir),
+                    "size": os.path.getsize(path),
+                    "mtime": os.path.getmtime(path),
+                    "sha256": sha256sum(path),
+                }
+                for key, path in sources.items()
+            },
+            "files": files,
+        }
+        with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+        if os.path.isdir(bundle_dir):
+            old_dir = tempfile.mkdtemp(prefix=".compiled.old.", dir=data_dir)
+            os.rename(bundle_dir, os.path.join(old_dir, BUNDLE_DIR_NAME))
+            os.rename(tmp_dir, bundle_dir)
+            shutil.rmtree(old_dir)
+        else:
+            os.rename(tmp_dir, bundle_dir)
+    except:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    return bundle_dir
+
+
+class DataBundle(object):
+    """Compiled data bundle with arrays mapped on demand
+
+    Attributes:
+        data_dir (str): absolute path to data directory
+        bundle_dir (str): path to the compiled bundle
+        manifest (dict): parsed manifest.json
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = os.path.abspath(data_dir)
+        self.bundle_dir = os.path.join(self.data_dir, BUNDLE_DIR_NAME)
+        with open(os.path.join(self.bundle_dir, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self._arrays = {}
+        self._models = {}
+
+    def source_key(self, path):
+        """Key of the source file in the manifest, None if not covered"""
+        path = os.path.abspath(path)
+        for key, source in self.manifest["sources"].items():
+            if os.path.join(self.data_dir, source["path"]) == path:
+                return key
+        return None
+
+    def array(self, name):
+        arr = self._arrays.get(name)
+        if arr is None:
+            arr = np.load(os.path.join(self.bundle_dir, name + ".npy"), mmap_mode="r")
+            self._arrays[name] = arr
+        return arr
+
+    def stale_reasons(self, version):
+        """Check if the bundle matches the current data and software
+
+        Args:
+            version (str): rnaindel version
+        Returns:
+            reasons (list): empty if the bundle is usable
+        """
+        reasons = []
+        if self.manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+            reasons.append("bundle format version differs")
+        if self.manifest.get("rnaindel_version") != version:
+            reasons.append("compiled by rnaindel {}".format(self.manifest.get("rnaindel_version")))
+        if self.manifest.get("sklearn_version") != sklearn_version():
+            reasons.append("models pickled with scikit-learn {}".format(self.manifest.get("sklearn_version")))
+
+        current = source_paths(self.data_dir)
+        if set(current) != set(self.manifest["sources"]):
+            reasons.append("source files added or removed")
+        for key, source in self.manifest["sources"].items():
+            path = current.get(key)
+            if path is None or not os.path.isfile(path):
+                continue
+            if (
+                os.path.getsize(path) != source["size"]
+                or os.path.getmtime(path) != source["mtime"]
+            ):
+                reasons.append("{} modified".format(source["path"]))
+
+        return reasons
+
+    def verify(self):
+        """Recompute checksums of the source and compiled files
+
+        Returns:
+            errors (list): empty if all checksums match
+        """
+        errors = []
+        for key, source in self.manifest["sources"].items():
+            path = os.path.join(self.data_dir, source["path"])
+            if not os.path.isfile(path) or sha256sum(path) != source["sha256"]:
+                errors.append("source {} checksum mismatch".format(source["path"]))
+        for rel, info in self.manifest["files"].items():
+            path = os.path.join(self.bundle_dir, rel)
+            if not os.path.isfile(path) or sha256sum(path) != info["sha256"]:
+                errors.append("compiled {} checksum mismatch".format(rel))
+        return errors
+
+    def exons(self):
+        return self.array("exons")
+
+    def acc_len(self):
+        acc_len = self.array("acc_len")
+        accessions = [acc.decode() for acc in acc_len["accession"].tolist()]
+        return dict(zip(accessions, acc_len["cds_len"].tolist()))
+
+    def snp_table(self, db):
+        """Column arrays of dbSNP or ClinVar
+
+        Args:
+            db (str): 'dbsnp' or 'clinvar'
+        Returns:
+            table (dict): arrays with string columns as StringColumn,
+                          'bounds' {chr: (first, last + 1)} and
+                          'max_ends' {chr: running maximum of ends}
+        """
+        table = {"chr": self.array(db + "/chr"), "freq": self.array(db + "/freq")}
+        for field in snp_int_fields:
+            table[field] = self.array("{}/{}".format(db, field))
+        for field in snp_str_fields:
+            table[field] = StringColumn(
+                self.array("{}/{}.offsets".format(db, field)),
+                self.array("{}/{}.blob".format(db, field)),
+            )
+
+        chrs = table["chr"]
+        bounds, max_ends = {}, {}
+        if len(chrs):
+            breaks = np.flatnonzero(chrs[1:] != chrs[:-1]) + 1
+            firsts = np.concatenate(([0], breaks))
+            lasts = np.concatenate((breaks, [len(chrs)]))
+            for first, last in zip(firsts, lasts):
+                chr = chrs[first].decode()
+                bounds[chr] = (int(first), int(last))
+                max_ends[chr] = np.maximum.accumulate(table["end"][first:last])
+        table["bounds"] = bounds
+        table["max_ends"] = max_ends
+
+        return table
+
+    def model(self, key):
+        model = self._models.get(key)
+        if model is None:
+            with open(os.path.join(self.bundle_dir, key[: -len(".gz")]), "rb") as f:
+                model = pickle.load(f)
+            self._models[key] = model
+        return model
+
+
+def load_data_bundle(data_dir, version):
+    """Use the compiled bundle in data_dir if present and up to date
+
+    Args:
+        data_dir (str): path to data directory
+        version (str): rnaindel version
+    Returns:
+        bundle (DataBundle): None if not available
+    """
+    global _loaded_bundle
+    _loaded_bundle = None
+
+    if not os.path.isfile(os.path.join(data_dir, BUNDLE_DIR_NAME, MANIFEST)):
+        return None
+
+    bundle = DataBundle(data_dir)
+    reasons = bundle.stale_reasons(version)
+    if reasons:
+        logger.warning(
+            "Compiled data bundle ignored ({}). Run 'rnaindel compile-data' to rebuild.".format(
+                "; ".join(reasons)
+            )
+        )
+        return None
+
+    _loaded_bundle = bundle
+    return bundle
+
+
+def unload_data_bundle():
+    global _loaded_bundle
+    _loaded_bundle = None
+
+
+def bundled_key(path, prefix=None):
+    if _loaded_bundle is None:
+        return None
+    key = _loaded_bundle.source_key(path)
+    if key is None or (prefix and not key.startswith(prefix)):
+        return None
+    return key
+
+
+def bundled_exons(refgene):
+    """Pre-built exon array for refCodingExon.bed.gz, None if not bundled"""
+    if bundled_key(refgene) == "refgene":
+        return _loaded_bundle.exons()
+    return None
+
+
+def bundled_acc_len(refgene):
+    """Pre-built {accession: CDS_length}, None if not bundled"""
+    if bundled_key(refgene) == "refgene":
+        return _loaded_bundle.acc_len()
+    return None
+
+
+def bundled_snp_table(path):
+    """Pre-built dbSNP or ClinVar table, None if not bundled"""
+    key = bundled_key(path)
+    if key in ("dbsnp", "clinvar"):
+        return _loaded_bundle.snp_table(key)
+    return None
+
+
+def bundled_model(path):
+    """Unpickled model for models/*.pkl.gz, None if not bundled"""
+    key = bundled_key(path, prefix="models/")
+    if key is not None:
+        return _loaded_bundle.model(key)
+    return None
+
+
+def compile_data(argv, version):
+    """Entry point of 'rnaindel compile-data'
+
+    Args:
+        argv (list): command line arguments after 'compile-data'
+        version (str): rnaindel version
+    Returns:
+        None
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="rnaindel compile-data")
+    parser.add_argument(
+        "-d",
+        "--data-dir",
+        metavar="DIR",
+        required=True,
+        help="data directory contains refgene, dbsnp and clinvar databases and models",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="verify checksums of an existing bundle instead of compiling",
+    )
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.data_dir):
+        sys.exit("Error: {} directory Not Found.".format(args.data_dir))
+
+    if args.verify:
+        if not os.path.isfile(os.path.join(args.data_dir, BUNDLE_DIR_NAME, MANIFEST)):
+            sys.exit("Error: no compiled bundle in {}.".format(args.data_dir))
+        bundle = DataBundle(args.data_dir)
+        errors = bundle.verify() + bundle.stale_reasons(version)
+        if errors:
+            sys.exit("Error: " + "; ".join(errors))
+        print("compiled bundle is valid.", file=sys.stderr)
+    else:
+        bundle_dir = compile_data_bundle(args.data_dir, version)
+        print("compiled bundle written to {}.".format(bundle_dir), file=sys.stderr)
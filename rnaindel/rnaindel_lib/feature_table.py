@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Export of the feature table for classification only runs
+
+Indels with all features calculated (after indel_snp_annotator), the
+filtered indels and the annotation table are written to a directory
+and read back by 'rnaindel classify':
+
+    <dir>/features.json         version, inputs and files
+    <dir>/indels.feather        model inputs and annotation of valid indels
+    <dir>/filtered.feather      filtered indels with the filter state
+    <dir>/annotation.feather    annotation table (see indel_annotator)
+
+Tables are written in Feather if pyarrow is installed and in pickle
+otherwise (see checkpoint.write_frame).
+
+'export_features' and 'load_features' are the main routines of this module
+"""
+
+import os
+import json
+import logging
+from .checkpoint import write_frame
+from .checkpoint import read_frame
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "features.json"
+
+FEATURE_TABLE_FORMAT_VERSION = 1
+
+
+def export_features(out_dir, df, df_filtered, anno, chr_prefixed, bam, fasta, version):
+    """Write the feature table
+
+    Args:
+        out_dir (str): output directory (created if not exists)
+        df (pandas.DataFrame): indels as returned by indel_snp_annotator
+        df_filtered (pandas.DataFrame): filtered indels
+        anno (pandas.DataFrame): annotation table
+        chr_prefixed (bool): True if chromosome names are "chr"-prefixed in BAM
+        bam (str): path to bam
+        fasta (str): path to fasta
+        version (str): rnaindel version
+    Returns:
+        None
+    """
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+
+    # the manifest is written last: the export is complete if it exists
+    manifest_file = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest_file):
+        os.remove(manifest_file)
+
+    files = {}
+    for name, frame in (("indels", df), ("filtered", df_filtered), ("annotation", anno)):
+        file_name, fmt = write_frame(out_dir, name, frame)
+        files[name] = {"file": file_name, "format": fmt}
+
+    manifest = {
+        "format_version": FEATURE_TABLE_FORMAT_VERSION,
+        "rnaindel_version": version,
+        "bam": os.path.abspath(bam),
+        "fasta": os.path.abspath(fasta),
+        "chr_prefixed": chr_prefixed,
+        "num_of_indels": len(df),
+        "num_of_filtered": len(df_filtered),
+        "files": files,
+    }
+
+    tmp = manifest_file + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, manifest_file)
+
+    logger.info("{} indels exported to {}".format(len(df), out_dir))
+
+
+def load_features(in_dir, version):
+    """Read the feature table
+
+    Args:
+        in_dir (str): directory written by export_features
+        version (str): rnaindel version
+    Returns:
+        df (pandas.DataFrame), df_filtered (pandas.DataFrame), anno (pandas.DataFrame)
+        manifest (dict): see export_features
+    Raises:
+        ValueError: if the directory has no complete export
+                    or the export format is not supported
+    """
+    manifest_file = os.path.join(in_dir, MANIFEST)
+    if not os.path.isfile(manifest_file):
+        raise ValueError("no exported features in {}".format(in_dir))
+
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != FEATURE_TABLE_FORMAT_VERSION:
+        raise ValueError(
+            "features exported in an unsupported format "
+            "(rnaindel {})".format(manifest.get("rnaindel_version"))
+        )
+
+    if manifest["rnaindel_version"] != version:
+        logger.warning(
+            "features exported by rnaindel {} (running {})".format(
+                manifest["rnaindel_version"], version
+            )
+        )
+
+    files = manifest["files"]
+    df, df_filtered, anno = [
+        read_frame(in_dir, files[name]["file"], files[name]["format"])
+        for name in ("indels", "filtered", "annotation")
+    ]
+
+    return df, df_filtered, anno, manifest
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Counters of the operations on the hot path
+
+With --metrics, the operations below are counted over the run and
+written at exit to a JSON file or, if the file name ends with .prom, in
+the Prometheus text format (e.g., for the textfile collector of the node
+exporter):
+
+    bam_fetches             BAM fetches in extract_all_valid_reads
+    reads_scanned           reads iterated in extract_all_valid_reads
+    reads_sampled_out       reads without indels left out by --max-depth
+    fasta_fetches           FASTA fetches in curate_indel_in_genome and peek_left_base
+    refgene_queries         coding exon queries in indel_annotator
+    dbsnp_queries           dbSNP queries in indel_snp_annotator
+    clinvar_queries         ClinVar queries in indel_snp_annotator
+    pons_queries            panel of non-somatic queries in indel_reclassifier
+    model_loads             models loaded that were not kept in memory
+    annotation_memo_hits    indels annotated earlier in the run
+    annotation_memo_misses
+    annotation_cache_hits   indels found in --annotation-cache
+    annotation_cache_misses
+    call_cache_hits         calls found in --call-cache
+    call_cache_misses
+    over_budget_loci        candidate indels over the time budget (--locus-budget)
+
+The counters are kept in shared memory, so operations in worker
+processes forked after open_metrics (pool workers and batch samples)
+are counted as well. incr is a no-op when the counters are not open.
+
+'open_metrics', 'incr' and 'write_metrics' are the main routines of this module
+"""
+
+import os
+import json
+import logging
+import multiprocessing
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+METRICS = OrderedDict(
+    [
+        ("bam_fetches", "BAM fetches in extract_all_valid_reads"),
+        ("reads_scanned", "Reads iterated in extract_all_valid_reads"),
+        ("reads_sampled_out", "Reads without indels left out by the depth cap"),
+        ("fasta_fetches", "FASTA fetches in curate_indel_in_genome and peek_left_base"),
+        ("refgene_queries", "Coding exon queries"),
+        ("dbsnp_queries", "dbSNP queries"),
+        ("clinvar_queries", "ClinVar queries"),
+        ("pons_queries", "Panel of non-somatic queries"),
+        ("model_loads", "Models loaded that were not kept in memory"),
+        ("annotation_memo_hits", "Indels annotated earlier in the run"),
+        ("annotation_memo_misses", "Indels not annotated earlier in the run"),
+        ("annotation_cache_hits", "Indels found in the annotation cache"),
+        ("annotation_cache_misses", "Indels not found in the annotation cache"),
+        ("call_cache_hits", "Calls found in the call cache"),
+        ("call_cache_misses", "Calls not found in the call cache"),
+        ("over_budget_loci", "Candidate indels over the time budget"),
+    ]
+)
+
+PROMETHEUS_PREFIX = "rnaindel_"
+
+# counters of the current run
+_metrics = None
+
+
+def open_metrics():
+    """Start counting (before worker processes are forked)
+
+    Returns:
+        metrics (HotPathMetrics)
+    """
+    global _metrics
+    _metrics = HotPathMetrics()
+    return _metrics
+
+
+def close_metrics():
+    global _metrics
+    _metrics = None
+
+
+def incr(name, n=1):
+    """Add n to a counter (see METRICS) if counting"""
+    if _metrics is not None:
+        _metrics.incr(name, n)
+
+
+def write_metrics(path):
+    """Write the counters (nothing if not counting)
+
+    Args:
+        path (str): .prom for the Prometheus text format, JSON otherwise
+    Returns:
+        None
+    """
+    if _metrics is not None:
+        _metrics.write(path)
+
+
+class HotPathMetrics(object):
+    """Counters shared with forked processes
+
+    Attributes:
+        values (multiprocessing.Array): a counter for each of METRICS
+        index (dict): {name (str): position in values}
+    """
+
+    def __init__(self):
+        self.values = multiprocessing.Array("q", len(METRICS))
+        self.index = {name: i for i, name in enumerate(METRICS)}
+
+    def incr(self, name, n=1):
+        i = self.index[name]
+        with self.values.get_lock():
+            self.values[i] += n
+
+    def counts(self):
+        with self.values.get_lock():
+            values = self.values[:]
+        return OrderedDict(zip(METRICS, values))
+
+    def write(self, path):
+        """Write JSON, or the Prometheus text format if the path ends with .prom"""
+        counts = self.counts()
+
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            if path.endswith(".prom"):
+                for name, value in counts.items():
+                    metric = PROMETHEUS_PREFIX + name + "_total"
+                    f.write("# HELP {} {}\n".format(metric, METRICS[name]))
+                    f.write("# TYPE {} counter\n".format(metric))
+                    f.write("{} {}\n".format(metric, value))
+            else:
+                json.dump(counts, f, indent=2)
+                f.write("\n")
+        os.replace(tmp, path)
+
+        logger.info("hot path metrics written to {}".format(path))
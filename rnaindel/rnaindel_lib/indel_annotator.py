@@ -8,16 +8,22 @@ indel_annotator is the main routine of this module
 """
 
 import sys
-import pysam
 import logging
 import pandas as pd
 from functools import partial
 from .indel_curator import curate_indel_in_genome
 from .indel_sequence import CodingSequenceWithIndel
+from .coding_exon_index import get_coding_exon_index
+from .annotation_cache import cached_annotations
+from .hot_path_metrics import incr
 
 logger = logging.getLogger(__name__)
 
 
+# long-format annotation table: one row per indel and isoform
+anno_columns = ["indel_id", "gene", "accession", "codon_pos", "effect", "nmd"]
+
+
 def indel_annotator(df, refgene, fasta, chr_prefixed):
     """Sort coding indels and annotate coding indels with variant effect
 
@@ -27,26 +33,44 @@ def indel_annotator(df, refgene, fasta, chr_prefixed):
         fasta (str): path to fasta
     Returns:
         df (pandas.DataFrame): with indels annotated
+        anno (pandas.DataFrame): annotation table with anno_columns
+    """
+    df, anno = annotate_coding_indels(df, refgene, fasta, chr_prefixed)
+
+    if len(df) == 0:
+        logging.warning("No indels annotated in coding region. Analysis done.")
+        sys.exit(0)
+
+    return df, anno
+
+
+def annotate_coding_indels(df, refgene, fasta, chr_prefixed, first_id=0):
+    """Annotate indels and drop those not annotated
+
+    Args:
+        df (pandas.DataFrame): with a header:'chr', 'pos', 'ref', 'alt', 'rescued'
+        refgene (str): path to refCodingExon.bed.gz
+        fasta (str): path to fasta
+        chr_prefixed (bool): True if chromosome names in BAM are "chr"-prefixed
+        first_id (int): indel_id of the first row. ids are numbered in row order
+    Returns:
+        df (pandas.DataFrame): annotated indels (may be empty)
+        anno (pandas.DataFrame): annotation table with anno_columns
     """
     df["is_ins"] = df.apply(is_insertion, axis=1)
     df["indel_seq"] = df.apply(get_indel_seq, axis=1)
+    df["indel_id"] = range(first_id, first_id + len(df))
 
     # performs annotation
-    exon_data = pysam.TabixFile(refgene)
-    anno = partial(
-        annotate_indels, exon_data=exon_data, fasta=fasta, chr_prefixed=chr_prefixed
-    )
-    df["annotation"] = df.apply(anno, axis=1)
+    anno = annotation_table(df, refgene, fasta, chr_prefixed)
 
     # removes unannotated calls (non-coding indels)
-    df = df[df["annotation"] != "-"]
+    df = df[df["indel_id"].isin(anno["indel_id"])]
 
-    if len(df) == 0:
-        logging.warning("No indels annotated in coding region. Analysis done.")
-        sys.exit(0)
+    pd.options.mode.chained_assignment = None
 
     # gene symbols
-    df["gene_symbol"] = df.apply(get_gene_symbol, axis=1)
+    df["gene_symbol"] = df["indel_id"].map(gene_symbols(anno))
 
     # formats the header
     df = df[
@@ -57,12 +81,52 @@ def indel_annotator(df, refgene, fasta, chr_prefixed):
             "alt",
             "rescued",
             "indel_seq",
-            "annotation",
+            "indel_id",
             "gene_symbol",
             "is_ins",
         ]
     ]
-    return df
+    return df, anno
+
+
+def annotation_table(df, refgene, fasta, chr_prefixed, postprocess=False):
+    """Annotates indels and collects the isoform annotations in a table
+
+    Args:
+        df (pandas.DataFrame): with 'indel_id', 'chr', 'pos', 'is_ins', 'indel_seq'
+        refgene (str): path to refCodingExon.bed.gz
+        fasta (str): path to fasta file
+        chr_prefixed (bool): True if chromosome names in BAM are "chr"-prefixed
+        postprocess (bool): True if used in indel_postprocessor. Default to False
+    Returns:
+        anno (pandas.DataFrame): one row per indel and isoform with anno_columns
+                                 in the order of df and isoforms.
+                                 non-coding indels have no row.
+    """
+    exon_data = get_coding_exon_index(refgene)
+
+    def annotate(key):
+        chr, pos, idl_type, idl_seq = key
+        row = {"chr": chr, "pos": pos, "is_ins": idl_type, "indel_seq": idl_seq}
+        return annotate_indels(row, exon_data, fasta, chr_prefixed)
+
+    keys = [
+        (chr, int(pos), int(idl_type), idl_seq)
+        for chr, pos, idl_type, idl_seq in zip(
+            df["chr"], df["pos"], df["is_ins"], df["indel_seq"]
+        )
+    ]
+    results = cached_annotations(keys, annotate, refgene, fasta, chr_prefixed)
+
+    records = []
+    for indel_id, isoforms in zip(df["indel_id"], results):
+        for gene, acc, codon_pos, effect, is_insensitive in isoforms:
+            # NMD is not reported after left-alignment
+            if postprocess:
+                is_insensitive = -1
+            records.append((indel_id, gene, acc, codon_pos, effect, is_insensitive))
+
+    return pd.DataFrame.from_records(records, columns=anno_columns)
 
 
 def is_insertion(row):
@@ -103,16 +167,16 @@ def annotate_indels(row, exon_data, fasta, chr_prefixed, postprocess=False):
     Args: 
         row (pandas.Series): a Series with indices 
                              'chr', 'pos', 'is_ins', 'indel_seq'
-        exon_data (pysam.TabixFile): coding exon database 
+        exon_data (CodingExonIndex): coding exon database 
         fasta (str): path to fasta file
         chr_prefixed (bool): True if chromosome names in BAM are "chr"-prefixed
         postprocess (bool): True if used in indel_postprocessor. Default to False 
     
     Returns:
-        annotation (str): Each token represents an annotation for one 
-                          of the isoforms and is formatted as:
+        annotation (list): Each element represents an annotation for one 
+                           of the isoforms and is a tuple:
            
-            GeneSymbol|RefSeqAccession|AminoAcidPostion|Effect|IsInsensitive
+            (GeneSymbol, RefSeqAccession, CodonPostion, Effect, IsInsensitive)
        
             GeneSymbol: RefSeq gene name
             RefSeqAccession: RefSeq mRNA accession number
@@ -121,9 +185,10 @@ def annotate_indels(row, exon_data, fasta, chr_prefixed, postprocess=False):
             Effect: consequences of the indel.
                     See CodingSequenceWithIndel for detail
             IsInsensitive: 1 if the indel is nonsense-mediated-decay insensitive, 
-                             0 otherwise
+                           0 otherwise
+                           -1 (not evaluated) if postprocess
 
-            '-' for non-coding indels
+            empty list for non-coding indels
     """
     chr = row["chr"]
     pos = row["pos"]
@@ -137,36 +202,18 @@ def annotate_indels(row, exon_data, fasta, chr_prefixed, postprocess=False):
 
     # annotates for all RefSeq isoforms
     annots = []
-    if idls != []:
-        for idl in idls:
-            gene = idl.gene_symbol
-            refseq_acc = idl.accession
-            codon_pos, effect = idl.effect()
+    for idl in idls:
+        codon_pos, effect = idl.effect()
+        if not postprocess:
             is_insensitive = idl.is_nmd_insensitive()
+        else:
+            is_insensitive = -1
 
-            if not postprocess:
-                anno = (
-                    gene
-                    + "|"
-                    + refseq_acc
-                    + "|"
-                    + str(codon_pos)
-                    + "|"
-                    + effect
-                    + "|"
-                    + str(is_insensitive)
-                )
-            else:
-                anno = gene + "|" + refseq_acc + "|" + str(codon_pos) + "|" + effect
-
-            annots.append(anno)
-
-    if len(annots) == 0:
-        annotation = "-"
-    else:
-        annotation = ",".join(annots)
+        annots.append(
+            (idl.gene_symbol, idl.accession, codon_pos, effect, is_insensitive)
+        )
 
-    return annotation
+    return annots
 
 
 def generate_coding_indels(chr, pos, idl_type, idl_seq, exon_data, fasta, chr_prefixed):
@@ -177,7 +224,7 @@ def generate_coding_indels(chr, pos, idl_type, idl_seq, exon_data, fasta, chr_pr
         pos (int): 1-based genomic position
         idl_type (int): 1 for insertion, 0 for deletion
         idl_seq (str): inserted or deleted sequence
-        exon_data (pysam.TabixFile): coding exon database
+        exon_data (CodingExonIndex): coding exon database
         fasta (str): path to fasta file
         chr_prefixed (bool): True if chromosome names in BAM or FASTA are "chr"-prefixed
 
@@ -187,108 +234,80 @@ def generate_coding_indels(chr, pos, idl_type, idl_seq, exon_data, fasta, chr_pr
     """
     coding_idl_lst = []
 
-    try:
-        candidate_genes = exon_data.fetch(chr, pos - 11, pos + 11)
-    except:
-        candidate_genes = None
+    candidate_genes = exon_data.fetch(chr, pos - 11, pos + 11)
+    incr("refgene_queries")
 
     # check for UTR
-    if candidate_genes:
-        for line in candidate_genes:
-            lst = line.split("\t")
-
-            # parsing exon info
-            info = lst[3].split("|")
-            exon = int(info[2])
-            last_exon = int(info[3])
-
-            # exon start and end
-            exon_start, exon_end = int(lst[1]), int(lst[2])
-
-            # strand
-            strand = lst[4]
-
-            # 5'UTR on positive strand (insertion)
-            if strand == "+" and exon == 1 and idl_type == 1 and exon_start >= pos:
-                pass
-            # 5'UTR on positive strand (deletion)
-            elif strand == "+" and exon == 1 and idl_type == 0 and exon_start > pos:
-                pass
-            # 3'UTR on positive strand
-            elif strand == "+" and exon == last_exon and pos > exon_end:
-                pass
-            # 5'UTR on negative strand
-            elif strand == "-" and exon == 1 and pos > exon_end:
-                pass
-            # 3'UTR on negative strand (insertion)
-            elif (
-                strand == "-"
-                and exon == last_exon
-                and idl_type == 1
-                and exon_start >= pos
-            ):
-                pass
-            # 3'UTR on negative strand (deletion)
-            elif (
-                strand == "-"
-                and exon == last_exon
-                and idl_type == 0
-                and exon_start > pos
-            ):
-                pass
-            else:
-                indel_in_reference_genome = curate_indel_in_genome(
-                    fasta, chr, pos, idl_type, idl_seq, chr_prefixed
-                )
-                lt_seq = indel_in_reference_genome.lt_seq
-                rt_seq = indel_in_reference_genome.rt_seq
-
-                accession = info[0]
-                gene_symbol = info[1]
-                cds_start = int(info[4])
-                prev_exon = lst[5].split("|")
-                prev_exon_start, prev_exon_end = int(prev_exon[0]), int(prev_exon[1])
-                next_exon = lst[6].split("|")
-                next_exon_start, next_exon_end = int(next_exon[0]), int(next_exon[1])
-
-                indel = CodingSequenceWithIndel(
-                    chr,
-                    pos,
-                    idl_type,
-                    lt_seq,
-                    idl_seq,
-                    rt_seq,
-                    strand,
-                    accession,
-                    gene_symbol,
-                    exon,
-                    exon_start,
-                    exon_end,
-                    last_exon,
-                    cds_start,
-                    prev_exon_start,
-                    prev_exon_end,
-                    next_exon_start,
-                    next_exon_end,
-                )
-                coding_idl_lst.append(indel)
-
-        return coding_idl_lst
-
-
-def get_gene_symbol(row):
-    """Extracts gene name from annotation
+    for exon_rec in candidate_genes:
+        exon = exon_rec.exon
+        last_exon = exon_rec.last_exon
+
+        # exon start and end
+        exon_start, exon_end = exon_rec.start, exon_rec.end
+
+        # strand
+        strand = exon_rec.strand
+
+        # 5'UTR on positive strand (insertion)
+        if strand == "+" and exon == 1 and idl_type == 1 and exon_start >= pos:
+            pass
+        # 5'UTR on positive strand (deletion)
+        elif strand == "+" and exon == 1 and idl_type == 0 and exon_start > pos:
+            pass
+        # 3'UTR on positive strand
+        elif strand == "+" and exon == last_exon and pos > exon_end:
+            pass
+        # 5'UTR on negative strand
+        elif strand == "-" and exon == 1 and pos > exon_end:
+            pass
+        # 3'UTR on negative strand (insertion)
+        elif (
+            strand == "-" and exon == last_exon and idl_type == 1 and exon_start >= pos
+        ):
+            pass
+        # 3'UTR on negative strand (deletion)
+        elif (
+            strand == "-" and exon == last_exon and idl_type == 0 and exon_start > pos
+        ):
+            pass
+        else:
+            indel_in_reference_genome = curate_indel_in_genome(
+                fasta, chr, pos, idl_type, idl_seq, chr_prefixed
+            )
+            lt_seq = indel_in_reference_genome.lt_seq
+            rt_seq = indel_in_reference_genome.rt_seq
+
+            indel = CodingSequenceWithIndel(
+                chr,
+                pos,
+                idl_type,
+                lt_seq,
+                idl_seq,
+                rt_seq,
+                strand,
+                exon_rec.accession,
+                exon_rec.gene_symbol,
+                exon,
+                exon_start,
+                exon_end,
+                last_exon,
+                exon_rec.cds_start,
+                exon_rec.prev_exon_start,
+                exon_rec.prev_exon_end,
+                exon_rec.next_exon_start,
+                exon_rec.next_exon_end,
+            )
+            coding_idl_lst.append(indel)
+
+    return coding_idl_lst
+
+
+def gene_symbols(anno):
+    """Collects gene names per indel
 
     Args:
-        row (pandas.Series): annotation info (str) at 'annotation' index
+        anno (pandas.DataFrame): annotation table
     Returns:
-        gene_symbol (str): gene name(s)
+        gene_symbol (pandas.Series): comma-delimited gene name(s) indexed by indel_id
     """
-    pd.options.mode.chained_assignment = None
-
-    lst = row["annotation"].split(",")
-    genes = [token.split("|")[0] for token in lst]
-
-    gene_symbol = ",".join(set(genes))
-
-    return gene_symbol
+    return anno.groupby("indel_id")["gene"].agg(lambda x: ",".join(sorted(set(x))))
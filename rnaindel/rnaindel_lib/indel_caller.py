@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""Optional step: built-in indel candidate caller
+
+Collects insertions and deletions in the CIGAR of reads chromosome by
+chromosome in parallel. Reads and events are filtered with the
+thresholds hardcoded for Bambino in bambino_lib:
+
+    -min-mapq 1, -optional-tags XT!=R, -min-quality 20,
+    -min-flanking-quality 20, -min-alt-allele-count 3,
+    -mmf-max-hq-mismatches 8, -mmf-min-hq-quality 15,
+    -mmf-max-lq-mismatches 8, -unique-filter-coverage 2
+
+Bambino's scoring, poly-X and broad-quality heuristics are not
+reproduced. Results are reported in the same form as parsed Bambino
+output so that indel_preprocessor handles both callers.
+
+'indel_caller' is the main routine of this module
+"""
+
+import pysam
+import logging
+import numpy as np
+import pandas as pd
+from functools import partial
+from .indel_preprocessor import BambinoIndels
+from .indel_preprocessor import screen_by_exon_window
+from .indel_preprocessor import is_canonical_chromosome
+from .calling_regions import fetch_reads_in_regions
+from .process_profile import process_pool
+
+logger = logging.getLogger(__name__)
+
+min_mapq = 1
+min_quality = 20
+min_flanking_quality = 20
+min_alt_count = 3
+hq_mismatch_quality = 15
+max_hq_mismatches = 8
+max_lq_mismatches = 8
+min_unique_coverage = 2
+
+# CIGAR operations
+M, I, D, N, S, H, P, EQ, X = range(9)
+aligned_ops = (M, EQ, X)
+
+
+def indel_caller(bam, fasta, exon_data=None, regions=None, num_of_processes=1):
+    """Call indel candidates
+
+    Args:
+        bam (str): path to bam (indexed)
+        fasta (str): path to fasta
+        exon_data (CodingExonIndex): if given, indels with no exon within
+                                     the annotation window are dropped
+        regions (list): if given, only reads overlapping the regions are used.
+                        see calling_regions.coding_regions
+        num_of_processes (int): chromosomes processed in parallel
+    Returns:
+        calls (list): BambinoIndels for each chromosome in the header order
+                      num_of_calls counts candidates before the count filters
+    """
+    chrs = calling_chromosomes(bam, regions)
+    calls = dict(
+        call_indels(chrs, bam, fasta, exon_data, regions, num_of_processes)
+    )
+
+    return [calls[chr] for chr in chrs]
+
+
+def calling_chromosomes(bam, regions=None):
+    """Canonical chromosomes in the header order (with regions if given)"""
+    bam_data = pysam.AlignmentFile(bam)
+    chrs = [chr for chr in bam_data.references if is_canonical_chromosome(chr)]
+    bam_data.close()
+
+    if regions is not None:
+        with_regions = set(region[0] for region in regions)
+        chrs = [chr for chr in chrs if chr in with_regions]
+
+    return chrs
+
+
+def call_indels(chrs, bam, fasta, exon_data=None, regions=None, num_of_processes=1):
+    """Call indels on the chromosomes and yield calls as chromosomes complete
+
+    Worker processes are started on the first iteration and terminated
+    if the iteration stops early.
+
+    Args:
+        chrs (list): see calling_chromosomes
+        bam, fasta, exon_data, regions, num_of_processes: see indel_caller
+    Yields:
+        chr (str): chromosome name as in BAM
+        calls (BambinoIndels): calls on the chromosome
+    """
+    regions_by_chr = None
+    if regions is not None:
+        regions_by_chr = {}
+        for region in regions:
+            regions_by_chr.setdefault(region[0], []).append(region)
+
+    call = partial(
+        call_indels_on_chromosome, bam=bam, fasta=fasta, regions_by_chr=regions_by_chr
+    )
+
+    num_of_indels = 0
+    pool = process_pool(num_of_processes)
+    completed = False
+    try:
+        for chr, records, num_of_candidates in pool.imap_unordered(call, chrs):
+            df = pd.DataFrame.from_records(
+                records, columns=["chr", "pos", "ref", "alt"]
+            )
+            num_of_indels += len(df)
+            calls = BambinoIndels(df, num_of_candidates, len(df))
+            if exon_data is not None:
+                calls = calls._replace(df=screen_by_exon_window(df, exon_data))
+            yield chr, calls
+        completed = True
+    finally:
+        # stopped early or failed: workers still calling are not waited for
+        if completed:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
+
+    logger.info("{} indels called on {} chromosomes".format(num_of_indels, len(chrs)))
+
+
+def call_indels_on_chromosome(chr, bam, fasta, regions_by_chr=None):
+    """Call indels on a chromosome
+
+    Args:
+        chr (str): chromosome name as in BAM
+        bam (str): path to bam
+        fasta (str): path to fasta
+        regions_by_chr (dict): {chr: regions} to restrict reads
+    Returns:
+        chr (str): as given
+        records (list): (chr, pos, ref, alt) sorted by pos
+                        "chr"-prefixed and formatted as in indel_preprocessor
+        num_of_candidates (int): distinct indels seen before count filters
+    """
+    bam_data = pysam.AlignmentFile(bam)
+    fa = pysam.FastaFile(fasta)
+
+    if regions_by_chr is None:
+        reads = bam_data.fetch(chr)
+    else:
+        reads = fetch_reads_in_regions(bam_data, regions_by_chr[chr])
+
+    # {(pos, idl_type, idl_seq or deletion length): [alt_count, {(start, strand)}]}
+    support = {}
+    for read in reads:
+        if not is_callable_read(read):
+            continue
+
+        for key in indel_events(read):
+            s = support.get(key)
+            if s is None:
+                s = support[key] = [0, set()]
+            s[0] += 1
+            s[1].add((read.reference_start, read.is_reverse))
+
+    fa_chr = fasta_chr_name(chr, fa.references)
+    out_chr = chr if chr.startswith("chr") else "chr" + chr
+
+    records = []
+    for (pos, idl_type, idl), (alt_count, starts) in sorted(support.items()):
+        if alt_count < min_alt_count or len(starts) < min_unique_coverage:
+            continue
+
+        if idl_type == 1:
+            records.append((out_chr, pos, "-", idl))
+        else:
+            # pos is 1-based: the first deleted base
+            deleted = fa.fetch(fa_chr, pos - 1, pos - 1 + idl).upper()
+            records.append((out_chr, pos, deleted, "-"))
+
+    bam_data.close()
+    fa.close()
+
+    return chr, records, len(support)
+
+
+def is_callable_read(read):
+    """Read-level filters
+
+    Args:
+        read (pysam.AlignedSegment)
+    Returns:
+        is_callable (bool): True if the read passes the filters
+                            and contains an insertion or deletion
+    """
+    if (
+        read.is_unmapped
+        or read.is_secondary
+        or read.is_supplementary
+        or read.is_duplicate
+        or read.is_qcfail
+        or read.mapping_quality < min_mapq
+        or read.query_qualities is None
+    ):
+        return False
+
+    cigar = read.cigartuples
+    if not cigar or not any(op == I or op == D for op, n in cigar):
+        return False
+
+    if read.has_tag("XT") and read.get_tag("XT") == "R":
+        return False
+
+    return passes_mismatch_filter(read)
+
+
+def passes_mismatch_filter(read):
+    """Reject reads with many mismatches (requires MD tag)
+
+    Args:
+        read (pysam.AlignedSegment)
+    Returns:
+        passes (bool): True if the mismatches are within the limits
+                       or the read has no MD tag
+    """
+    if not read.has_tag("MD"):
+        return True
+
+    quals = read.query_qualities
+    hq, lq = 0, 0
+    for qpos, rpos, ref_base in read.get_aligned_pairs(matches_only=True, with_seq=True):
+        if ref_base.islower():
+            if quals[qpos] >= hq_mismatch_quality:
+                hq += 1
+            else:
+                lq += 1
+
+    return hq <= max_hq_mismatches and lq <= max_lq_mismatches
+
+
+def indel_events(read):
+    """Insertions and deletions passing the quality filters
+
+    Args:
+        read (pysam.AlignedSegment)
+    Returns:
+        events (list): (pos, 1, inserted_seq) for insertions
+                       (pos, 0, deletion_length) for deletions
+                       pos is 1-based: the base after the insertion
+                       or the first deleted base
+    """
+    events = []
+    seq = read.query_sequence
+    quals = read.query_qualities
+    cigar = read.cigartuples
+
+    qpos, rpos = 0, read.reference_start
+    for i, (op, n) in enumerate(cigar):
+        if op in aligned_ops:
+            qpos += n
+            rpos += n
+        elif op == I or op == D:
+            # indels flanked by aligned bases only
+            if (
+                0 < i < len(cigar) - 1
+                and cigar[i - 1][0] in aligned_ops
+                and cigar[i + 1][0] in aligned_ops
+            ):
+                if op == I:
+                    flanking = min(quals[qpos - 1], quals[qpos + n])
+                    inserted = np.mean(quals[qpos : qpos + n])
+                    if flanking >= min_flanking_quality and inserted >= min_quality:
+                        events.append((rpos + 1, 1, seq[qpos : qpos + n].upper()))
+                else:
+                    flanking = min(quals[qpos - 1], quals[qpos])
+                    if flanking >= min_flanking_quality:
+                        events.append((rpos + 1, 0, n))
+
+            if op == I:
+                qpos += n
+            else:
+                rpos += n
+        elif op == N:
+            rpos += n
+        elif op == S:
+            qpos += n
+
+    return events
+
+
+def fasta_chr_name(chr, references):
+    """Chromosome name in FASTA for the BAM chromosome name"""
+    if chr in references:
+        return chr
+    elif chr.startswith("chr") and chr[3:] in references:
+        return chr[3:]
+    else:
+        return "chr" + chr
@@ -13,10 +13,15 @@ import logging
 import numpy as np
 import pandas as pd
 from functools import partial
-from multiprocessing import Pool
+from .data_bundle import bundled_model
+from .hot_path_metrics import incr
+from .process_profile import process_pool
 
 logger = logging.getLogger(__name__)
 
+# models kept in memory {path: model} (see shared_data)
+_models = {}
+
 
 def indel_classifier(df, model_dir, **kwargs):
     """ Makes prediction
@@ -24,12 +29,14 @@ def indel_classifier(df, model_dir, **kwargs):
         df (pandas.DataFrame)
         model_dir (str): path to dir where models are locaded
         processes (int): a positive interger for the number of processes 
+        pool (multiprocessing.Pool): used instead of starting a new pool if given
     Returns:
        df (pandas.DataFrame) : with prediction
     """
     num_of_processes = kwargs.pop("num_of_processes", 1)
+    pool = kwargs.pop("pool", None)
 
-    df = calculate_proba(df, model_dir, num_of_processes)
+    df = calculate_proba(df, model_dir, num_of_processes, pool)
     df["predicted_class"] = df.apply(predict_class, axis=1)
 
     # used in later step
@@ -38,13 +45,14 @@ def indel_classifier(df, model_dir, **kwargs):
     return df
 
 
-def calculate_proba(df, model_dir, num_of_processes):
+def calculate_proba(df, model_dir, num_of_processes, pool=None):
     """ Calculates prediction probability for 1-nt (mono) and >1-mt (non-mono) indels
     Args:
         df (pandas.DataFrame): with features calculated 
         model_dir (str): path to dir where model pickle files are located
         num_of_processes (int): a kwarg to specify number of processes for multiprocessing.pool
                                 Default = 1
+        pool (multiprocessing.Pool): used instead of starting a new pool if given
     Returns:
         df (pandas.DataFrame): with prediction probabaility for somatic, germline, artifact
     """
@@ -84,14 +92,14 @@ def calculate_proba(df, model_dir, num_of_processes):
     df["order"] = df.index
     df_mono, df_non_mono = split_by_indel_size(df)
 
-    pool = Pool(num_of_processes)
+    own_pool = pool is None
+    if own_pool:
+        pool = process_pool(num_of_processes)
     header = ["prob_a", "prob_g", "prob_s"]
 
     # prediction for mono indels
     if len(df_mono) > 0:
-        mono_models = [
-            os.path.join(model_dir, "mono." + str(i) + ".pkl.gz") for i in range(20)
-        ]
+        mono_models = model_paths(model_dir, "mono")
         mono_pred = partial(predict, data=df_mono, features=mono_features)
         mono_proba = np.average(pool.map(mono_pred, mono_models), axis=0)
         dfp_mono = pd.DataFrame(data=mono_proba)
@@ -103,9 +111,7 @@ def calculate_proba(df, model_dir, num_of_processes):
 
     # prediction for non mono indels
     if len(df_non_mono) > 0:
-        non_mono_models = [
-            os.path.join(model_dir, "non_mono." + str(i) + ".pkl.gz") for i in range(20)
-        ]
+        non_mono_models = model_paths(model_dir, "non_mono")
         non_mono_pred = partial(predict, data=df_non_mono, features=non_mono_features)
         non_mono_proba = np.average(pool.map(non_mono_pred, non_mono_models), axis=0)
         dfp_non_mono = pd.DataFrame(data=non_mono_proba)
@@ -115,6 +121,10 @@ def calculate_proba(df, model_dir, num_of_processes):
 
     df_non_mono = pd.concat([df_non_mono, dfp_non_mono], axis=1)
 
+    if own_pool:
+        pool.close()
+        pool.join()
+
     # format output
     df = pd.concat([df_mono, df_non_mono], axis=0)
     df.sort_values("order", inplace=True)
@@ -151,12 +161,44 @@ def predict(model, data, features):
         prob (tuple): (artifact_prob, germline_prob, somatic_prob) 
     """
     X = data[features]
-    model_pkl = gzip.open(model, "rb")
-    rf = pickle.load(model_pkl)
+    rf = load_model(model)
     prob = rf.predict_proba(X)
     return prob
 
 
+def model_paths(model_dir, kind):
+    """Paths to the 20 models for 'mono' or 'non_mono' indels"""
+    return [
+        os.path.join(model_dir, kind + "." + str(i) + ".pkl.gz") for i in range(20)
+    ]
+
+
+def load_model(model, keep=False):
+    """Unpickled model (from the compiled bundle if loaded)
+
+    Args:
+        model (str): path to .pkl.gz
+        keep (bool): True to keep the model in memory for later calls
+    Returns:
+        rf (sklearn.ensemble.RandomForestClassifier)
+    """
+    rf = _models.get(model)
+    if rf is None:
+        incr("model_loads")
+        rf = bundled_model(model)
+        if rf is None:
+            with gzip.open(model, "rb") as model_pkl:
+                rf = pickle.load(model_pkl)
+        if keep:
+            _models[model] = rf
+
+    return rf
+
+
+def models_in_memory():
+    return len(_models)
+
+
 def predict_class(row):
     """ Assign class based on the highest probability
     Args:
@@ -8,9 +8,14 @@ from .most_common import most_common
 from .indel_sequence import SequenceWithIndel
 from .indel_sequence import PileupWithIndel
 from .indel_sequence import PileupWithIndelNotFound
+from .locus_trace import count
+from .hot_path_metrics import incr
+from .locus_budget import check_budget
 
 
-random.seed(123)
+# seed for sampling reads in curate_indel_in_pileup
+READ_SAMPLING_SEED = 123
+random.seed(READ_SAMPLING_SEED)
 cigar_ptn = re.compile(r"[0-9]+[MIDNSHPX=]")
 
 
@@ -54,6 +59,7 @@ def curate_indel_in_genome(fasta, chr, pos, idl_type, idl_seq, chr_prefixed):
     start, end = pos - window, pos - 1
     # retrieve left flank sequence in FASTA format
     lt_fasta = pysam.faidx(fasta, chr + ":" + str(start) + "-" + str(end))
+    incr("fasta_fetches")
     # extract the sequence string
     lt_seq = lt_fasta.split("\n")[1]
 
@@ -64,6 +70,7 @@ def curate_indel_in_genome(fasta, chr, pos, idl_type, idl_seq, chr_prefixed):
 
         # retrieve right flank sequence in FASTA format
         rt_fasta = pysam.faidx(fasta, chr + ":" + str(start) + "-" + str(end))
+        incr("fasta_fetches")
         # extract the seqence string
         rt_seq = rt_fasta.split("\n")[1]
     # for deletion
@@ -73,6 +80,7 @@ def curate_indel_in_genome(fasta, chr, pos, idl_type, idl_seq, chr_prefixed):
 
         # retrieve right flank sequence in FASTA format
         rt_fasta = pysam.faidx(fasta, chr + ":" + str(start) + "-" + str(end))
+        incr("fasta_fetches")
         # extract the seqence string
         rt_seq = rt_fasta.split("\n")[1]
 
@@ -159,29 +167,92 @@ def extract_all_valid_reads(bam_data, chr, pos, chr_prefixed):
            Read_4            CGTTC-G>>>>>>>>>>>>>>AAATCGA (non-primary)   
            Read_5     >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
     """
+    return list(iter_valid_reads(bam_data, chr, pos, chr_prefixed))
+
+
+def iter_valid_reads(bam_data, chr, pos, chr_prefixed, max_reads=None):
+    """Yields the reads of extract_all_valid_reads one by one
+    (from the first max_reads reads in the BAM if given)"""
     if not chr_prefixed:
         chr = chr.replace("chr", "")
 
     all_reads = bam_data.fetch(chr, pos, pos + 1, until_eof=True)
+    incr("bam_fetches")
 
-    valid_reads = []
+    scanned, valid = 0, 0
     for read in all_reads:
+        if scanned == max_reads:
+            break
+        check_budget()
+        scanned += 1
         # excludes duplicate or non-primary alignments
         if read.is_duplicate == False and read.is_secondary == False:
             blocks = read.get_blocks()
             for block in blocks:
                 # excludes skipping reads
                 if block[0] <= pos <= block[1]:
-                    valid_reads.append(read)
+                    valid += 1
+                    yield read
+
+    incr("reads_scanned", scanned)
+    count("reads_fetched", valid)
+
+
+def sample_valid_reads(bam_data, chr, pos, chr_prefixed, max_depth, max_reads=None):
+    """Extracts the valid reads (see extract_all_valid_reads) with
+    those without indels reservoir-sampled down to max_depth
+
+    The sampling is seeded by the locus, so the same reads are
+    sampled regardless of the order in which loci are analyzed.
+
+    Args:
+        bam_data (pysam.AlignmentFile obj)
+        chr (str): chr1-22, chrX or chrY. Note "chr"-prefixed
+        pos (int): 0-based coordinate
+        chr_prefixed (bool): True if chromosome names are "chr"-prefixed
+        max_depth (int): max number of reads without indels kept
+        max_reads (int): if given, only the first max_reads reads are scanned
+    Returns:
+        sampled_reads (list): all reads with indels and sampled reads
+                              without indels in the order in the BAM
+        read_names (set): names of all valid reads
+    """
+    rng = random.Random("{}:{}:{}".format(READ_SAMPLING_SEED, chr, pos))
+
+    indel_reads, reservoir, read_names = [], [], set()
+    num_of_non_indel_reads = 0
+    valid_reads = iter_valid_reads(bam_data, chr, pos, chr_prefixed, max_reads)
+    for i, read in enumerate(valid_reads):
+        read_names.add(read.query_name)
+
+        cigarstring = read.cigarstring
+        if "I" in cigarstring or "D" in cigarstring:
+            indel_reads.append((i, read))
+            continue
 
-    return valid_reads
+        if num_of_non_indel_reads < max_depth:
+            reservoir.append((i, read))
+        else:
+            j = rng.randrange(num_of_non_indel_reads + 1)
+            if j < max_depth:
+                reservoir[j] = (i, read)
+        num_of_non_indel_reads += 1
+
+    if num_of_non_indel_reads > max_depth:
+        incr("reads_sampled_out", num_of_non_indel_reads - max_depth)
+
+    sampled_reads = [
+        read for i, read in sorted(indel_reads + reservoir, key=lambda x: x[0])
+    ]
+
+    return sampled_reads, read_names
 
 
 def extract_indel_reads(reads, pos, ins_or_del):
     """Extract reads with indel at locus specified by chr and pos
 
     Args:
-        reads (list): a list of pysam.AlignedSegment obj.
+        reads (iterable): pysam.AlignedSegment obj.
         pos (int): 0-based coordinate
         ins_or_del (str): 'I' for insertion or 'D' insertion
     Returns:
@@ -199,6 +270,7 @@ def extract_indel_reads(reads, pos, ins_or_del):
     """
     parsed_indel_reads = []
     for read in reads:
+        check_budget()
         ref_pos = read.reference_start
         cigarstring = read.cigarstring
 
@@ -514,7 +586,17 @@ def infer_del_seq_from_data(decomposed_non_idl_reads, idl_flanks, del_seq):
     return inferred_seq
 
 
-def curate_indel_in_pileup(bam_data, chr, pos, idl_type, idl_seq, mapq, chr_prefixed):
+def curate_indel_in_pileup(
+    bam_data,
+    chr,
+    pos,
+    idl_type,
+    idl_seq,
+    mapq,
+    chr_prefixed,
+    max_depth=None,
+    max_reads=None,
+):
     """Generates an object describing what indel looks like
     in the pileup view.
     
@@ -526,6 +608,11 @@ def curate_indel_in_pileup(bam_data, chr, pos, idl_type, idl_seq, mapq, chr_pref
         idl_seq (str): inserted or deleted sequence
         mapq (int): MAPQ for uniquely mapped reads
         chr_prefixed (bool): True if chromosome names in BAM are "chr"-prefixed
+        max_depth (int): if given, reads without indels are sampled down to
+                         max_depth (see sample_valid_reads). ref_count and
+                         alt_count are counted over all reads
+        max_reads (int): if given with max_depth, only the first max_reads
+                         reads are scanned (and counted)
     Returns:
         PileupWithIndel object: if indels found as specified with 
                                 chr, pos, idl_type and idl_seq 
@@ -544,7 +631,13 @@ def curate_indel_in_pileup(bam_data, chr, pos, idl_type, idl_seq, mapq, chr_pref
         del_or_ins = "I"
 
     # extract all good reads covering the locus of interest
-    all_reads = extract_all_valid_reads(bam_data, chr, pos, chr_prefixed)
+    if max_depth:
+        all_reads, valid_read_names = sample_valid_reads(
+            bam_data, chr, pos, chr_prefixed, max_depth, max_reads
+        )
+    else:
+        all_reads = extract_all_valid_reads(bam_data, chr, pos, chr_prefixed)
+        valid_read_names = set(read.query_name for read in all_reads)
 
     ###########################
     # Analysis of indel reads #
@@ -644,7 +737,7 @@ def curate_indel_in_pileup(bam_data, chr, pos, idl_type, idl_seq, mapq, chr_pref
     ########################
 
     # fragment count by unifiying the read name
-    total_count, alt_count = len(set(all_read_names)), len(set(idl_read_names))
+    total_count, alt_count = len(valid_read_names), len(set(idl_read_names))
     ref_count = total_count - alt_count
 
     # decide if the indel is close to exon boundary
@@ -16,15 +16,16 @@ from functools import partial
 from .indel_curator import curate_indel_in_genome
 from .indel_protein_processor import acc_len_dict
 
-mrna = re.compile(r"NM_[0-9]+")
+mrna = re.compile(r"(NM_[0-9]+)")
 
 
-def indel_equivalence_solver(df, fasta, refgene, chr_prefixed):
+def indel_equivalence_solver(df, anno, fasta, refgene, chr_prefixed):
     """Solve indel equivalence and calculates 
     indels_per_gene (ipg)
     
     Args:
         df (pandas.DataFrame)
+        anno (pandas.DataFrame): annotation table
         fasta (str): path to .fa
         refgene (str): path to refCodingExon.bed.gz
         chr_prefixed (bool): True if chromosome names are "chr"-prefixed
@@ -41,8 +42,7 @@ def indel_equivalence_solver(df, fasta, refgene, chr_prefixed):
 
     # counts indels per transcript in an equivalent aware way
     acc_len = acc_len_dict(refgene)
-    dfg = df.groupby("gene_symbol")
-    df = dfg.apply(partial(indels_per_gene, d=acc_len))
+    df["ipg"] = df["gene_symbol"].map(indels_per_gene(df, anno, acc_len))
 
     df.drop(["gene_symbol", "equivalence_id"], axis=1, inplace=True)
 
@@ -290,24 +290,39 @@ def merge_equivalents(df):
     return df
 
 
-def indels_per_gene(df, d):
+def indels_per_gene(df, anno, d):
     """Counts the number of indels per gene (ipg)
     
     Args:
-       df (pandas.DataFrame): grouped by 'gene_symbol'
+       df (pandas.DataFrame): with 'gene_symbol', 'equivalence_id', 'indel_id'
+       anno (pandas.DataFrame): annotation table
        d (dict): acc_len dict
     Returns:
-       df (pandas.DataFrame): 'ipg' column added
+       ipg (pandas.Series): indexed by gene_symbol
     """
-    equivalence_corrected_num_of_indels = len(df["equivalence_id"].unique())
-    anno_str = ",".join(df["annotation"].values)
+    median_cds_len = 1323
 
-    try:
-        acc_lst = re.findall(mrna, anno_str)
-        ipg = [equivalence_corrected_num_of_indels * 1000 / d[acc] for acc in acc_lst]
-        df["ipg"] = np.median(ipg)
-    except:
-        median_cds_len = 1323
-        df["ipg"] = equivalence_corrected_num_of_indels / median_cds_len
+    # equivalence-corrected number of indels
+    num_of_indels = df.groupby("gene_symbol")["equivalence_id"].nunique()
 
-    return df
+    # NM_ accessions annotated to the indels in each gene
+    isoforms = pd.merge(
+        df[["indel_id", "gene_symbol"]],
+        anno[["indel_id", "accession"]],
+        on="indel_id",
+    )
+    isoforms["acc"] = isoforms["accession"].str.extract(mrna, expand=False)
+    isoforms = isoforms.dropna(subset=["acc"])
+    isoforms["cds_len"] = isoforms["acc"].map(d)
+    isoforms["ipg"] = (
+        isoforms["gene_symbol"].map(num_of_indels) * 1000 / isoforms["cds_len"]
+    )
+
+    ipg = isoforms.groupby("gene_symbol")["ipg"].median()
+
+    # median CDS length if the length is unknown for any of the isoforms
+    unknown = isoforms[isoforms["cds_len"].isnull()]["gene_symbol"].unique()
+    ipg = ipg.reindex(num_of_indels.index)
+    ipg[unknown] = num_of_indels[unknown] / median_cds_len
+
+    return ipg
@@ -9,25 +9,29 @@ Left-align, unify equivalents and format the result
 import sys
 import pysam
 import logging
+import pandas as pd
 from functools import partial
 from .left_aligner import lt_aln
 from .indel_sequence import Indel
-from .indel_annotator import annotate_indels
+from .indel_annotator import annotation_table
 
 logger = logging.getLogger(__name__)
 
 
-def indel_postprocessor(df, df_filtered, refgene, fasta, chr_prefixed):
+def indel_postprocessor(df, df_filtered, anno, refgene, fasta, chr_prefixed):
     """Main routine to perform left-alingment, unification, and formatting
      
     Args:
         df (pandas.DataFrame): df with successful entries
         df_filtered (pandas.DataFrame): df with filtered entries 
+        anno (pandas.DataFrame): annotation table
         refgene (str): path to refCodingExon.bed.gz
         fasta (str): path to .fa
         chr_prefixed (bool): True if chromosome names in BAM are "chr"-prefixed
     Returns:
         df (pandas.DataFrame): df with all post-processing done
+        df_filtered (pandas.DataFrame): df_filtered left-aligned
+        anno (pandas.DataFrame): annotation table with df re-annotated
     """
     fa = pysam.FastaFile(fasta)
 
@@ -51,16 +55,8 @@ def indel_postprocessor(df, df_filtered, refgene, fasta, chr_prefixed):
     )
 
     # reannotate afer left-alignment
-    exon_data = pysam.TabixFile(refgene)
-    anno = partial(
-        annotate_indels,
-        exon_data=exon_data,
-        fasta=fasta,
-        chr_prefixed=chr_prefixed,
-        postprocess=True,
-    )
-    df["annotation"] = df.apply(anno, axis=1)
-    df = df[df["annotation"] != "-"]
+    reanno = annotation_table(df, refgene, fasta, chr_prefixed, postprocess=True)
+    df = df[df["indel_id"].isin(reanno["indel_id"])]
 
     if len(df) == 0:
         logging.warning(
@@ -70,7 +66,12 @@ def indel_postprocessor(df, df_filtered, refgene, fasta, chr_prefixed):
 
     df = unify_equivalent_indels(df)
 
-    return df, df_filtered
+    anno = pd.concat(
+        [reanno, anno[anno["indel_id"].isin(df_filtered["indel_id"])]],
+        ignore_index=True,
+    )
+
+    return df, df_filtered, anno
 
 
 def generate_lt_aln_indel(row, fa, chr_prefixed):
@@ -13,15 +13,24 @@ import pysam
 import logging
 import pandas as pd
 from functools import partial
+from collections import namedtuple
 from .indel_annotator import generate_coding_indels
+from .coding_exon_index import get_coding_exon_index
 
 logger = logging.getLogger(__name__)
 
+# columns used out of 45 columns in Bambino output
+bambino_columns = ["Chr", "Pos", "Type", "Chr_Allele", "Alternative_Allele"]
 
-def indel_preprocessor(bambinofile, bam, refgene, fasta):
+BambinoIndels = namedtuple("BambinoIndels", ["df", "num_of_calls", "num_of_indels"])
+
+
+def indel_preprocessor(bambino_output, bam, refgene, fasta):
     """ Validate, extract and format indel calls from Bambino output
     Args:
-        bambinofile (str): Bambino output filename (contains SNVs + indels)
+        bambino_output (str or list): Bambino output filename (contains SNVs + indels)
+                                      or a list of BambinoIndels parsed from
+                                      Bambino output streamed shard by shard
         refgene (bed file): refCodingExon.bed.gz (contained in data_dir)
         fasta (str): path to reference
     Returns:
@@ -36,42 +45,116 @@ def indel_preprocessor(bambinofile, bam, refgene, fasta):
                                chrY 987  CCT  -
         chr_prefixed (bool): True if chromosome names are prefixed with "chr" in BAM
     """
-    exon_data = pysam.TabixFile(refgene)
+    exon_data = get_coding_exon_index(refgene)
     bam_data = pysam.AlignmentFile(bam)
 
-    if not exists_bambino_output(bambinofile):
-        sys.exit(1)
+    if isinstance(bambino_output, str):
+        if not exists_bambino_output(bambino_output):
+            sys.exit(1)
 
-    df = pd.read_csv(bambinofile, sep="\t", dtype={"dbSNP": str})
+        with open(bambino_output) as f:
+            parsed = [parse_bambino_output(f, exon_data)]
+    else:
+        parsed = bambino_output
 
-    if not is_non_trivial_result(df):
+    if sum(p.num_of_calls for p in parsed) == 0:
+        logging.critical("Bambino output only contains the header line.")
         sys.exit(1)
 
-    df = extract_necessary_info(df)
-    df = extract_indel_calls(df)
-
-    if len(df) == 0:
+    if sum(p.num_of_indels for p in parsed) == 0:
         logging.warning("No indels detected in variant calling. Analysis done.")
         sys.exit(0)
 
-    df = rename_header(df)
-    df = format_indel_report(df)
+    df = pd.concat([p.df for p in parsed], ignore_index=True)
 
     chr_prefixed = is_chr_prefixed(bam_data)
+    if len(df) == 0:
+        logging.warning("No coding indels annotated. Analysis done.")
+        sys.exit(0)
+
+    df = coding_indels(df, exon_data, fasta, chr_prefixed)
+
+    if len(df) == 0:
+        logging.warning("No coding indels annotated. Analysis done.")
+        sys.exit(0)
+
+    return df, chr_prefixed
+
+
+def coding_indels(df, exon_data, fasta, chr_prefixed):
+    """Keep coding indels
+
+    Args:
+        df (pandas.DataFrame): with 'chr', 'pos', 'ref', 'alt' (not empty)
+        exon_data (CodingExonIndex): coding exon database obj
+        fasta (str): path to fasta
+        chr_prefixed (bool): True if chromosome names are prefixed with "chr" in BAM
+    Returns:
+        df (pandas.DataFrame): coding indels with index reset
+    """
     coding = partial(
         flag_coding_indels, exon_data=exon_data, fasta=fasta, chr_prefixed=chr_prefixed
     )
     df["is_coding"] = df.apply(coding, axis=1)
     df = df[df["is_coding"] == True]
 
-    if len(df) == 0:
-        logging.warning("No coding indels annotated. Analysis done.")
-        sys.exit(0)
-
-    df.drop("is_coding", axis=1, inplace=True)
+    df = df.drop("is_coding", axis=1)
     df = df.reset_index(drop=True)
 
-    return df, chr_prefixed
+    return df
+
+
+def parse_bambino_output(lines, exon_data=None, chunk_size=10000):
+    """Extract indel calls on canonical chromosomes line by line.
+    Only the necessary columns are kept and typed as they are read.
+
+    Args:
+        lines (iterable): Bambino output lines starting with the header line
+        exon_data (CodingExonIndex): if given, indels with no exon within
+                                     the annotation window are dropped
+                                     every chunk_size indels
+        chunk_size (int)
+    Returns:
+        BambinoIndels (namedtuple): df (pandas.DataFrame) with 'chr', 'pos', 'ref', 'alt'
+                                    formatted as in indel_preprocessor,
+                                    num_of_calls (int): SNVs + indels in the output
+                                    num_of_indels (int): indels on canonical chromosomes
+    """
+    columns = ["chr", "pos", "ref", "alt"]
+    idx = None
+    num_of_calls, num_of_indels = 0, 0
+    records, chunks = [], []
+
+    def flush(records):
+        chunk = pd.DataFrame.from_records(records, columns=columns)
+        if exon_data is not None:
+            chunk = screen_by_exon_window(chunk, exon_data)
+        chunks.append(chunk)
+
+    for line in lines:
+        fields = line.rstrip("\n").split("\t")
+        if idx is None:
+            idx = [fields.index(c) for c in bambino_columns]
+            continue
+        elif not line.strip():
+            continue
+
+        num_of_calls += 1
+        chr, pos, type, ref, alt = [fields[i] for i in idx]
+        if (type == "deletion" or type == "insertion") and is_canonical_chromosome(
+            chr
+        ):
+            num_of_indels += 1
+            records.append((chr, int(pos), ref if ref else "-", alt if alt else "-"))
+
+            if len(records) == chunk_size:
+                flush(records)
+                records = []
+
+    flush(records)
+    df = pd.concat(chunks, ignore_index=True)
+
+    return BambinoIndels(df, num_of_calls, num_of_indels)
 
 
 def is_chr_prefixed(bam_data):
@@ -92,11 +175,26 @@ def is_chr_prefixed(bam_data):
     return is_prefixed
 
 
+def screen_by_exon_window(df, exon_data):
+    """Drop indels with no exon within the annotation window.
+    All indels are queried at once against the exon intervals.
+
+    Args:
+        df (pandas.DataFrame): with 'chr' and 'pos' columns
+        exon_data (CodingExonIndex): coding exon database obj
+    Returns:
+        df (pandas.DataFrame): indels possibly in coding region
+    """
+    near_exon = exon_data.has_overlap(df["chr"], df["pos"] - 11, df["pos"] + 11)
+
+    return df[near_exon]
+
+
 def flag_coding_indels(row, exon_data, fasta, chr_prefixed):
     """Flag indels if they are coding indels
     Args:
         row (panda.Series)
-        exon_data (pysam.TabixFile obj): coding exon database obj
+        exon_data (CodingExonIndex obj): coding exon database obj
         fasta (str): path to Fasta
     Return:
         is_coding (bool): True for coding indels
@@ -134,43 +232,6 @@ def exists_bambino_output(filename):
     return it_exists
 
 
-def is_non_trivial_result(df):
-    """Assert if Bambino outputs contains data other than the header line
-
-    Args:
-        df (pandas.DataFrame): Bambino output as pd.DataFrame
-    Returns:
-        is_non_trivial (bool): True if it has more than header line
-    """
-    is_non_trivial = False
-
-    if len(df) == 0:
-        logging.critical("Bambino output only contains the header line.")
-    else:
-        is_non_trivial = True
-
-    return is_non_trivial
-
-
-def extract_necessary_info(df):
-    """Reduce data size by selecting columns and chromosomes
-
-    Args:
-        df (pandas.DataFrame): 45 columns
-    Retuns:
-        df (pandas.DataFrame): 5 columns with canonical chromosomes
-    """
-    pd.options.mode.chained_assignment = None
-
-    df = df[["Chr", "Pos", "Type", "Chr_Allele", "Alternative_Allele"]]
-
-    df["is_canonical"] = df.apply(lambda x: is_canonical_chromosome(x["Chr"]), axis=1)
-    df = df[df["is_canonical"] == True]
-    df.drop("is_canonical", axis=1, inplace=True)
-
-    return df
-
-
 def is_canonical_chromosome(chr):
     """Check if chr is 1-22, X or Y (M not included)
 
@@ -194,67 +255,3 @@ def is_canonical_chromosome(chr):
             pass
 
     return is_canonical
-
-
-def extract_indel_calls(df):
-    """Extract indels calls and sort by position
-
-    Args: 
-        df (pandas.DataFrame)
-    Returns:
-        df (pandas.DataFrame)
-    """
-    df["original_order"] = df.index
-
-    df_d = df[df["Type"] == "deletion"]
-    df_i = df[df["Type"] == "insertion"]
-    df = pd.concat([df_d, df_i])
-
-    df.sort_values("original_order", inplace=True)
-    df.drop("original_order", axis=1, inplace=True)
-
-    return df
-
-
-def rename_header(df):
-    """Rename as follows
-       Chr -> chr
-       Pos -> pos
-       Chr_Allele -> ref
-       Alternative_Allele -> alt
-
-    Args:
-        df (pandas.DataFrame)
-    Returns:
-        df (pandas.DataFrame)
-    """
-    df.drop("Type", axis=1, inplace=True)
-    df = df.rename(
-        columns={
-            "Chr": "chr",
-            "Pos": "pos",
-            "Chr_Allele": "ref",
-            "Alternative_Allele": "alt",
-        }
-    )
-
-    return df
-
-
-def format_indel_report(df):
-    """Format as follows
-    For insertion
-           ref          alt
-           -            inserted_seq
-    For deletion
-           ref          alt
-           deleted_seq  -
-    Args:
-        df (pandas.DataFrame)
-    Returns:
-        df (pandas.DataFrame)
-    """
-    df["ref"] = df.apply(lambda x: "-" if x["ref"] != x["ref"] else x["ref"], axis=1)
-    df["alt"] = df.apply(lambda x: "-" if x["alt"] != x["alt"] else x["alt"], axis=1)
-
-    return df
@@ -7,20 +7,23 @@ Calculate features at protein level
 """
 
 import re
-import gzip
 import numpy as np
+import pandas as pd
 from functools import partial
+from .coding_exon_index import get_coding_exon_index
+from .data_bundle import bundled_acc_len
 
 numeric = re.compile(r"[0-9]+")
 
 
-def indel_protein_processor(df, refgene, proteincdd=None):
+def indel_protein_processor(df, anno, refgene, proteincdd=None):
     """Calculate protein features
      
     Features not used in the final model are commented out
 
     Args:
         df (pandas.DataFrame)
+        anno (pandas.DataFrame): annotation table
         refgene (str): path to refCodingExon.bed.gz
         proteincdd (str): optional, path to proteinConservedDomains.txt
     Returns:
@@ -28,9 +31,9 @@ def indel_protein_processor(df, refgene, proteincdd=None):
     """
     # cds length & indel location
     acc_len = acc_len_dict(refgene)
-    df["cds_length"], df["indel_location"] = zip(
-        *df.apply(partial(len_loc, d=acc_len), axis=1)
-    )
+    ll = len_loc(anno, acc_len)
+    df["cds_length"] = df["indel_id"].map(ll["cds_length"])
+    df["indel_location"] = df["indel_id"].map(ll["indel_location"])
 
     # check if the indel is in conserved domain (CDD)
     # acc_dom = acc_domain_dict(proteincdd)
@@ -47,44 +50,36 @@ def acc_len_dict(refgene):
     Returns:
         d (dict): {accession (str): coding_seq_length (int)}
     """
-    d = {}
-    with gzip.open(refgene, "rb") as f:
-        for line in f:
-            lst = line.split(b"\t")
-            info = lst[3].split(b"|")
-            acc = info[0].decode("utf-8")
-            cds_len = info[5].decode("utf-8")
-
-            d[acc] = int(cds_len)
+    d = bundled_acc_len(refgene)
+    if d is None:
+        d = get_coding_exon_index(refgene).acc_len()
 
     return d
 
 
-def len_loc(row, d):
+def len_loc(anno, d):
     """Calculating median CDS length and indel location
 
     Args:
-        row (pandas.Series): a Series with 'annotation' index
+        anno (pandas.DataFrame): annotation table
         d (dict): {accession (str): CDS_length (int)}
     Returns:
-        tuple (float) : 1st element = median CDS len over all isoforms
-                        2nd element = median indel location over all isofroms
+        ll (pandas.DataFrame): indexed by indel_id
+                               'cds_length' = median CDS len over all isoforms
+                               'indel_location' = median indel location over all isofroms
     """
     median_cds_len = 1323
-    tokens = row["annotation"].split(",")
 
-    lengths = []
-    locations = []
-    for token in tokens:
-        info = token.split("|")
-        acc = info[1]
-        cds_pos = int(info[2]) * 3
-        cds_len = d.get(acc, median_cds_len)
-
-        lengths.append(cds_len)
-        locations.append(cds_pos / cds_len)
+    cds_len = anno["accession"].map(d).fillna(median_cds_len)
+    isoforms = pd.DataFrame(
+        {
+            "indel_id": anno["indel_id"],
+            "cds_length": cds_len,
+            "indel_location": anno["codon_pos"] * 3 / cds_len,
+        }
+    )
 
-    return np.median(lengths), np.median(locations)
+    return isoforms.groupby("indel_id")[["cds_length", "indel_location"]].median()
 
 
 def acc_domain_dict(proteincdd):
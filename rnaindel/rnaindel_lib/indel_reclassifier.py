@@ -11,6 +11,7 @@ import pysam
 from functools import partial
 from .indel_snp_annotator import vcf2bambino
 from .indel_curator import curate_indel_in_genome
+from .hot_path_metrics import incr
 
 
 def indel_reclassifier(df, fasta, chr_prefixed, pons_vcf=None):
@@ -83,6 +84,7 @@ def relassify_by_panel_of_non_somatic(row, fasta, chr_prefixed, pons):
 
     # check if the indel is equivalent to indel on the panel of non somatic (PONS)
     # reclassify based on the 2nd highest probability if equivalent PONS indel found
+    incr("pons_queries")
     for record in pons.fetch(chr_vcf, start, end, parser=pysam.asTuple()):
         bambinos = vcf2bambino(record)
         for bb in bambinos:
@@ -3,13 +3,18 @@ import pysam
 import numpy as np
 import pandas as pd
 from functools import partial
-from multiprocessing import Pool
 from .most_common import most_common
 from .indel_vcf import IndelVcfReport
 from .indel_curator import extract_indel_reads
 from .indel_curator import decompose_indel_read
 from .indel_curator import curate_indel_in_genome
-from .indel_curator import extract_all_valid_reads
+from .indel_curator import iter_valid_reads
+from .locus_trace import traced_rows
+from .locus_trace import map_counted
+from .process_profile import process_pool
+from .locus_budget import budgeted_rows
+from .locus_budget import budgeted_call
+from .locus_budget import LocusBudgetExceeded
 
 
 def indel_rescuer(df, fasta, bam, chr_prefixed, **kwargs):
@@ -17,8 +22,11 @@ def indel_rescuer(df, fasta, bam, chr_prefixed, **kwargs):
     num_of_processes = kwargs.pop("num_of_processes", 1)
     left_aligned = kwargs.pop("left_aligned", False)
     external_vcf = kwargs.pop("external_vcf", False)
+    pool = kwargs.pop("pool", None)
 
-    pool = Pool(num_of_processes)
+    own_pool = pool is None
+    if own_pool:
+        pool = process_pool(num_of_processes)
 
     df["rescued"] = "-"
 
@@ -33,17 +41,25 @@ def indel_rescuer(df, fasta, bam, chr_prefixed, **kwargs):
         chr_prefixed=chr_prefixed,
     )
 
-    df["rescued_indels"] = df.apply(rqxeq, axis=1)
+    rqxeq = budgeted_rows("rescue", rqxeq, no_rescue)
+    df["rescued_indels"] = df.apply(traced_rows("rescue", rqxeq), axis=1)
     df["rescued"] = df.apply(flag_indel_rescued_by_equivalence, axis=1)
 
     # rescue by nearest
     if external_vcf:
-        rqxnr = partial(
-            rescue_by_nearest,
-            fasta=fasta,
-            bam=bam,
-            search_window=10,
-            chr_prefixed=chr_prefixed,
+        rqxnr = traced_rows(
+            "rescue",
+            budgeted_rows(
+                "rescue",
+                partial(
+                    rescue_by_nearest,
+                    fasta=fasta,
+                    bam=bam,
+                    search_window=10,
+                    chr_prefixed=chr_prefixed,
+                ),
+                no_rescue,
+            ),
         )
         df["rescued_indels"] = df.apply(
             lambda x: rqxnr(x) if x["rescued_indels"] == [] else x["rescued_indels"],
@@ -51,6 +67,10 @@ def indel_rescuer(df, fasta, bam, chr_prefixed, **kwargs):
         )
     df["rescued"] = df.apply(flag_indel_rescued_by_nearest, axis=1)
 
+    if own_pool:
+        pool.close()
+        pool.join()
+
     list_of_data_dict = df["rescued_indels"].sum()
     df_rescued = pd.DataFrame(list_of_data_dict)
 
@@ -104,21 +124,23 @@ def rescue_by_equivalence(
     else:
         rt_window, lt_window = int(search_window / 2), int(search_window / 2)
 
-    rescue = partial(
-        extract_indel,
-        fasta=fasta,
-        bam=bam,
-        chr=chr,
-        idl_type=idl_type,
-        chr_prefixed=chr_prefixed,
-        equivalent_to=called_idl,
+    rescue = budgeted_call(
+        partial(
+            extract_indel,
+            fasta=fasta,
+            bam=bam,
+            chr=chr,
+            idl_type=idl_type,
+            chr_prefixed=chr_prefixed,
+            equivalent_to=called_idl,
+        )
     )
 
     rt_range = [pos + i for i in range(rt_window)]
-    rt_equivalents = pool.map(rescue, rt_range)
+    rt_equivalents = map_counted(pool, rescue, rt_range)
 
     lt_range = [pos - i for i in range(lt_window)]
-    lt_equivalents = pool.map(rescue, lt_range)
+    lt_equivalents = map_counted(pool, rescue, lt_range)
 
     equivalents = rt_equivalents + lt_equivalents
 
@@ -137,6 +159,11 @@ def rescue_by_equivalence(
     return equivalents
 
 
+def no_rescue(row):
+    """Fallback of a candidate over the time budget"""
+    return []
+
+
 def flag_indel_rescued_by_equivalence(row):
     flag = row["rescued"]
 
@@ -264,13 +291,12 @@ def get_most_common_indel_seq(bam_data, chr, pos, idl_type, chr_prefixed):
     # convert 0-based coordinate
     pos = pos - 1
 
+    # only reads with indels are kept from the (possibly deep) pileup
     try:
-        valid_reads = extract_all_valid_reads(bam_data, chr, pos, chr_prefixed)
-    except:
-        return idl_seq
-
-    try:
+        valid_reads = iter_valid_reads(bam_data, chr, pos, chr_prefixed)
         parsed_indel_reads = extract_indel_reads(valid_reads, pos, ins_or_del)
+    except LocusBudgetExceeded:
+        raise
     except:
         return idl_seq
 
@@ -2,6 +2,7 @@
 
 from .most_common import most_common
 from .sequence_properties import *
+from .locus_budget import check_budget
 
 
 class Indel(object):
@@ -389,6 +390,7 @@ class PileupWithIndel(Indel):
         """
         repeats = []
         for indel in self.generate_indel_reads():
+            check_budget()
             repeat = indel.repeat()
             repeats.append(repeat)
 
@@ -406,6 +408,7 @@ class PileupWithIndel(Indel):
         """
         local_vals = []
         for indel in self.generate_indel_reads():
+            check_budget()
             if len(indel.lt_seq) >= n and len(indel.rt_seq) >= n:
                 local_vals.append(indel.gc(n))
             else:
@@ -425,6 +428,7 @@ class PileupWithIndel(Indel):
         """
         local_vals = []
         for indel in self.generate_indel_reads():
+            check_budget()
             if len(indel.lt_seq) >= n and len(indel.rt_seq) >= n:
                 local_vals.append(indel.local_lc(n))
             else:
@@ -444,6 +448,7 @@ class PileupWithIndel(Indel):
         """
         local_strengths = []
         for indel in self.generate_indel_reads():
+            check_budget()
             if len(indel.lt_seq) >= n and len(indel.rt_seq) >= n:
                 local_strengths.append(indel.strength(n))
             else:
@@ -462,6 +467,7 @@ class PileupWithIndel(Indel):
         dissimilarities = []
         idl_size = len(self.idl_seq)
         for indel in self.generate_indel_reads():
+            check_budget()
             if len(indel.lt_seq) >= idl_size and len(indel.rt_seq) >= idl_size:
                 dissimilarities.append(indel.dissimilarity())
             else:
@@ -503,6 +509,7 @@ class PileupWithIndel(Indel):
         indel_reads = self.generate_indel_reads()
         ref_reads = self.generate_ref_reads()
         for idl, ref in zip(indel_reads, ref_reads):
+            check_budget()
             if len(idl.lt_seq) >= n and len(idl.rt_seq) >= n:
                 lt = idl.lt_seq[-n:]
                 lt_ref = ref.lt_seq[-n:]
@@ -531,6 +538,7 @@ class PileupWithIndel(Indel):
         indel_reads = self.generate_indel_reads()
         non_reads = self.generate_non_indel_reads()
         for idl in indel_reads:
+            check_budget()
             if len(idl.lt_seq) >= n and len(idl.rt_seq) >= n:
                 for non in non_reads:
                     if len(non.lt_seq) >= n and len(non.rt_seq) >= n:
@@ -7,27 +7,36 @@ Calculates features at sequence and alignment level
 """
 
 import pysam
+import pandas as pd
 from functools import partial
-from .most_common import most_common
 from .indel_features import SamFeatures
-from .indel_features import AnnotationFeatures
 from .indel_curator import curate_indel_in_genome
 from .indel_curator import curate_indel_in_pileup
+from .locus_trace import traced
+from .locus_trace import traced_rows
+from .locus_budget import FALLBACK_DEPTH
+from .locus_budget import FALLBACK_READS
+from .locus_budget import LocusBudgetExceeded
+from .locus_budget import budgeted_rows
+from .locus_budget import is_over_budget
 
 
-def indel_sequence_processor(df, fasta, bam, mapq, chr_prefixed):
+def indel_sequence_processor(df, anno, fasta, bam, mapq, chr_prefixed, max_depth=None):
     """Calculate features from Bambino output, annotation, and .bam
     
     Features not used for final model are commented out '#'
    
     Args:
         df (pandas.DataFrame)
+        anno (pandas.DataFrame): annotation table
         fasta (str): path to fasta
         bam (str): path to bam
         mapq (int): MAPQ score for uniquely mapped reads
         chr_prefixed (bool): True if chromosome names are "chr"-prefixed
+        max_depth (int): cap on reads without indels per locus (None for no cap)
     Returns:
-        df (pandas.DataFrame): dataframe with valid entries
+        df (pandas.DataFrame): dataframe with valid entries.
+                               candidates over the time budget have over_budget 1
         df_filtered_premerge (pandas.DataFrame): dataframe with invalid entries
     """
     # features derived from Bambino output
@@ -38,11 +47,11 @@ def indel_sequence_processor(df, fasta, bam, mapq, chr_prefixed):
     df["indel_size"] = df.apply(indel_size, axis=1)
 
     # features derived from annotation
-    df["a"] = df.apply(anno_features, axis=1)
-    # df['is_inframe'] = df.apply(lambda x: x['a'].is_inframe, axis=1)
-    df["is_truncating"] = df.apply(lambda x: x["a"].is_truncating, axis=1)
-    # df['is_splice'] = df.apply(lambda x: x['a'].is_splice, axis=1)
-    df["is_nmd_insensitive"] = df.apply(lambda x: x["a"].is_nmd_insensitive, axis=1)
+    a = anno_features(anno)
+    # df['is_inframe'] = df['indel_id'].map(a['is_inframe'])
+    df["is_truncating"] = df["indel_id"].map(a["is_truncating"])
+    # df['is_splice'] = df['indel_id'].map(a['is_splice'])
+    df["is_nmd_insensitive"] = df["indel_id"].map(a["is_nmd_insensitive"])
 
     # features derived from sequence alingment/map
     bam_data = pysam.AlignmentFile(bam, "rb")
@@ -52,8 +61,10 @@ def indel_sequence_processor(df, fasta, bam, mapq, chr_prefixed):
         bam_data=bam_data,
         mapq=mapq,
         chr_prefixed=chr_prefixed,
+        max_depth=max_depth,
     )
-    df["s"] = df.apply(sam, axis=1)
+    sam = budgeted_rows("features", sam, partial(sam, over_budget=True))
+    df["s"] = df.apply(traced_rows("features", sam), axis=1)
     # df['gc'] = df.apply(lambda x: x['s'].gc, axis=1)
     # df['local_gc'] = df.apply(lambda x: x['s'].local_gc, axis=1)
     # df['lc'] = df.apply(lambda x: x['s'].lc, axis=1)
@@ -70,7 +81,10 @@ def indel_sequence_processor(df, fasta, bam, mapq, chr_prefixed):
     df["is_bidirectional"] = df.apply(lambda x: x["s"].is_bidirectional, axis=1)
     df["is_uniq_mapped"] = df.apply(lambda x: x["s"].is_uniq_mapped, axis=1)
 
-    df.drop(["a", "s"], axis=1, inplace=True)
+    df.drop("s", axis=1, inplace=True)
+
+    # over the time budget in rescue or feature calculation
+    df["over_budget"] = df.apply(is_over_budget, axis=1)
 
     df["filtered"] = df.apply(flag_invalid_entry, axis=1)
 
@@ -177,7 +191,7 @@ def indel_size(row):
     return indel_size
 
 
-def anno_features(row):
+def anno_features(anno):
     """Encodes features derived from variant annotaion:
         
     1. inframe 
@@ -186,53 +200,35 @@ def anno_features(row):
     4. whether it is in the first or last exon
          
     In multiple-isoform case, the common pattern is returned 
-    except for is_inframe and is_splice
+    (ties resolved to 0) except for is_inframe and is_splice
 
     Args:
-        row (pandas.Series): a Series with 'annotation' index
+        anno (pandas.DataFrame): annotation table
     Returns:
-        AnnotationFeatures (obj) 
+        features (pandas.DataFrame): 'is_inframe', 'is_truncating', 'is_splice'
+                                     and 'is_nmd_insensitive' indexed by indel_id
     """
-    lst = row["annotation"].split(",")
-
-    inframe = 0
-    truncates = []
-    splice = 0
-    insensitivities = []
-    for anno in lst:
-
-        if "inframe" in anno:
-            inframe += 1
-        else:
-            pass
-
-        if "Truncating" in anno:
-            truncates.append(1)
-        else:
-            truncates.append(0)
-
-        if "splice" in anno:
-            splice += 1
-        else:
-            pass
-
-        is_insensitive = int(anno.split("|")[-1])
-        insensitivities.append(is_insensitive)
-
-    is_inframe = 0
-    if inframe > 0:
-        is_inframe = 1
-
-    is_splice = 0
-    if splice > 0:
-        is_splice = 1
-
-    return AnnotationFeatures(
-        is_inframe, most_common(truncates), is_splice, most_common(insensitivities)
+    isoforms = pd.DataFrame(
+        {
+            "indel_id": anno["indel_id"],
+            "is_inframe": anno["effect"].str.contains("inframe").astype(int),
+            "is_truncating": anno["effect"].str.contains("Truncating").astype(int),
+            "is_splice": anno["effect"].str.contains("splice").astype(int),
+            "is_nmd_insensitive": anno["nmd"].astype(int),
+        }
     )
+    g = isoforms.groupby("indel_id")
+
+    features = g[["is_inframe", "is_splice"]].max()
+    features["is_truncating"] = (g["is_truncating"].mean() > 0.5).astype(int)
+    features["is_nmd_insensitive"] = (g["is_nmd_insensitive"].mean() > 0.5).astype(int)
 
+    return features
 
-def sam_features(row, fasta, bam_data, mapq, chr_prefixed):
+
+def sam_features(
+    row, fasta, bam_data, mapq, chr_prefixed, max_depth=None, over_budget=False
+):
     """Encodes features derived from sequence alignment/map(SAM)
     
     Args:
@@ -242,6 +238,9 @@ def sam_features(row, fasta, bam_data, mapq, chr_prefixed):
         bam_data (pysam.AlignmentFile): bam object
         mapq (int): MAPQ score for unique mappers
         chr_prefixed (bool): True if chromosome names in BAM are "chr"-prefixed
+        max_depth (int): cap on reads without indels (None for no cap)
+        over_budget (bool): True to use the fallback values of a candidate
+                            over the time budget (see locus_budget)
     Returns:
         SamFeatures (class)            
     """
@@ -258,9 +257,22 @@ def sam_features(row, fasta, bam_data, mapq, chr_prefixed):
         fasta, chr, pos, idl_type, idl_seq, chr_prefixed
     )
     # PileupWithIndel obj in bam
-    idl_bam = curate_indel_in_pileup(
-        bam_data, chr, pos, idl_type, idl_seq, mapq, chr_prefixed
-    )
+    max_reads = None
+    if over_budget:
+        max_depth = min(max_depth or FALLBACK_DEPTH, FALLBACK_DEPTH)
+        max_reads = FALLBACK_READS
+    with traced("pileup"):
+        idl_bam = curate_indel_in_pileup(
+            bam_data,
+            chr,
+            pos,
+            idl_type,
+            idl_seq,
+            mapq,
+            chr_prefixed,
+            max_depth,
+            max_reads,
+        )
 
     # global sequence properties
     # derived from reference genome
@@ -272,33 +284,49 @@ def sam_features(row, fasta, bam_data, mapq, chr_prefixed):
     # these consider individual variations such SNPs
     # replace with info from fasta if failed to retrieve
     # info from bam (this may happen if the reads are too short)
+    # or if over the time budget (indel_complexity is 0 then).
+    # LocusBudgetExceeded is passed on for the candidate to be flagged
+    idl_local = idl_ref_genome if over_budget else idl_bam
     try:
-        local_gc = idl_bam.gc(rna_window)
+        local_gc = idl_local.gc(rna_window)
+    except LocusBudgetExceeded:
+        raise
     except:
         local_gc = idl_ref_genome.gc(rna_window)
 
     try:
-        local_lc = idl_bam.local_lc(rna_window)
+        local_lc = idl_local.local_lc(rna_window)
+    except LocusBudgetExceeded:
+        raise
     except:
         local_lc = idl_ref_genome.local_lc(rna_window)
 
     try:
-        local_strength = idl_bam.strength(rna_window)
+        local_strength = idl_local.strength(rna_window)
+    except LocusBudgetExceeded:
+        raise
     except:
         local_strength = idl_ref_genome.strength(rna_window)
 
     try:
-        repeat = idl_bam.repeat()
+        repeat = idl_local.repeat()
+    except LocusBudgetExceeded:
+        raise
     except:
         repeat = idl_ref_genome.repeat()
 
     try:
-        dissimilarity = idl_bam.dissimilarity()
+        dissimilarity = idl_local.dissimilarity()
+    except LocusBudgetExceeded:
+        raise
     except:
         dissimilarity = idl_ref_genome.dissimilarity()
 
     try:
-        indel_complexity = idl_bam.indel_complexity(rna_window)
+        with traced("complexity"):
+            indel_complexity = idl_local.indel_complexity(rna_window)
+    except LocusBudgetExceeded:
+        raise
     except:
         indel_complexity = 0
 
@@ -7,10 +7,19 @@ Annotate indels if they are on dbSNP
 """
 
 import re
+import gzip
 import pysam
+import numpy as np
 from functools import partial
+from collections import namedtuple
+from .data_bundle import bundled_snp_table
 from .indel_features import IndelSnpFeatures
 from .indel_curator import curate_indel_in_genome
+from .hot_path_metrics import incr
+
+DbIndel = namedtuple(
+    "DbIndel", ["pos", "idl_type", "idl_seq", "id", "freq", "common", "clin_info"]
+)
 
 
 def indel_snp_annotator(df, fasta, dbsnp, clnvr, chr_prefixed):
@@ -25,8 +34,8 @@ def indel_snp_annotator(df, fasta, dbsnp, clnvr, chr_prefixed):
     Returns:
         df (pandas.DataFrame): with SNP info
     """
-    dbsnp = pysam.TabixFile(dbsnp)
-    clnvr = pysam.TabixFile(clnvr)
+    dbsnp = get_snp_database(dbsnp, "dbsnp")
+    clnvr = get_snp_database(clnvr, "clinvar")
 
     db_anno = partial(
         annotate_indel_on_db,
@@ -57,8 +66,8 @@ def annotate_indel_on_db(row, fasta, dbsnp, clnvr, chr_prefixed):
     Args:
         row (pandas.Series): with 'chr', 'pos', 'is_ins', 'indel_seq' lables
         fasta (str): path to .fa
-        dbsnp (str): path to 00-All.151.indel.vcf.gz
-        clnvr (str): path to clinvar.indel.vcf.gz
+        dbsnp (TabixSnpDatabase or ArraySnpDatabase): dbSNP database obj
+        clnvr (TabixSnpDatabase or ArraySnpDatabase): ClinVar database obj
         chr_prefixed (bool): True if chromosome names in BAM are "chr"-prefixed
     Returns:
         report (IndelSnpFeatures): idl object reporting SNP info
@@ -78,38 +87,178 @@ def annotate_indel_on_db(row, fasta, dbsnp, clnvr, chr_prefixed):
     start, end = pos - search_window, pos + search_window
     chr_vcf = row["chr"].replace("chr", "")
 
-    for record in dbsnp.fetch(chr_vcf, start, end, parser=pysam.asTuple()):
-        bambinos = vcf2bambino(record)
-        for bb in bambinos:
-            if idl_type == bb.idl_type and len(idl_seq) == len(bb.idl_seq):
-                # indel on db representing in reference genome
-                db_idl = curate_indel_in_genome(
-                    fasta, chr, bb.pos, bb.idl_type, bb.idl_seq, chr_prefixed
-                )
-                if idl == db_idl:
-                    rs = record[2]
-                    report.add_dbsnp_id(rs)
-                    report.add_dbsnp_freq(dbsnp_freq(record))
-                    #                   report.add_dbsnp_origin(dbsnp_origin(record))
-                    report.add_dbsnp_common(dbsnp_common(record))
-
-    for record in clnvr.fetch(chr_vcf, start, end, parser=pysam.asTuple()):
-        bambinos = vcf2bambino(record)
-        for bb in bambinos:
-            if idl_type == bb.idl_type and len(idl_seq) == len(bb.idl_seq):
-                db_idl = curate_indel_in_genome(
-                    fasta, chr, bb.pos, bb.idl_type, bb.idl_seq, chr_prefixed
-                )
-                if idl == db_idl:
-                    id = record[2]
-                    report.add_clnvr_id(id)
-                    report.add_clnvr_freq(clnvr_freq(record))
-                    #                   report.add_clnvr_origin(clnvr_origin(record))
-                    report.add_clnvr_info(cln_info(record))
+    incr("dbsnp_queries")
+    for entry in dbsnp.fetch(chr_vcf, start, end):
+        if idl_type == entry.idl_type and len(idl_seq) == len(entry.idl_seq):
+            # indel on db representing in reference genome
+            db_idl = curate_indel_in_genome(
+                fasta, chr, entry.pos, entry.idl_type, entry.idl_seq, chr_prefixed
+            )
+            if idl == db_idl:
+                report.add_dbsnp_id(entry.id)
+                report.add_dbsnp_freq(entry.freq)
+                report.add_dbsnp_common(entry.common)
+
+    incr("clinvar_queries")
+    for entry in clnvr.fetch(chr_vcf, start, end):
+        if idl_type == entry.idl_type and len(idl_seq) == len(entry.idl_seq):
+            db_idl = curate_indel_in_genome(
+                fasta, chr, entry.pos, entry.idl_type, entry.idl_seq, chr_prefixed
+            )
+            if idl == db_idl:
+                report.add_clnvr_id(entry.id)
+                report.add_clnvr_freq(entry.freq)
+                report.add_clnvr_info(entry.clin_info)
 
     return report
 
 
+def get_snp_database(path, db):
+    """Open dbSNP or ClinVar database. The pre-built table
+    is used if a compiled data bundle is loaded.
+
+    Args:
+        path (str): path to dbsnp.indel.vcf.gz or clinvar.indel.vcf.gz
+        db (str): 'dbsnp' or 'clinvar'
+    Returns:
+        database (TabixSnpDatabase or ArraySnpDatabase)
+    """
+    table = bundled_snp_table(path)
+    if table is not None:
+        return ArraySnpDatabase(table)
+    else:
+        return TabixSnpDatabase(path, db)
+
+
+def normalize_db_record(record, db):
+    """Convert a dbSNP or ClinVar record to indels in Bambino format
+    with the annotation used for lookup
+
+    Args:
+        record (tuple): vcf line with fields separated in tuple
+        db (str): 'dbsnp' or 'clinvar'
+    Returns:
+        entries (list): a list of DbIndel
+    """
+    if db == "dbsnp":
+        freq, common, clin_info = dbsnp_freq(record), dbsnp_common(record), "-"
+    else:
+        freq, common, clin_info = clnvr_freq(record), -1, cln_info(record)
+
+    return [
+        DbIndel(bb.pos, bb.idl_type, bb.idl_seq, record[2], freq, common, clin_info)
+        for bb in vcf2bambino(record)
+    ]
+
+
+def read_db_indels(path, db):
+    """Read all indels in dbSNP or ClinVar
+
+    Args:
+        path (str): path to dbsnp.indel.vcf.gz or clinvar.indel.vcf.gz
+        db (str): 'dbsnp' or 'clinvar'
+    Returns:
+        entries (list): a list of (chr, start, end, DbIndel) in file order
+                        start and end specify the record in 0-based
+                        half-open interval as in tabix
+    """
+    entries = []
+    with gzip.open(path, "rt") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+
+            record = tuple(line.rstrip("\n").split("\t"))
+            start = int(record[1]) - 1
+            end = start + len(record[3])
+            for entry in normalize_db_record(record, db):
+                entries.append((record[0], start, end, entry))
+
+    return entries
+
+
+class TabixSnpDatabase(object):
+    """dbSNP or ClinVar queried by tabix
+
+    Attributes:
+        tabix (pysam.TabixFile)
+        db (str): 'dbsnp' or 'clinvar'
+    """
+
+    def __init__(self, path, db):
+        self.tabix = pysam.TabixFile(path)
+        self.db = db
+
+    def fetch(self, chr, start, end):
+        """Indels on the records overlapping [start, end)
+
+        Args:
+            chr (str): chromosome name as in VCF
+            start (int): 0-based
+            end (int): 0-based, exclusive
+        Returns:
+            entries (list): a list of DbIndel
+        """
+        entries = []
+        for record in self.tabix.fetch(chr, start, end, parser=pysam.asTuple()):
+            entries.extend(normalize_db_record(record, self.db))
+
+        return entries
+
+
+class ArraySnpDatabase(object):
+    """dbSNP or ClinVar pre-built as arrays sorted by chr and start
+
+    Attributes:
+        table (dict): arrays as built by data_bundle.snp_table_arrays
+        bounds (dict): {chr (str): (first, last + 1) row of the chr}
+        max_ends (dict): {chr (str): np.ndarray of running maximum of ends}
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.bounds = table["bounds"]
+        self.max_ends = table["max_ends"]
+
+    def fetch(self, chr, start, end):
+        """Indels on the records overlapping [start, end)
+
+        Args:
+            chr (str): chromosome name as in VCF
+            start (int): 0-based
+            end (int): 0-based, exclusive
+        Returns:
+            entries (list): a list of DbIndel
+        """
+        bounds = self.bounds.get(chr)
+        if bounds is None:
+            return []
+
+        first, last = bounds
+        t = self.table
+        # records before lo all end at or before start
+        lo = np.searchsorted(self.max_ends[chr], start, side="right")
+        hi = np.searchsorted(t["start"][first:last], end, side="left")
+        if lo >= hi:
+            return []
+
+        ends = t["end"][first + lo : first + hi]
+        overlapping = first + lo + np.flatnonzero(ends > start)
+
+        return [
+            DbIndel(
+                int(t["pos"][i]),
+                int(t["idl_type"][i]),
+                t["idl_seq"][i],
+                t["id"][i],
+                float(t["freq"][i]),
+                int(t["common"][i]),
+                t["clin_info"][i],
+            )
+            for i in overlapping
+        ]
+
+
 def is_on_dbsnp(row):
     """Encodes if the indel is found on dbSNP 
     
@@ -276,6 +276,10 @@ class IndelVcfReport(object):
         if not self.RCF or self.RCF == "-":
             rcf = ""
 
+        otb = "OTB"
+        if not self.OTB or self.OTB == 0:
+            otb = ""
+
         if self.RQB and self.RQB[0] == "by_nearest":
             rqb = "RQB=" + self.RQB[1].replace("rescued_by:", "")
         else:
@@ -304,6 +308,7 @@ class IndelVcfReport(object):
             atd,
             rcf,
             rqb,
+            otb,
         ]
 
         return ";".join([i for i in info_lst if i != ""])
@@ -333,6 +338,7 @@ class IndelVcfReport(object):
         self.ATD = INFO["ATD"]
         self.RCF = INFO["RCF"]
         self.RQB = INFO["RQB"]
+        self.OTB = INFO["OTB"]
 
     ################
     # FORMAT field #
@@ -12,9 +12,11 @@ import logging
 import pandas as pd
 from functools import partial
 from .indel_preprocessor import flag_coding_indels
+from .indel_preprocessor import screen_by_exon_window
 from .indel_snp_annotator import count_padding_bases
 from .indel_preprocessor import is_chr_prefixed
 from .indel_preprocessor import is_canonical_chromosome
+from .coding_exon_index import get_coding_exon_index
 
 logger = logging.getLogger(__name__)
 
@@ -33,17 +35,37 @@ def indel_vcf_preprocessor(vcffile, bam, refgene, fasta):
     vcf_data = open(vcffile)
     df = pd.DataFrame(make_data_list(vcf_data))
     vcf_data.close()
-    
+
+    return coding_vcf_indels(df, bam, refgene, fasta)
+
+
+def coding_vcf_indels(df, bam, refgene, fasta):
+    """Coding indels from parsed VCF records
+
+    Args:
+        df (pandas.DataFrame): as made by make_data_list
+        bam (str): path to bam
+        refgene (str): path to refCodingExon.bed.gz
+        fasta (str): path to fasta
+    Returns:
+        df (pandas.DataFrame): see indel_vcf_preprocessor
+        chr_prefixed (bool): True if chromosome names are "chr"-prefixed in BAM
+    """
     bam_data = pysam.AlignmentFile(bam)
     chr_prefixed = is_chr_prefixed(bam_data)
     
-    exon_data = pysam.TabixFile(refgene)
+    exon_data = get_coding_exon_index(refgene)
 
     datasize = len(df)
     if len(df) == 0:
         logging.warning("No indels detected in input vcf. Analysis done.")
         sys.exit(0)
 
+    df = screen_by_exon_window(df, exon_data)
+    if len(df) == 0:
+        logging.warning("No coding indels annotated. Analysis done.")
+        sys.exit(0)
+
     coding = partial(
         flag_coding_indels, exon_data=exon_data, fasta=fasta, chr_prefixed=chr_prefixed
     )
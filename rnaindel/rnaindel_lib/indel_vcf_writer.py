@@ -22,11 +22,13 @@ from .indel_rescuer import sort_positionally
 metaID = re.compile(r"ID=([A-Za-z]+)")
 
 
-def indel_vcf_writer(df, df_filtered, bam, fasta, chr_prefixed, vcfname, version):
+def indel_vcf_writer(df, df_filtered, anno, bam, fasta, chr_prefixed, vcfname, version):
     """Output result in .vcf
     
     Args:
         df (pandas.DataFrame): assumed to be sorted and left-aligned
+        df_filtered (pandas.DataFrame): filtered entries
+        anno (pandas.DataFrame): annotation table
         bam (str): path to bam
         fasta (str): path to fasta
         chr_prefixed (bool): True if chromosome names are "chr"-prefixed
@@ -35,29 +37,43 @@ def indel_vcf_writer(df, df_filtered, bam, fasta, chr_prefixed, vcfname, version
     Returns:
         None: a vcf file will be written out
     """
+    df = indel_vcf_reports(df, df_filtered, anno, fasta, chr_prefixed)
+    vcf_records = df.apply(lambda x: x["vcf"].vcf_record, axis=1).values
+
+    info = define_info_dict()
+    fmt = define_format_dict()
+    with open(vcfname, "w") as f:
+        f.write(vcf_template(bam, fasta, info, fmt, version) + "\n")
+        f.write("\n".join(vcf_records))
+
+
+def indel_vcf_reports(df, df_filtered, anno, fasta, chr_prefixed):
+    """VCF records of valid and filtered entries
+
+    Args:
+        df, df_filtered, anno, fasta, chr_prefixed: see indel_vcf_writer
+    Returns:
+        df (pandas.DataFrame): valid and filtered entries sorted positionally
+                               with IndelVcfReport in the "vcf" column
+    """
     fa = pysam.FastaFile(fasta)
 
     if not df_filtered.empty:
         df = pd.concat([df, df_filtered], axis=0, ignore_index=True, sort=True)
 
     df = sort_positionally(df)
+    df["annotation"] = df["indel_id"].map(format_annotation(anno))
 
-    info = define_info_dict()
-    fmt = define_format_dict()
     vcf = partial(
         generate_indel_vcf,
-        info_dict=info,
-        format_dict=fmt,
+        info_dict=define_info_dict(),
+        format_dict=define_format_dict(),
         fa=fa,
         chr_prefixed=chr_prefixed,
     )
-
     df["vcf"] = df.apply(vcf, axis=1)
-    vcf_records = df.apply(lambda x: x["vcf"].vcf_record, axis=1).values
 
-    with open(vcfname, "w") as f:
-        f.write(vcf_template(bam, fasta, info, fmt, version) + "\n")
-        f.write("\n".join(vcf_records))
+    return df
 
 
 def generate_indel_vcf(row, info_dict, format_dict, fa, chr_prefixed):
@@ -95,6 +111,32 @@ def generate_indel_vcf(row, info_dict, format_dict, fa, chr_prefixed):
     return idl_vcf
 
 
+def format_annotation(anno):
+    """Format the annotation table as strings
+
+    Args:
+        anno (pandas.DataFrame): annotation table
+    Returns:
+        annotation (pandas.Series): indexed by indel_id. Each token represents 
+                                    an annotation for one of the isoforms:
+                                    GeneSymbol|RefSeqAccession|CodonPos|Effect|IsInsensitive
+                                    IsInsensitive is omitted if not evaluated
+    """
+    tokens = (
+        anno["gene"]
+        + "|"
+        + anno["accession"]
+        + "|"
+        + anno["codon_pos"].astype(str)
+        + "|"
+        + anno["effect"]
+    )
+    evaluated = anno["nmd"] != -1
+    tokens[evaluated] = tokens[evaluated] + "|" + anno["nmd"][evaluated].astype(str)
+
+    return tokens.groupby(anno["indel_id"], sort=False).agg(",".join)
+
+
 def link_datadict_to_dataframe(row, dict):
     """Match column name and acutal data in dataframe
     
@@ -106,7 +148,8 @@ def link_datadict_to_dataframe(row, dict):
     """
     d = {}
     for k, v in dict.items():
-        d[k] = [row[c] if row[c] == row[c] else None for c in v["COLUMN"]]
+        # columns missing in features exported by older versions are None
+        d[k] = [row.get(c) if row.get(c) == row.get(c) else None for c in v["COLUMN"]]
 
         if len(d[k]) == 1:
             d[k] = d[k][0]
@@ -194,6 +237,7 @@ def vcf_template(bam, fasta, info_dict, format_dict, version):
         "ATD",
         "RCF",
         "RQB",
+        "OTB",
     ]
 
     meta_2 = [
@@ -399,6 +443,13 @@ def define_info_dict():
             "Type": "String",
             "Description": "Rescued by indel nearest to this entry",
         },
+        "OTB": {
+            "COLUMN": ["over_budget"],
+            "Number": "0",
+            "Type": "Flag",
+            "Description": "Flagged if over the time budget per indel "
+            "and analyzed with fallback values",
+        },
     }
     return d
 
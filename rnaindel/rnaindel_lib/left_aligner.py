@@ -3,6 +3,8 @@
 by Tan et al 2015 Bioinformatics, 31:2202-2204
 """
 
+from .hot_path_metrics import incr
+
 
 def lt_aln(idl, fa, chr_prefixed):
     """Perfoms left alignment 
@@ -64,5 +66,6 @@ def peek_left_base(idl, fa, chr_prefixed):
     if not chr_prefixed:
         chr = chr.replace("chr", "")
     left_base = fa.fetch(chr, idl.pos - 2, idl.pos - 1)
+    incr("fasta_fetches")
 
     return left_base
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Time budget per candidate indel
+
+With --locus-budget SEC, a candidate indel is given SEC seconds for the
+rescue and SEC seconds for the feature calculation. The loops over reads
+call check_budget, which raises LocusBudgetExceeded once the budget is
+spent (also in pool workers running a call wrapped by budgeted_call).
+The candidate then falls back to cheaper values, as it does on other
+exceptions:
+
+    rescue              no equivalent or nearest indel rescued
+    pileup              the first FALLBACK_READS reads scanned, those
+                        without indels sampled down to FALLBACK_DEPTH
+                        (ref_count and alt_count count the scanned reads)
+    repeat, dissimilarity, local_strength
+                        derived from the reference genome
+    indel_complexity    0
+
+Such candidates are logged, flagged with OTB in the output VCF and
+counted as over_budget_loci in --profile-report and --metrics.
+
+'open_locus_budget', 'budgeted_rows' and 'check_budget' are the main routines of this module
+"""
+
+import time
+import logging
+from contextlib import contextmanager
+from .locus_trace import locus_key
+from .hot_path_metrics import incr
+
+logger = logging.getLogger(__name__)
+
+# reads without indels analyzed after the budget is spent in the pileup
+FALLBACK_DEPTH = 100
+
+# reads scanned after the budget is spent, so the fallback is bounded at deep loci
+FALLBACK_READS = 10000
+
+# the budget of the current run
+_locus_budget = None
+
+# time.time() by which the current candidate should be done (None if unlimited)
+_deadline = None
+
+
+class LocusBudgetExceeded(Exception):
+    """Raised by check_budget when the budget of the candidate is spent"""
+
+
+def open_locus_budget(seconds):
+    """Give each candidate seconds (before pool workers are started)
+
+    Returns:
+        budget (LocusBudget)
+    """
+    global _locus_budget
+    _locus_budget = LocusBudget(seconds)
+    return _locus_budget
+
+
+def close_locus_budget():
+    global _locus_budget
+    _locus_budget = None
+
+
+def clear_over_budget():
+    """Forget the candidates over the budget (at the start of an analysis)"""
+    if _locus_budget is not None:
+        _locus_budget.loci.clear()
+
+
+def check_budget():
+    """Raise LocusBudgetExceeded if the budget of the candidate is spent"""
+    if _deadline is not None and time.time() > _deadline:
+        raise LocusBudgetExceeded("time budget of the candidate spent")
+
+
+@contextmanager
+def budgeted():
+    """Run a block within the budget of a candidate (unlimited if no budget)"""
+    global _deadline
+    if _locus_budget is not None:
+        _deadline = time.time() + _locus_budget.seconds
+    try:
+        yield
+    finally:
+        _deadline = None
+
+
+@contextmanager
+def unbudgeted():
+    """Run a block without the budget, e.g., to calculate fallback values"""
+    global _deadline
+    deadline, _deadline = _deadline, None
+    try:
+        yield
+    finally:
+        _deadline = deadline
+
+
+def budgeted_rows(stage, func, fallback):
+    """Apply func to each row within the budget of the candidate
+
+    Args:
+        stage (str): stage name for the log
+        func (function): takes a row (pandas.Series)
+        fallback (function): takes the row, called if the budget is spent
+    Returns:
+        func (function): as given if no budget
+    """
+    if _locus_budget is None:
+        return func
+
+    def budgeted_func(row):
+        with budgeted():
+            try:
+                return func(row)
+            except LocusBudgetExceeded:
+                over_budget(stage, row)
+        return fallback(row)
+
+    return budgeted_func
+
+
+def budgeted_call(func):
+    """func to be mapped in pool workers within the budget of the candidate"""
+    if _deadline is None:
+        return func
+
+    return BudgetedCall(func, _deadline)
+
+
+def over_budget(stage, row):
+    """Record a candidate that spent its budget"""
+    if _locus_budget is not None:
+        _locus_budget.add(stage, locus_key(row))
+
+
+def is_over_budget(row):
+    """1 if the candidate spent its budget in any stage, 0 otherwise"""
+    if _locus_budget is None:
+        return 0
+
+    return int(locus_key(row) in _locus_budget.loci)
+
+
+def over_budget_count():
+    """Number of candidates that spent their budget (None if no budget)"""
+    if _locus_budget is None:
+        return None
+
+    return len(_locus_budget.loci)
+
+
+class BudgetedCall(object):
+    """Call of func in a worker with the deadline of the candidate"""
+
+    def __init__(self, func, deadline):
+        self.func = func
+        self.deadline = deadline
+
+    def __call__(self, *args):
+        global _deadline
+        _deadline = self.deadline
+        try:
+            return self.func(*args)
+        finally:
+            _deadline = None
+
+
+class LocusBudget(object):
+    """Budget of a run
+
+    Attributes:
+        seconds (float): budget of a candidate per stage
+        loci (set): candidates (chr:pos:ref:alt) that spent the budget
+                    in the current analysis
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.loci = set()
+
+    def add(self, stage, locus):
+        if locus not in self.loci:
+            self.loci.add(locus)
+            incr("over_budget_loci")
+        logger.warning(
+            "{} of {} exceeded {}s; fallback values used".format(
+                stage, locus, self.seconds
+            )
+        )
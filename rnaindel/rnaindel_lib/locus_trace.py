@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Per-locus tracing of the row-by-row stages
+
+With tracing on, the time spent on each candidate indel and the work
+done for it are recorded:
+
+    rescue          rescue_by_equivalence or rescue_by_nearest (indel_rescuer)
+    features        sam_features (indel_sequence_processor), including
+    pileup            curate_indel_in_pileup
+    complexity        indel_complexity
+
+    reads_fetched   valid reads extracted from BAM (extract_all_valid_reads)
+    edit_distances  edit distances computed (sequence_properties.editdistance)
+
+The total time of a locus is the time in the outermost stages (rescue and
+features). Counts made in worker processes (extract_indel mapped over
+the search window in indel_rescuer) are returned with the results and
+added to the locus. The slowest loci are written to a JSON file or, if
+the file name ends with .tsv, to a TSV file.
+
+'open_locus_trace', 'traced_rows', 'traced', 'count' and 'write_locus_trace' are the main routines of this module
+"""
+
+import os
+import json
+import time
+import logging
+from collections import Counter
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+STAGES = ["rescue", "features", "pileup", "complexity"]
+
+COUNTERS = ["reads_fetched", "edit_distances"]
+
+# the trace of the current run
+_locus_trace = None
+
+# counts of the locus (or the worker task) being traced
+_counts = None
+
+
+def open_locus_trace():
+    """Start tracing
+
+    Returns:
+        trace (LocusTrace)
+    """
+    global _locus_trace
+    _locus_trace = LocusTrace()
+    return _locus_trace
+
+
+def close_locus_trace():
+    global _locus_trace, _counts
+    _locus_trace = None
+    _counts = None
+
+
+def locus_key(row):
+    """chr:pos:ref:alt of a row (Bambino style alleles)"""
+    return "{}:{}:{}:{}".format(row["chr"], row["pos"], row["ref"], row["alt"])
+
+
+def traced_rows(stage, func):
+    """Trace each row as a locus when func is applied to rows
+
+    Args:
+        stage (str): see STAGES
+        func (function): takes a row (pandas.Series) as the first argument
+    Returns:
+        func (function): as given if not tracing
+    """
+    if _locus_trace is None:
+        return func
+
+    def traced_func(row, *args, **kwargs):
+        with traced(stage, locus_key(row)):
+            return func(row, *args, **kwargs)
+
+    return traced_func
+
+
+@contextmanager
+def traced(stage, locus=None):
+    """Time a block for the locus
+
+    Args:
+        stage (str): see STAGES
+        locus (str): locus key. the locus being traced if None
+    """
+    if _locus_trace is None:
+        yield
+        return
+
+    with _locus_trace.timing(stage, locus):
+        yield
+
+
+def count(name, n=1):
+    """Add n to a counter of the locus being traced (see COUNTERS)"""
+    if _counts is not None:
+        _counts[name] += n
+
+
+def map_counted(pool, func, iterable):
+    """pool.map with the counts made in the workers added to the locus"""
+    if _counts is None:
+        return pool.map(func, iterable)
+
+    outputs = pool.map(CountedCall(func), iterable)
+    for result, counts in outputs:
+        _counts.update(counts)
+
+    return [result for result, counts in outputs]
+
+
+def write_locus_trace(path, top):
+    """Write the slowest loci (nothing if not tracing)
+
+    Args:
+        path (str): .tsv for TSV, JSON otherwise
+        top (int): number of loci written
+    Returns:
+        None
+    """
+    if _locus_trace is not None:
+        _locus_trace.write(path, top)
+
+
+class CountedCall(object):
+    """Call of func in a worker returning (result, counts made in the call)"""
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, *args):
+        global _counts
+        _counts = Counter()
+        try:
+            return self.func(*args), _counts
+        finally:
+            _counts = None
+
+
+class LocusTrace(object):
+    """Traced loci
+
+    Attributes:
+        loci (OrderedDict): {locus: {"total": seconds,
+                                     "stages": Counter of seconds,
+                                     "counts": Counter}}
+        current (str): locus being traced
+    """
+
+    def __init__(self):
+        self.loci = OrderedDict()
+        self.current = None
+
+    @contextmanager
+    def timing(self, stage, locus=None):
+        """See traced"""
+        global _counts
+
+        outer = self.current
+        locus = locus or outer
+        if locus is None:
+            yield
+            return
+
+        record = self.loci.get(locus)
+        if record is None:
+            record = self.loci[locus] = {
+                "total": 0.0,
+                "stages": Counter(),
+                "counts": Counter(),
+            }
+
+        outer_counts = _counts
+        self.current, _counts = locus, record["counts"]
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            record["stages"][stage] += elapsed
+            if outer is None:
+                record["total"] += elapsed
+            self.current, _counts = outer, outer_counts
+
+    def slowest(self, top):
+        """Records of the slowest loci
+
+        Args:
+            top (int): number of loci
+        Returns:
+            records (list): OrderedDict with locus, total_s,
+                            <stage>_s for STAGES and COUNTERS
+        """
+        loci = sorted(self.loci.items(), key=lambda x: x[1]["total"], reverse=True)
+
+        records = []
+        for locus, record in loci[:top]:
+            r = OrderedDict([("locus", locus), ("total_s", round(record["total"], 4))])
+            for stage in STAGES:
+                r[stage + "_s"] = round(record["stages"][stage], 4)
+            for name in COUNTERS:
+                r[name] = record["counts"][name]
+            records.append(r)
+
+        return records
+
+    def write(self, path, top):
+        """Write JSON, or TSV if the path ends with .tsv"""
+        records = self.slowest(top)
+
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            if path.endswith(".tsv"):
+                columns = ["locus", "total_s"] + [s + "_s" for s in STAGES] + COUNTERS
+                f.write("\t".join(columns) + "\n")
+                for r in records:
+                    f.write("\t".join(str(r[c]) for c in columns) + "\n")
+            else:
+                json.dump(
+                    OrderedDict([("num_of_loci", len(self.loci)), ("loci", records)]),
+                    f,
+                    indent=2,
+                )
+                f.write("\n")
+        os.replace(tmp, path)
+
+        logger.info("{} of {} loci written to {}".format(len(records), len(self.loci), path))
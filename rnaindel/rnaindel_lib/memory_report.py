@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""Memory used by the analysis stages
+
+With --memory-report, the Python allocations of the main process are
+traced by tracemalloc and, for each stage in main(), the following are
+written to a JSON file:
+
+    traced_peak_mb          peak of the traced memory during the stage
+    traced_mb               traced memory at the end of the stage
+    peak_rss_mb             peak RSS of the main process during the stage
+    peak_children_rss_mb    peak of the summed RSS of the child processes
+                            (pool workers and Bambino) during the stage
+    peak_children_rss_by_command_mb
+                            the same by command name (e.g., python, java)
+    top_allocations         sites (file:line) with the largest growth of
+                            the traced memory held at the end of the stage
+
+RSS is sampled every SAMPLING_INTERVAL seconds from /proc (Linux). Where
+/proc is not available, the peak RSS of the main process and of the
+largest waited-for child since the start of the run are recorded
+instead. Tracing slows down the main process and is stopped in forked
+child processes.
+
+'open_memory_report', 'memory_traced' and 'write_memory_report' are the main routines of this module
+"""
+
+import os
+import json
+import logging
+import threading
+import tracemalloc
+from collections import OrderedDict
+from ..version import __version__
+from .stage_profile import usage
+from .stage_profile import rounded
+
+logger = logging.getLogger(__name__)
+
+# seconds between RSS samples
+SAMPLING_INTERVAL = 0.2
+
+# allocation sites listed for each stage
+TOP_ALLOCATIONS = 10
+
+MB = 1024 * 1024
+
+# the report of the current run
+_memory_report = None
+
+
+def open_memory_report():
+    """Start tracing and sampling
+
+    Returns:
+        report (MemoryReport)
+    """
+    global _memory_report
+    _memory_report = MemoryReport()
+    return _memory_report
+
+
+def close_memory_report():
+    global _memory_report
+    if _memory_report is not None:
+        _memory_report.close()
+        _memory_report = None
+
+
+def memory_traced(stage, run):
+    """Run a stage and record its memory if reporting
+
+    Args:
+        stage (str): stage name
+        run (function): runs the stage
+    Returns:
+        outputs: as returned by run
+    """
+    if _memory_report is None:
+        return run()
+
+    return _memory_report.run(stage, run)
+
+
+def write_memory_report(path, completed=True):
+    """Write the report of the current run (nothing if not reporting)
+
+    Args:
+        path (str): JSON file
+        completed (bool): False if the run ended before the VCF output
+    Returns:
+        None
+    """
+    if _memory_report is not None:
+        _memory_report.write(path, completed)
+
+
+def stop_tracing_in_child():
+    if _memory_report is not None and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=stop_tracing_in_child)
+
+
+def process_rss():
+    """RSS in MB of this process and of its descendants (Linux)
+
+    Returns:
+        own (float): RSS of this process
+        children (list): (command name, RSS) of each descendant
+        (None if /proc is not available)
+    """
+    if not os.path.isdir("/proc"):
+        return None
+
+    page_mb = os.sysconf("SC_PAGE_SIZE") / MB
+    processes = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(entry)) as f:
+                stat = f.read()
+        except (IOError, OSError):
+            continue
+
+        # the command name in parentheses may contain spaces
+        command = stat[stat.find("(") + 1 : stat.rfind(")")]
+        fields = stat[stat.rfind(")") + 2 :].split()
+        processes[int(entry)] = (int(fields[1]), command, int(fields[21]) * page_mb)
+
+    own = os.getpid()
+    if own not in processes:
+        return None
+
+    children, parents = [], {own}
+    while parents:
+        found = [
+            pid for pid, (ppid, command, rss) in processes.items() if ppid in parents
+        ]
+        children.extend(processes[pid][1:] for pid in found)
+        parents = set(found)
+
+    return processes[own][2], children
+
+
+class MemoryReport(object):
+    """Stages recorded in a run
+
+    Attributes:
+        stages (list): OrderedDict for each stage
+        peaks (dict): peaks sampled in the current stage
+    """
+
+    def __init__(self):
+        self.stages = []
+        self.peaks = self.new_peaks()
+
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample_until_stopped)
+        self.sampler.daemon = True
+        self.sampler.start()
+
+    @staticmethod
+    def new_peaks():
+        return {"rss": 0.0, "children_rss": 0.0, "by_command": {}}
+
+    def sample_until_stopped(self):
+        while not self.stopped.wait(SAMPLING_INTERVAL):
+            self.sample()
+
+    def sample(self):
+        sampled = process_rss()
+        if sampled is None:
+            return
+
+        own, children = sampled
+        by_command = {}
+        for command, rss in children:
+            by_command[command] = by_command.get(command, 0.0) + rss
+
+        peaks = self.peaks
+        peaks["rss"] = max(peaks["rss"], own)
+        peaks["children_rss"] = max(peaks["children_rss"], sum(by_command.values()))
+        for command, rss in by_command.items():
+            peaks["by_command"][command] = max(peaks["by_command"].get(command, 0.0), rss)
+
+    def run(self, stage, run):
+        """See memory_traced"""
+        start_snapshot = tracemalloc.take_snapshot()
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        self.peaks = self.new_peaks()
+        self.sample()
+
+        outputs = run()
+
+        self.sample()
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        # sites of the snapshots themselves excluded
+        growth = [
+            s
+            for s in tracemalloc.take_snapshot().compare_to(start_snapshot, "lineno")
+            if s.traceback[0].filename not in (tracemalloc.__file__, __file__)
+        ]
+        growth.sort(key=lambda s: s.size_diff, reverse=True)
+        top = [
+            OrderedDict(
+                [
+                    ("site", "{}:{}".format(s.traceback[0].filename, s.traceback[0].lineno)),
+                    ("size_mb", round(s.size_diff / MB, 2)),
+                    ("count", s.count_diff),
+                ]
+            )
+            for s in growth[:TOP_ALLOCATIONS]
+            if s.size_diff > 0
+        ]
+
+        peaks = self.peaks
+        if process_rss() is None:
+            # peaks since the start of the run
+            cpu, peak_rss, peak_child_rss = usage()
+            peaks = {
+                "rss": peak_rss,
+                "children_rss": peak_child_rss,
+                "by_command": {},
+            }
+
+        self.stages.append(
+            OrderedDict(
+                [
+                    ("stage", stage),
+                    ("traced_peak_mb", round(traced_peak / MB, 1)),
+                    ("traced_mb", round(traced / MB, 1)),
+                    ("peak_rss_mb", rounded(peaks["rss"])),
+                    ("peak_children_rss_mb", rounded(peaks["children_rss"])),
+                    (
+                        "peak_children_rss_by_command_mb",
+                        OrderedDict(
+                            (command, round(rss, 1))
+                            for command, rss in sorted(peaks["by_command"].items())
+                        ),
+                    ),
+                    ("top_allocations", top),
+                ]
+            )
+        )
+        logger.info(
+            "stage {}: traced peak {:.1f} MB".format(stage, traced_peak / MB)
+        )
+
+        return outputs
+
+    def summary(self, completed=True):
+        def peak(key):
+            values = [s[key] for s in self.stages if s[key] is not None]
+            return max(values) if values else None
+
+        return OrderedDict(
+            [
+                ("rnaindel_version", __version__),
+                ("completed", completed),
+                ("traced_peak_mb", peak("traced_peak_mb")),
+                ("peak_rss_mb", peak("peak_rss_mb")),
+                ("peak_children_rss_mb", peak("peak_children_rss_mb")),
+                ("stages", self.stages),
+            ]
+        )
+
+    def write(self, path, completed=True):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.summary(completed), f, indent=2)
+            f.write("\n")
+        os.replace(tmp, path)
+
+    def close(self):
+        self.stopped.set()
+        self.sampler.join()
+        if self.started_tracing:
+            tracemalloc.stop()
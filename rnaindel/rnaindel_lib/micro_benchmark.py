@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks of the sequence and pileup kernels and of the startup
+
+Each kernel is timed on synthetic inputs drawn from a generator seeded
+with BENCH_SEED, so the inputs are the same in every run:
+
+    editdistance            pairs of 50-nt sequences with substitutions
+    linguistic_complexity   50-nt sequences
+    dna_strength            50-nt sequences
+    repeat                  indels in tandem repeats
+    indel_equivalence       SequenceWithIndel.__eq__ on shifted deletions
+    extract_indel_reads     reads with and without a 2-nt deletion
+    decompose_indel_read    reads with a 2-nt deletion
+    most_common             lists of 200 indel sequences
+    startup                 import of the entry point in a new interpreter
+
+The loops of a kernel are calibrated to run at least min_time seconds and
+timed repeats times. The best and median time per call are reported. The
+results of a run can be appended to a history file and compared with a
+baseline (a saved run or the last run of a history file). A kernel is
+flagged as slower if its best time exceeds the baseline by more than
+the threshold.
+
+'run_benchmarks', 'compare_with_baseline' and 'append_history' are the main routines of this module
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import subprocess
+from functools import partial
+from collections import OrderedDict
+from ..version import __version__
+from .most_common import most_common
+from .indel_sequence import SequenceWithIndel
+from .indel_curator import extract_indel_reads
+from .indel_curator import decompose_indel_read
+from .sequence_properties import editdistance
+from .sequence_properties import linguistic_complexity
+from .sequence_properties import dna_strength
+from .sequence_properties import repeat
+
+BENCH_SEED = 20240
+
+# inputs per kernel
+NUM_OF_INPUTS = 100
+
+
+def random_seq(rng, n):
+    return "".join(rng.choice("ACGT") for i in range(n))
+
+
+def mutated(rng, seq, num_of_substitutions):
+    seq = list(seq)
+    for i in rng.sample(range(len(seq)), num_of_substitutions):
+        seq[i] = rng.choice("ACGT".replace(seq[i], ""))
+    return "".join(seq)
+
+
+def editdistance_inputs(rng):
+    inputs = []
+    for i in range(NUM_OF_INPUTS):
+        seq = random_seq(rng, 50)
+        inputs.append((seq, mutated(rng, seq, rng.randint(0, 10))))
+    return editdistance, inputs
+
+
+def linguistic_complexity_inputs(rng):
+    return linguistic_complexity, [(random_seq(rng, 50),) for i in range(NUM_OF_INPUTS)]
+
+
+def dna_strength_inputs(rng):
+    return dna_strength, [(random_seq(rng, 50),) for i in range(NUM_OF_INPUTS)]
+
+
+def repeat_inputs(rng):
+    inputs = []
+    for i in range(NUM_OF_INPUTS):
+        unit = random_seq(rng, rng.randint(1, 4))
+        lt_seq = random_seq(rng, 20) + unit * rng.randint(0, 5)
+        rt_seq = unit * rng.randint(0, 5) + random_seq(rng, 20)
+        inputs.append((rng.randint(0, 1), lt_seq, unit, rt_seq))
+    return repeat, inputs
+
+
+def indel_equivalence_inputs(rng):
+    """Deletions of a repeat unit at different positions in the repeat"""
+    inputs = []
+    for i in range(NUM_OF_INPUTS):
+        unit = random_seq(rng, 3)
+        ref = random_seq(rng, 40) + unit * 6 + random_seq(rng, 40)
+
+        deletions = []
+        for start in rng.sample(range(40, 56, 3), 2):
+            deletions.append(
+                SequenceWithIndel(
+                    "chr1",
+                    start + 1,
+                    0,
+                    ref[start - 20 : start],
+                    ref[start : start + 3],
+                    ref[start + 3 : start + 23],
+                )
+            )
+        inputs.append(tuple(deletions))
+    return SequenceWithIndel.__eq__, inputs
+
+
+def synthetic_reads(
+    rng, num_of_reads=NUM_OF_INPUTS, read_len=75, del_len=2, ref=None
+):
+    """Reads, every other one with a deletion at del_pos
+
+    Args:
+        ref (str): sequence of chr1 (400-nt random sequence if None)
+    Returns:
+        reads (list): pysam.AlignedSegment with MD tags
+        del_pos (int): 0-based start of the deletion
+    """
+    import pysam
+
+    if ref is None:
+        ref = random_seq(rng, 400)
+    header = pysam.AlignmentHeader.from_dict(
+        {"HD": {"VN": "1.6"}, "SQ": [{"SN": "chr1", "LN": len(ref)}]}
+    )
+    del_pos = 200
+
+    reads = []
+    for i in range(num_of_reads):
+        start = rng.randint(del_pos - read_len + 10, del_pos - 10)
+        lt_len = del_pos - start
+        rt_len = read_len - lt_len
+
+        read = pysam.AlignedSegment(header)
+        read.query_name = "read{}".format(i)
+        read.reference_id = 0
+        read.reference_start = start
+        read.mapping_quality = 60
+        if i % 2:
+            read.query_sequence = (
+                ref[start:del_pos] + ref[del_pos + del_len : del_pos + del_len + rt_len]
+            )
+            read.cigarstring = "{}M{}D{}M".format(lt_len, del_len, rt_len)
+            read.set_tag(
+                "MD", "{}^{}{}".format(lt_len, ref[del_pos : del_pos + del_len], rt_len)
+            )
+        else:
+            read.query_sequence = ref[start : start + read_len]
+            read.cigarstring = "{}M".format(read_len)
+            read.set_tag("MD", str(read_len))
+        read.query_qualities = pysam.qualitystring_to_array("I" * read_len)
+        reads.append(read)
+
+    return reads, del_pos
+
+
+def write_synthetic_pileup(out_dir, num_of_reads=200, seed=BENCH_SEED):
+    """Write synthetic_reads as an indexed BAM with the reference FASTA
+
+    Args:
+        out_dir (str): existing directory
+        num_of_reads (int): reads, every other one with a 2-nt deletion
+        seed (int)
+    Returns:
+        fasta (str), bam (str): paths to ref.fa and sample.bam
+        del_pos (int): 1-based position of the deletion (as in 'pos' of rows)
+        del_seq (str): deleted sequence
+    """
+    import pysam
+
+    rng = random.Random(seed)
+    ref = random_seq(rng, 400)
+    reads, del_pos = synthetic_reads(rng, num_of_reads, ref=ref)
+    reads.sort(key=lambda read: read.reference_start)
+
+    fasta = os.path.join(out_dir, "ref.fa")
+    with open(fasta, "w") as f:
+        f.write(">chr1\n{}\n".format(ref))
+    pysam.faidx(fasta)
+
+    bam = os.path.join(out_dir, "sample.bam")
+    with pysam.AlignmentFile(bam, "wb", header=reads[0].header) as f:
+        for read in reads:
+            f.write(read)
+    pysam.index(bam)
+
+    return fasta, bam, del_pos + 1, ref[del_pos : del_pos + 2]
+
+
+def extract_indel_reads_inputs(rng):
+    reads, del_pos = synthetic_reads(rng)
+    return extract_indel_reads, [(reads, del_pos, "D")]
+
+
+def decompose_indel_read_inputs(rng):
+    reads, del_pos = synthetic_reads(rng)
+    parsed_reads = extract_indel_reads(reads, del_pos, "D")
+    return decompose_indel_read, [(parsed,) for parsed in parsed_reads]
+
+
+def most_common_inputs(rng):
+    seqs = [random_seq(rng, rng.randint(1, 6)) for i in range(10)]
+    return (
+        most_common,
+        [([rng.choice(seqs) for j in range(200)],) for i in range(NUM_OF_INPUTS)],
+    )
+
+
+def startup_inputs(rng):
+    """'rnaindel -h' and '--version' return after importing the entry point"""
+    package_root = os.path.dirname(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    cmd = [sys.executable, "-c", "import rnaindel.rnaindel"]
+    return partial(subprocess.run, cmd, cwd=package_root, check=True), [()]
+
+
+# {name: function taking a random.Random and returning (kernel, inputs)}
+KERNELS = OrderedDict(
+    [
+        ("editdistance", editdistance_inputs),
+        ("linguistic_complexity", linguistic_complexity_inputs),
+        ("dna_strength", dna_strength_inputs),
+        ("repeat", repeat_inputs),
+        ("indel_equivalence", indel_equivalence_inputs),
+        ("extract_indel_reads", extract_indel_reads_inputs),
+        ("decompose_indel_read", decompose_indel_read_inputs),
+        ("most_common", most_common_inputs),
+        ("startup", startup_inputs),
+    ]
+)
+
+
+def benchmark_inputs(name):
+    """Kernel and synthetic inputs (a list of argument tuples) of a benchmark"""
+    return KERNELS[name](random.Random(BENCH_SEED))
+
+
+def time_kernel(kernel, inputs, repeats, min_time):
+    """Best and median seconds per call
+
+    Args:
+        kernel (function)
+        inputs (list): argument tuples
+        repeats (int): number of timings
+        min_time (float): minimum seconds of a timing
+    Returns:
+        best (float), median (float), calls (int): calls per timing
+    """
+
+    def timing(loops):
+        start = time.perf_counter()
+        for i in range(loops):
+            for args in inputs:
+                kernel(*args)
+        return time.perf_counter() - start
+
+    loops = 1
+    while timing(loops) < min_time:
+        loops *= 2
+
+    per_call = sorted(timing(loops) / (loops * len(inputs)) for i in range(repeats))
+
+    return per_call[0], per_call[len(per_call) // 2], loops * len(inputs)
+
+
+def run_benchmarks(names=None, repeats=5, min_time=0.2):
+    """Time the kernels
+
+    Args:
+        names (list): kernels to run (all if None)
+        repeats (int): number of timings per kernel
+        min_time (float): minimum seconds of a timing
+    Returns:
+        run (OrderedDict): environment and {name: {best_us, median_us, calls}}
+    Raises:
+        ValueError: if a name is not in KERNELS
+    """
+    names = names or list(KERNELS)
+    unknown = [name for name in names if name not in KERNELS]
+    if unknown:
+        raise ValueError("unknown benchmarks: {}".format(", ".join(unknown)))
+
+    results = OrderedDict()
+    for name in names:
+        kernel, inputs = benchmark_inputs(name)
+        best, median, calls = time_kernel(kernel, inputs, repeats, min_time)
+        results[name] = OrderedDict(
+            [
+                ("best_us", round(best * 1e6, 3)),
+                ("median_us", round(median * 1e6, 3)),
+                ("calls", calls),
+            ]
+        )
+
+    return OrderedDict(
+        [
+            ("timestamp", time.strftime("%Y-%m-%dT%H:%M:%S")),
+            ("rnaindel_version", __version__),
+            ("python", platform.python_version()),
+            ("platform", platform.platform()),
+            ("results", results),
+        ]
+    )
+
+
+def load_benchmark_run(path):
+    """A saved run, or the last run of a history file"""
+    with open(path) as f:
+        saved = json.load(f)
+
+    if "runs" in saved:
+        if not saved["runs"]:
+            raise ValueError("no runs in {}".format(path))
+        return saved["runs"][-1]
+
+    return saved
+
+
+def write_benchmark_run(path, run):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(run, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def append_history(path, run):
+    """Append a run to the history file (created if not exists)"""
+    history = {"runs": []}
+    if os.path.isfile(path):
+        with open(path) as f:
+            history = json.load(f)
+
+    history["runs"].append(run)
+    write_benchmark_run(path, history)
+
+
+def compare_with_baseline(run, baseline, threshold):
+    """Change of the best time from the baseline
+
+    Args:
+        run (dict): as returned by run_benchmarks
+        baseline (dict): a saved run
+        threshold (float): fraction of slowdown flagged (e.g., 0.2 for 20%)
+    Returns:
+        changes (OrderedDict): {name: (change (float), slower (bool))}
+                               for kernels in both runs
+    """
+    changes = OrderedDict()
+    for name, result in run["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or not base["best_us"]:
+            continue
+        change = result["best_us"] / base["best_us"] - 1
+        changes[name] = (change, change > threshold)
+
+    return changes
+
+
+def benchmark_report(run, changes=None, out=sys.stdout):
+    """Write a table of the results (and the changes from the baseline)"""
+    changes = changes or {}
+    out.write(
+        "{:<24}{:>12}{:>12}  {}\n".format("benchmark", "best_us", "median_us", "change")
+    )
+    for name, result in run["results"].items():
+        change = ""
+        if name in changes:
+            change = "{:+.1%}".format(changes[name][0])
+            if changes[name][1]:
+                change += " SLOWER"
+        out.write(
+            "{:<24}{:>12.3f}{:>12.3f}  {}\n".format(
+                name, result["best_us"], result["median_us"], change
+            )
+        )
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""cProfile of the main process and the pool workers
+
+With --cprofile DIR, the main process and every worker of the pools
+started by process_pool are profiled. Each process dumps its stats when
+it exits:
+
+    <DIR>/main.<pid>.pstats      main process
+    <DIR>/worker.<pid>.pstats    pool workers (on pool.close() and join())
+
+and the stats are merged at the end of the run:
+
+    <DIR>/combined.pstats        all processes (for pstats or snakeviz)
+    <DIR>/combined.txt           functions sorted by cumulative time
+
+Workers stopped by pool.terminate() do not dump their stats, so pools
+started by process_pool are closed and joined by their owners.
+
+'open_process_profile', 'process_pool' and 'close_process_profile' are the main routines of this module
+"""
+
+import os
+import glob
+import pstats
+import cProfile
+import logging
+from multiprocessing import Pool
+from multiprocessing import util
+
+logger = logging.getLogger(__name__)
+
+# functions listed in combined.txt
+TOP_FUNCTIONS = 100
+
+# the profile of the current run
+_process_profile = None
+
+
+def open_process_profile(out_dir):
+    """Start profiling the main process
+
+    Args:
+        out_dir (str): directory for the stats (created if not exists)
+    Returns:
+        profile (ProcessProfile)
+    """
+    global _process_profile
+    _process_profile = ProcessProfile(out_dir)
+    return _process_profile
+
+
+def close_process_profile():
+    """Stop profiling and merge the stats of all processes"""
+    global _process_profile
+    if _process_profile is not None:
+        _process_profile.close()
+        _process_profile = None
+
+
+def process_pool(num_of_processes):
+    """multiprocessing.Pool with the workers profiled if profiling
+
+    Args:
+        num_of_processes (int)
+    Returns:
+        pool (multiprocessing.Pool)
+    """
+    if _process_profile is None:
+        return Pool(num_of_processes)
+
+    return Pool(
+        num_of_processes,
+        initializer=start_worker_profile,
+        initargs=(_process_profile.out_dir,),
+    )
+
+
+def start_worker_profile(out_dir):
+    """Pool initializer: profile the worker until it exits"""
+    # a forked worker inherits the profiler of the main process
+    if _process_profile is not None:
+        _process_profile.profiler.disable()
+
+    profiler = cProfile.Profile()
+    path = os.path.join(out_dir, "worker.{}.pstats".format(os.getpid()))
+    util.Finalize(None, dump_stats, args=(profiler, path), exitpriority=10)
+    profiler.enable()
+
+
+def dump_stats(profiler, path):
+    profiler.disable()
+    profiler.dump_stats(path)
+
+
+class ProcessProfile(object):
+    """Profile of the main process
+
+    Attributes:
+        out_dir (str)
+        profiler (cProfile.Profile): profiler of the main process
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        os.makedirs(out_dir, exist_ok=True)
+
+        # stats of an earlier run would be merged
+        for path in self.process_stats():
+            os.remove(path)
+
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def process_stats(self):
+        return sorted(
+            glob.glob(os.path.join(self.out_dir, "main.*.pstats"))
+            + glob.glob(os.path.join(self.out_dir, "worker.*.pstats"))
+        )
+
+    def close(self):
+        dump_stats(
+            self.profiler,
+            os.path.join(self.out_dir, "main.{}.pstats".format(os.getpid())),
+        )
+
+        paths = self.process_stats()
+        stats = pstats.Stats(paths[0])
+        for path in paths[1:]:
+            stats.add(path)
+        stats.dump_stats(os.path.join(self.out_dir, "combined.pstats"))
+
+        with open(os.path.join(self.out_dir, "combined.txt"), "w") as f:
+            f.write("# {} processes\n".format(len(paths)))
+            stats.stream = f
+            stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+        logger.info(
+            "profiles of {} processes merged in {}".format(len(paths), self.out_dir)
+        )
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Scaling of the pipeline with the number of processes
+
+The pipeline is run on a synthetic data set (see synthetic_data) once for
+each --process-num, with the stages profiled (see stage_profile). For each
+number of processes, the following are reported:
+
+    processes               --process-num
+    wall_s                  wall time of the run
+    cpu_s                   CPU time of the run (including waited-for children)
+    candidates_per_s        planted indels per wall second
+    speedup                 wall time of the fewest processes / wall time
+    parallel_efficiency     speedup / relative number of processes
+    peak_rss_mb             peak RSS of the main process
+    peak_child_rss_mb       peak RSS of the largest child process
+    indels_out              records in the output VCF
+    identical_output        output VCF identical to that of the fewest processes
+
+'scaling_results' and 'write_scaling_report' are the main routines of this module
+"""
+
+import os
+import sys
+import json
+import logging
+from collections import OrderedDict
+from ..version import __version__
+
+logger = logging.getLogger(__name__)
+
+SCALING_COLUMNS = [
+    "processes",
+    "wall_s",
+    "cpu_s",
+    "candidates_per_s",
+    "speedup",
+    "parallel_efficiency",
+    "peak_rss_mb",
+    "peak_child_rss_mb",
+    "indels_out",
+    "identical_output",
+]
+
+
+def vcf_records(path):
+    """Records of a VCF (meta-information lines excluded)"""
+    with open(path) as f:
+        return [line for line in f if not line.startswith("##")]
+
+
+def scaling_results(runs, num_of_candidates):
+    """Throughput, speedup and efficiency of each run
+
+    Args:
+        runs (list): (num_of_processes (int), profile (dict), output_vcf (str))
+                     with profile as written by --profile-report
+        num_of_candidates (int): planted indels in the data set
+    Returns:
+        results (list): OrderedDict for each run with SCALING_COLUMNS,
+                        in the order of the number of processes
+    """
+    runs = sorted(runs, key=lambda run: run[0])
+    base_processes, base_profile, base_vcf = runs[0]
+    base_records = vcf_records(base_vcf)
+
+    results = []
+    for num_of_processes, profile, output_vcf in runs:
+        wall = profile["wall_s"]
+        records = vcf_records(output_vcf)
+        speedup = base_profile["wall_s"] / wall if wall else None
+        efficiency = (
+            speedup / (num_of_processes / base_processes) if speedup else None
+        )
+        results.append(
+            OrderedDict(
+                [
+                    ("processes", num_of_processes),
+                    ("wall_s", wall),
+                    ("cpu_s", profile["cpu_s"]),
+                    (
+                        "candidates_per_s",
+                        round(num_of_candidates / wall, 1) if wall else None,
+                    ),
+                    ("speedup", round(speedup, 2) if speedup else None),
+                    (
+                        "parallel_efficiency",
+                        round(efficiency, 2) if efficiency else None,
+                    ),
+                    ("peak_rss_mb", profile["peak_rss_mb"]),
+                    ("peak_child_rss_mb", profile["peak_child_rss_mb"]),
+                    ("indels_out", sum(1 for r in records if not r.startswith("#"))),
+                    ("identical_output", records == base_records),
+                ]
+            )
+        )
+
+    return results
+
+
+def write_scaling_report(path, synthetic, results):
+    """Write the results as JSON, or TSV if the path ends with .tsv
+
+    Args:
+        path (str): report file
+        synthetic (dict): manifest of the synthetic data set
+        results (list): as returned by scaling_results
+    Returns:
+        None
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        if path.endswith(".tsv"):
+            f.write("\t".join(SCALING_COLUMNS) + "\n")
+            for result in results:
+                f.write(
+                    "\t".join(
+                        "" if result[c] is None else str(result[c])
+                        for c in SCALING_COLUMNS
+                    )
+                    + "\n"
+                )
+        else:
+            report = OrderedDict(
+                [
+                    ("rnaindel_version", __version__),
+                    ("cpu_count", os.cpu_count()),
+                    (
+                        "synthetic_data",
+                        OrderedDict(
+                            (key, synthetic[key])
+                            for key in (
+                                "seed",
+                                "num_of_candidates",
+                                "depth",
+                                "num_of_chromosomes",
+                                "num_of_reads",
+                            )
+                        ),
+                    ),
+                    ("runs", results),
+                ]
+            )
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    os.replace(tmp, path)
+
+    logger.info("scaling report written to {}".format(path))
+
+
+def scaling_table(results, out=sys.stdout):
+    """Write a table of the results"""
+    out.write(
+        "{:>9}{:>10}{:>10}{:>13}{:>9}{:>12}{:>10}{:>10}  {}\n".format(
+            "processes",
+            "wall_s",
+            "cpu_s",
+            "candidates/s",
+            "speedup",
+            "efficiency",
+            "rss_mb",
+            "child_mb",
+            "output",
+        )
+    )
+
+    def cell(value):
+        return "-" if value is None else value
+
+    for result in results:
+        out.write(
+            "{:>9}{:>10}{:>10}{:>13}{:>9}{:>12}{:>10}{:>10}  {}\n".format(
+                result["processes"],
+                cell(result["wall_s"]),
+                cell(result["cpu_s"]),
+                cell(result["candidates_per_s"]),
+                cell(result["speedup"]),
+                cell(result["parallel_efficiency"]),
+                cell(result["peak_rss_mb"]),
+                cell(result["peak_child_rss_mb"]),
+                "identical" if result["identical_output"] else "DIFFERENT",
+            )
+        )
@@ -5,6 +5,7 @@
 import numpy as np
 from operator import mul
 from functools import reduce
+from .locus_trace import count
 
 
 def editdistance(seq1, seq2):
@@ -21,6 +22,8 @@ def editdistance(seq1, seq2):
     if len(seq1) < len(seq2):
         return editdistance(seq2, seq1)
 
+    count("edit_distances")
+
     if len(seq2) == 0:
         return len(seq1)
 
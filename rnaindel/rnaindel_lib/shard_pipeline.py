@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Pipelined analysis of indel calls by chromosome shard
+
+Calls from the built-in calling are preprocessed, rescued, annotated
+and characterized (indel_sequence_processor) shard by shard as soon as
+each shard is called, so the analysis overlaps with the calling of the
+remaining shards.
+
+Shards are analyzed in the chromosome order of sort_positionally with
+row labels and indel ids continued from the preceding shards. Rows are
+therefore processed in the same order as in the analysis of all calls
+at once, and reads are sampled identically in indel_curator.
+
+'shard_pipeline' is the main routine of this module
+"""
+
+import sys
+import pysam
+import logging
+import pandas as pd
+from .indel_rescuer import indel_rescuer
+from .indel_annotator import annotate_coding_indels
+from .indel_preprocessor import coding_indels
+from .indel_preprocessor import is_chr_prefixed
+from .indel_sequence_processor import indel_sequence_processor
+from .coding_exon_index import get_coding_exon_index
+from .process_profile import process_pool
+
+logger = logging.getLogger(__name__)
+
+
+def shard_pipeline(
+    chrs,
+    calls,
+    bam,
+    refgene,
+    fasta,
+    mapq,
+    num_of_processes=1,
+    pool=None,
+    max_depth=None,
+):
+    """Analyze calls shard by shard while calling
+
+    Args:
+        chrs (list): chromosomes of the shards (None for the whole bam)
+        calls (iterable): yields (chr, BambinoIndels) as shards are called.
+                          iterated after the worker pool for indel_rescuer is
+                          started so that no process is forked while calling
+        bam (str): path to bam
+        refgene (str): path to refCodingExon.bed.gz
+        fasta (str): path to fasta
+        mapq (int): MAPQ score for uniquely mapped reads
+        num_of_processes (int): processes for indel_rescuer
+        pool (multiprocessing.Pool): used instead of starting a new pool if given
+        max_depth (int): cap on reads without indels per locus (None for no cap)
+    Returns:
+        df (pandas.DataFrame): as returned by indel_sequence_processor
+        df_filtered_premerge (pandas.DataFrame): as returned by indel_sequence_processor
+        anno (pandas.DataFrame): as returned by indel_annotator
+        chr_prefixed (bool): True if chromosome names are prefixed with "chr" in BAM
+    """
+    exon_data = get_coding_exon_index(refgene)
+    bam_data = pysam.AlignmentFile(bam)
+    chr_prefixed = is_chr_prefixed(bam_data)
+    bam_data.close()
+
+    own_pool = pool is None
+    if own_pool:
+        pool = process_pool(num_of_processes)
+
+    num_of_calls, num_of_indels, num_of_coding = 0, 0, 0
+    first_id = 0
+    dfs, dfs_filtered, annos = [], [], []
+    for chr, shard in in_analysis_order(chrs, calls):
+        num_of_calls += shard.num_of_calls
+        num_of_indels += shard.num_of_indels
+        if len(shard.df) == 0:
+            continue
+
+        df = coding_indels(shard.df, exon_data, fasta, chr_prefixed)
+        num_of_coding += len(df)
+        if len(df) == 0:
+            continue
+
+        df = indel_rescuer(df, fasta, bam, chr_prefixed, pool=pool)
+        df.index = df.index + first_id
+
+        num_of_rows = len(df)
+        df, anno = annotate_coding_indels(
+            df, refgene, fasta, chr_prefixed, first_id=first_id
+        )
+        first_id += num_of_rows
+        if len(df) == 0:
+            continue
+
+        df, df_filtered = indel_sequence_processor(
+            df, anno, fasta, bam, mapq, chr_prefixed, max_depth=max_depth
+        )
+        dfs.append(df)
+        dfs_filtered.append(df_filtered)
+        annos.append(anno)
+
+        logger.info("shard {} analyzed: {} indels".format(chr, len(df)))
+
+    if own_pool:
+        pool.close()
+        pool.join()
+
+    # the checks of indel_preprocessor and indel_annotator
+    if num_of_calls == 0:
+        logging.critical("Bambino output only contains the header line.")
+        sys.exit(1)
+
+    if num_of_indels == 0:
+        logging.warning("No indels detected in variant calling. Analysis done.")
+        sys.exit(0)
+
+    if num_of_coding == 0:
+        logging.warning("No coding indels annotated. Analysis done.")
+        sys.exit(0)
+
+    if not dfs:
+        logging.warning("No indels annotated in coding region. Analysis done.")
+        sys.exit(0)
+
+    df = pd.concat(dfs, axis=0)
+    df_filtered_premerge = pd.concat(dfs_filtered, axis=0)
+    anno = pd.concat(annos, axis=0, ignore_index=True)
+
+    return df, df_filtered_premerge, anno, chr_prefixed
+
+
+def in_analysis_order(chrs, calls):
+    """Reorder shards to the chromosome order of sort_positionally
+
+    Args:
+        chrs (list): chromosomes of all shards
+        calls (iterable): yields (chr, result) in any order
+    Yields:
+        chr, result: as soon as the shards of preceding chromosomes are yielded
+    """
+    order = sorted(chrs, key=chromosome_rank)
+    pending = {}
+    i = 0
+    for chr, result in calls:
+        pending[chr] = result
+        while i < len(order) and order[i] in pending:
+            yield order[i], pending.pop(order[i])
+            i += 1
+
+
+def chromosome_rank(chr):
+    """Sort key of chromosomes: 1-22, X, Y, then others by name"""
+    if chr is None:
+        return (0, 0, "")
+
+    name = chr[3:] if chr.startswith("chr") else chr
+    if name == "X":
+        return (0, 23, "")
+    elif name == "Y":
+        return (0, 24, "")
+    elif name.isdigit():
+        return (0, int(name), "")
+    else:
+        return (1, 0, chr)
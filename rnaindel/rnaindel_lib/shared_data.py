@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Data loaded once and shared by the samples in batch mode
+
+Samples in 'rnaindel batch' run in processes forked from the batch
+process and inherit the data loaded here (copy-on-write): the coding
+exon index, the CDS lengths, the models and, if the data directory is
+compiled, the dbSNP and ClinVar tables.
+
+Tabix and FASTA handles are not opened here. Their file offsets would
+be shared by the forked processes, so each sample opens its own.
+
+'warm_up' is the main routine of this module
+"""
+
+import logging
+from .coding_exon_index import get_coding_exon_index
+from .data_bundle import bundled_snp_table
+from .indel_classifier import model_paths
+from .indel_classifier import load_model
+from .indel_protein_processor import acc_len_dict
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up(data_dir):
+    """Load the data used by every sample
+
+    Args:
+        data_dir (str): path to data directory (compiled bundle loaded if any)
+    Returns:
+        None
+    """
+    refgene = "{}/refgene/refCodingExon.bed.gz".format(data_dir)
+    get_coding_exon_index(refgene)
+    acc_len_dict(refgene)
+
+    for db in ("dbsnp", "clinvar"):
+        bundled_snp_table("{}/{}/{}.indel.vcf.gz".format(data_dir, db, db))
+
+    model_dir = "{}/models".format(data_dir)
+    for kind in ("mono", "non_mono"):
+        for model in model_paths(model_dir, kind):
+            load_model(model, keep=True)
+
+    logger.info("data in {} loaded for the batch".format(data_dir))
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Timing and throughput of the analysis stages
+
+For each stage in main(), the wall time, CPU time, peak RSS and the
+numbers of rows in and out are recorded and written with the total run
+time and the number of processes to a JSON file or, if the file name
+ends with .tsv, to a TSV file (one line per stage and a "total" line).
+The JSON file also has the number of candidate indels over the time
+budget (see locus_budget).
+
+CPU time includes worker processes once they have exited and been
+waited for (e.g., when the pool of the stage is closed). Peak RSS is the
+maximum resident set size of the main process and of the largest
+waited-for worker process since the start of the run.
+
+'open_stage_profile', 'profiled' and 'write_stage_profile' are the main routines of this module
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import pandas as pd
+from collections import OrderedDict
+from ..version import __version__
+from .locus_budget import over_budget_count
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+TSV_COLUMNS = [
+    "stage",
+    "wall_s",
+    "cpu_s",
+    "peak_rss_mb",
+    "peak_child_rss_mb",
+    "rows_in",
+    "rows_out",
+    "rows_per_s",
+]
+
+# the profile of the current run
+_stage_profile = None
+
+
+def open_stage_profile(num_of_processes):
+    """Start recording stages
+
+    Args:
+        num_of_processes (int): processes used in the run
+    Returns:
+        profile (StageProfile)
+    """
+    global _stage_profile
+    _stage_profile = StageProfile(num_of_processes)
+    return _stage_profile
+
+
+def close_stage_profile():
+    global _stage_profile
+    _stage_profile = None
+
+
+def profiled(stage, rows_in, run):
+    """Run a stage and record it if profiling
+
+    Args:
+        stage (str): stage name
+        rows_in (int): number of input rows (None if not a table, e.g., BAM)
+        run (function): runs the stage
+    Returns:
+        outputs: as returned by run
+    """
+    if _stage_profile is None:
+        return run()
+
+    return _stage_profile.run(stage, rows_in, run)
+
+
+def write_stage_profile(path, completed=True):
+    """Write the profile of the current run (nothing if not profiling)
+
+    Args:
+        path (str): .tsv for TSV, JSON otherwise
+        completed (bool): False if the run ended before the VCF output
+    Returns:
+        None
+    """
+    if _stage_profile is not None:
+        _stage_profile.write(path, completed)
+
+
+def usage():
+    """CPU seconds and peak RSS in MB of this process and its waited-for workers"""
+    if resource is None:
+        return time.process_time(), None, None
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+
+    return cpu, own.ru_maxrss / unit, children.ru_maxrss / unit
+
+
+def count_rows(outputs):
+    """Rows of the first DataFrame in the outputs (None if none)"""
+    values = outputs if isinstance(outputs, tuple) else (outputs,)
+    for value in values:
+        if isinstance(value, pd.DataFrame):
+            return len(value)
+    return None
+
+
+class StageProfile(object):
+    """Stages recorded in a run
+
+    Attributes:
+        num_of_processes (int)
+        stages (list): OrderedDict for each stage with the keys in TSV_COLUMNS
+    """
+
+    def __init__(self, num_of_processes):
+        self.num_of_processes = num_of_processes
+        self.stages = []
+        self.started = time.time()
+        self.cpu_started = usage()[0]
+
+    def run(self, stage, rows_in, run):
+        """See profiled"""
+        start = time.time()
+        cpu_start = usage()[0]
+
+        outputs = run()
+
+        wall = time.time() - start
+        cpu, peak_rss, peak_child_rss = usage()
+        rows_out = count_rows(outputs)
+
+        # throughput of the input, or of the output for stages reading files
+        rows = rows_in if rows_in is not None else rows_out
+        self.stages.append(
+            OrderedDict(
+                [
+                    ("stage", stage),
+                    ("wall_s", round(wall, 3)),
+                    ("cpu_s", round(cpu - cpu_start, 3)),
+                    ("peak_rss_mb", rounded(peak_rss)),
+                    ("peak_child_rss_mb", rounded(peak_child_rss)),
+                    ("rows_in", rows_in),
+                    ("rows_out", rows_out),
+                    ("rows_per_s", round(rows / wall, 1) if rows and wall > 0 else None),
+                ]
+            )
+        )
+        logger.info("stage {} done in {:.3f}s".format(stage, wall))
+
+        return outputs
+
+    def summary(self, completed=True):
+        cpu, peak_rss, peak_child_rss = usage()
+        return OrderedDict(
+            [
+                ("rnaindel_version", __version__),
+                ("num_of_processes", self.num_of_processes),
+                ("completed", completed),
+                ("wall_s", round(time.time() - self.started, 3)),
+                ("cpu_s", round(cpu - self.cpu_started, 3)),
+                ("peak_rss_mb", rounded(peak_rss)),
+                ("peak_child_rss_mb", rounded(peak_child_rss)),
+                ("over_budget_loci", over_budget_count()),
+                ("stages", self.stages),
+            ]
+        )
+
+    def write(self, path, completed=True):
+        """Write JSON, or TSV if the path ends with .tsv"""
+        summary = self.summary(completed)
+
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            if path.endswith(".tsv"):
+                f.write(
+                    "# rnaindel {} processes={} completed={}\n".format(
+                        __version__, self.num_of_processes, completed
+                    )
+                )
+                f.write("\t".join(TSV_COLUMNS) + "\n")
+                total = dict(summary, stage="total")
+                for stage in self.stages + [total]:
+                    f.write("\t".join(tsv_value(stage.get(c)) for c in TSV_COLUMNS) + "\n")
+            else:
+                json.dump(summary, f, indent=2)
+                f.write("\n")
+        os.replace(tmp, path)
+
+
+def rounded(mb):
+    return round(mb, 1) if mb is not None else None
+
+
+def tsv_value(value):
+    return "NA" if value is None else str(value)
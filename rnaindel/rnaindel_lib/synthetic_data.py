@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""Synthetic RNA-Seq data for scaling benchmarks
+
+A reference genome, a data directory and a STAR-like BAM with planted
+indels are generated from a seed, without network access:
+
+    <dir>/ref.fa, ref.fa.fai           random genome (chr1, chr2, ...)
+    <dir>/sample.bam, sample.bam.bai   spliced reads over the coding exons
+    <dir>/candidates.vcf               planted indels
+    <dir>/data/refgene/refCodingExon.bed.gz(.tbi)
+    <dir>/data/dbsnp/dbsnp.indel.vcf.gz(.tbi)        every 3rd planted indel
+    <dir>/data/clinvar/clinvar.indel.vcf.gz(.tbi)    every 5th planted indel
+    <dir>/data/models/{mono,non_mono}.{0-19}.pkl.gz  small random forests fitted
+                                       to random data (for timing only)
+    <dir>/synthetic.json               parameters and files
+
+Genes of 3 to 5 coding exons are laid out along the chromosomes. Each
+gene carries a planted deletion and a planted insertion at an allele
+fraction from 0.02 to 1. Reads are sampled along the spliced transcripts
+at the given depth with MAPQ 255 (STAR unique mappers). A few reads are
+duplicates or multi-mappers. Reads are generated gene by gene in
+coordinate order, so the BAM is written sorted without a separate sort.
+
+'generate_synthetic_data' is the main routine of this module
+"""
+
+import os
+import gzip
+import json
+import pickle
+import random
+import logging
+import numpy as np
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "synthetic.json"
+
+SYNTHETIC_FORMAT_VERSION = 1
+
+READ_LENGTH = 76
+
+# bases before the first gene and between genes
+GENE_SPACING = 1000
+
+DUPLICATE_RATE = 0.02
+
+MULTI_MAPPER_RATE = 0.02
+
+DELETION_LENGTHS = [1, 1, 2, 3]
+
+INSERTION_LENGTHS = [1, 2, 3, 6]
+
+ALLELE_FRACTIONS = [0.02, 0.1, 0.3, 0.5, 1.0]
+
+# model inputs (see indel_classifier.calculate_proba)
+NUM_OF_MONO_FEATURES = 11
+NUM_OF_NON_MONO_FEATURES = 14
+
+def generate_synthetic_data(
+    out_dir, num_of_candidates=1000, depth=20, num_of_chromosomes=8, seed=1
+):
+    """Write a synthetic data set
+
+    Args:
+        out_dir (str): output directory (created if not exists)
+        num_of_candidates (int): planted indels
+        depth (int): mean read depth over the coding exons
+        num_of_chromosomes (int): 1 to 22
+        seed (int): seed of the random generators
+    Returns:
+        manifest (OrderedDict): as written to synthetic.json
+    """
+    import pysam
+
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+
+    num_of_genes = (num_of_candidates + 1) // 2
+    chroms = ["chr{}".format(i + 1) for i in range(num_of_chromosomes)]
+    genes, chrom_lens = layout_genes(rng, chroms, num_of_genes)
+    seqs = random_genome(np.random.RandomState(seed), chroms, chrom_lens)
+
+    write_fasta(os.path.join(out_dir, "ref.fa"), chroms, seqs)
+    pysam.faidx(os.path.join(out_dir, "ref.fa"))
+
+    data_dir = os.path.join(out_dir, "data")
+    write_refgene(data_dir, genes)
+
+    planted = []
+    for i, gene in enumerate(genes):
+        num_of_events = 1 if 2 * i + 1 == num_of_candidates else 2
+        gene["events"] = plant_indels(rng, gene, seqs[gene["chr"]], num_of_events)
+        planted.extend(event["vcf"] for event in gene["events"])
+
+    header = {
+        "HD": {"VN": "1.4", "SO": "coordinate"},
+        "SQ": [{"SN": chr, "LN": chrom_lens[chr]} for chr in chroms],
+        "RG": [{"ID": "rg1", "SM": "SYNTHETIC"}],
+        "PG": [{"ID": "rnaindel_synthetic", "PN": "rnaindel"}],
+    }
+    bam = os.path.join(out_dir, "sample.bam")
+    num_of_reads = 0
+    with pysam.AlignmentFile(bam, "wb", header=header) as bam_data:
+        for i, gene in enumerate(genes):
+            for read in gene_reads(rng, gene, seqs[gene["chr"]], depth, i, bam_data.header):
+                bam_data.write(read)
+                num_of_reads += 1
+    pysam.index(bam)
+
+    write_vcf(os.path.join(out_dir, "candidates.vcf"), planted, ".", ".")
+    write_snp_database(data_dir, "dbsnp", planted[::3], "CAF=0.9,0.1;COMMON=1")
+    write_snp_database(
+        data_dir,
+        "clinvar",
+        planted[1::5],
+        "CLNSIG=Pathogenic;CLNDN=Synthetic_disease;AF_EXAC=0.0001",
+    )
+    write_models(os.path.join(data_dir, "models"), np.random.RandomState(seed))
+
+    manifest = OrderedDict(
+        [
+            ("format_version", SYNTHETIC_FORMAT_VERSION),
+            ("seed", seed),
+            ("num_of_candidates", len(planted)),
+            ("depth", depth),
+            ("num_of_chromosomes", num_of_chromosomes),
+            ("num_of_genes", num_of_genes),
+            ("num_of_reads", num_of_reads),
+            ("read_length", READ_LENGTH),
+            ("fasta", "ref.fa"),
+            ("bam", "sample.bam"),
+            ("vcf", "candidates.vcf"),
+            ("data_dir", "data"),
+        ]
+    )
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+
+    logger.info(
+        "{} candidates and {} reads written to {}".format(
+            len(planted), num_of_reads, out_dir
+        )
+    )
+    return manifest
+
+
+def load_synthetic_data(in_dir):
+    """Manifest with the file paths joined to in_dir
+
+    Raises:
+        ValueError: if in_dir has no synthetic data set
+    """
+    path = os.path.join(in_dir, MANIFEST)
+    if not os.path.isfile(path):
+        raise ValueError("no synthetic data in {}".format(in_dir))
+
+    with open(path) as f:
+        manifest = json.load(f, object_pairs_hook=OrderedDict)
+
+    if manifest.get("format_version") != SYNTHETIC_FORMAT_VERSION:
+        raise ValueError("synthetic data in {} in an unsupported format".format(in_dir))
+
+    for key in ("fasta", "bam", "vcf", "data_dir"):
+        manifest[key] = os.path.join(in_dir, manifest[key])
+
+    return manifest
+
+
+def layout_genes(rng, chroms, num_of_genes):
+    """Genes with 3 to 5 exons, evenly spread over the chromosomes
+
+    Returns:
+        genes (list): dict with chr, strand and exons [(start, end), ...] (1-based)
+        chrom_lens (dict): {chr: length}
+    """
+    genes, chrom_lens = [], {}
+    per_chrom = -(-num_of_genes // len(chroms))
+    for c, chr in enumerate(chroms):
+        pos = GENE_SPACING
+        for g in range(c * per_chrom, min(num_of_genes, (c + 1) * per_chrom)):
+            exons = []
+            for e in range(rng.randint(3, 5)):
+                exon_len = rng.randint(90, 200)
+                exons.append((pos, pos + exon_len - 1))
+                pos += exon_len + rng.randint(100, 800)
+            genes.append(
+                {"chr": chr, "name": "GENE{}".format(g), "strand": "+-"[g % 2], "exons": exons}
+            )
+            pos += GENE_SPACING
+        chrom_lens[chr] = pos + GENE_SPACING
+
+    return genes, chrom_lens
+
+
+def random_genome(rs, chroms, chrom_lens):
+    bases = np.frombuffer(b"ACGT", dtype=np.uint8)
+    return {
+        chr: bases[rs.randint(0, 4, chrom_lens[chr])].tobytes().decode()
+        for chr in chroms
+    }
+
+
+def write_fasta(path, chroms, seqs):
+    with open(path, "w") as f:
+        for chr in chroms:
+            f.write(">{}\n".format(chr))
+            seq = seqs[chr]
+            for i in range(0, len(seq), 60):
+                f.write(seq[i : i + 60] + "\n")
+
+
+def write_refgene(data_dir, genes):
+    """refCodingExon.bed.gz: a record per exon of each gene"""
+    import pysam
+
+    refgene_dir = os.path.join(data_dir, "refgene")
+    os.makedirs(refgene_dir, exist_ok=True)
+
+    records = []
+    for i, gene in enumerate(genes):
+        exons = gene["exons"]
+        ordered = exons if gene["strand"] == "+" else exons[::-1]
+        cds_len = sum(end - start + 1 for start, end in exons)
+        cds_start = 1
+        for k, (start, end) in enumerate(ordered):
+            prev_exon = ordered[k - 1] if k > 0 else (-1, -1)
+            next_exon = ordered[k + 1] if k + 1 < len(ordered) else (-1, -1)
+            records.append(
+                (
+                    gene["chr"],
+                    start,
+                    end,
+                    "NM_{}|{}|{}|{}|{}|{}".format(
+                        100000 + i, gene["name"], k + 1, len(exons), cds_start, cds_len
+                    ),
+                    gene["strand"],
+                    "{}|{}".format(*prev_exon),
+                    "{}|{}".format(*next_exon),
+                )
+            )
+            cds_start += end - start + 1
+
+    records.sort(key=lambda r: (r[0], r[1]))
+    bed = os.path.join(refgene_dir, "refCodingExon.bed")
+    with open(bed, "w") as f:
+        for record in records:
+            f.write("\t".join(str(x) for x in record) + "\n")
+    pysam.tabix_compress(bed, bed + ".gz", force=True)
+    pysam.tabix_index(bed + ".gz", preset="bed", force=True)
+    os.remove(bed)
+
+
+def transcript_segments(gene):
+    """(transcript index, 1-based start, length) of each exon"""
+    segments, t = [], 0
+    for start, end in gene["exons"]:
+        segments.append((t, start, end - start + 1))
+        t += end - start + 1
+    return segments
+
+
+def transcript_positions(gene):
+    """1-based genomic position of each transcript base (in genomic order)"""
+    return [pos for start, end in gene["exons"] for pos in range(start, end + 1)]
+
+
+def plant_indels(rng, gene, seq, num_of_events):
+    """A deletion in the first half and an insertion in the second half
+
+    Returns:
+        events (list): dict with t (transcript index), type ('D' or 'I'),
+                       length, inserted seq, allele fraction and vcf
+                       (chr, pos, ref, alt)
+    """
+    positions = transcript_positions(gene)
+    half = len(positions) // 2
+    edges = [pos for exon in gene["exons"] for pos in exon]
+
+    events = []
+    for idl_type, lo, hi in (("D", 20, half - 10), ("I", half + 10, len(positions) - 30)):
+        if len(events) == num_of_events:
+            break
+        # away from the exon boundaries
+        t = rng.randint(lo, hi)
+        while any(abs(positions[t] - edge) < 6 for edge in edges):
+            t = rng.randint(lo, hi)
+
+        pos = positions[t]
+        if idl_type == "D":
+            length = rng.choice(DELETION_LENGTHS)
+            idl_seq = seq[pos - 1 : pos - 1 + length]
+        else:
+            length = rng.choice(INSERTION_LENGTHS)
+            idl_seq = "".join(rng.choice("ACGT") for i in range(length))
+
+        # VCF style with the preceding base
+        pre = seq[pos - 2]
+        ref, alt = (pre + idl_seq, pre) if idl_type == "D" else (pre, pre + idl_seq)
+        events.append(
+            {
+                "t": t,
+                "type": idl_type,
+                "length": length,
+                "seq": idl_seq,
+                "fraction": rng.choice(ALLELE_FRACTIONS),
+                "vcf": (gene["chr"], pos - 1, ref, alt),
+            }
+        )
+
+    return events
+
+
+def gene_reads(rng, gene, seq, depth, gene_idx, header):
+    """Reads sampled along the transcript, sorted by position"""
+    import pysam
+
+    positions = transcript_positions(gene)
+    segments = transcript_segments(gene)
+    tid = header.get_tid(gene["chr"])
+    num_of_reads = depth * len(positions) // READ_LENGTH
+    starts = sorted(
+        rng.randint(0, len(positions) - READ_LENGTH - 5) for i in range(num_of_reads)
+    )
+
+    for r, t0 in enumerate(starts):
+        event = None
+        for e in gene["events"]:
+            if t0 + 10 < e["t"] < t0 + READ_LENGTH - 15 and rng.random() < e["fraction"]:
+                event = e
+                break
+
+        read_seq, cigar = transcript_read(segments, seq, t0, event)
+
+        read = pysam.AlignedSegment(header)
+        read.query_name = "r{}_{}".format(gene_idx, r)
+        read.query_sequence = read_seq
+        read.reference_id = tid
+        read.reference_start = positions[t0] - 1
+        read.cigartuples = cigar
+        read.flag = 16 if rng.random() < 0.5 else 0
+        read.mapping_quality = 3 if rng.random() < MULTI_MAPPER_RATE else 255
+        if rng.random() < DUPLICATE_RATE:
+            read.is_duplicate = True
+        read.query_qualities = pysam.qualitystring_to_array("I" * len(read_seq))
+        read.set_tag("RG", "rg1")
+        read.set_tag("MD", md_tag(cigar, seq, read.reference_start))
+        yield read
+
+
+def transcript_read(segments, seq, t0, event):
+    """Read sequence and cigar tuples starting at transcript index t0
+
+    Args:
+        segments (list): (transcript index, 1-based start, length) of each exon
+        seq (str): chromosome sequence
+        t0 (int): transcript index of the first base
+        event (dict): planted indel within the read (None for a reference read)
+    Returns:
+        read_seq (str), cigar (list)
+    """
+    # transcript bases [t0, t1) covered by the read
+    t1 = t0 + READ_LENGTH
+    if event:
+        t1 += event["length"] if event["type"] == "D" else -event["length"]
+
+    cigar, read_seq = [], []
+
+    def match(pos, n):
+        if n > 0:
+            cigar.append((0, n))
+            read_seq.append(seq[pos - 1 : pos - 1 + n])
+
+    last_pos = None
+    for t_start, start, length in segments:
+        lt, rt = max(t0, t_start), min(t1, t_start + length)
+        if lt >= rt:
+            continue
+
+        pos = start + lt - t_start
+        if last_pos is not None:
+            cigar.append((3, pos - last_pos - 1))
+
+        if event and lt <= event["t"] < rt:
+            # planted indels are away from the exon boundaries
+            n = event["t"] - lt
+            match(pos, n)
+            if event["type"] == "I":
+                cigar.append((1, event["length"]))
+                read_seq.append(event["seq"])
+                match(pos + n, rt - event["t"])
+            else:
+                cigar.append((2, event["length"]))
+                match(pos + n + event["length"], rt - event["t"] - event["length"])
+        else:
+            match(pos, rt - lt)
+        last_pos = start + rt - t_start - 1
+
+    return "".join(read_seq), cigar
+
+
+def md_tag(cigar, seq, ref_start):
+    """MD tag of a read without mismatches"""
+    md, matched, pos = [], 0, ref_start
+    for op, n in cigar:
+        if op == 0:
+            matched += n
+            pos += n
+        elif op == 2:
+            md.append("{}^{}".format(matched, seq[pos : pos + n]))
+            matched = 0
+            pos += n
+        elif op == 3:
+            pos += n
+    md.append(str(matched))
+    return "".join(md)
+
+
+def write_vcf(path, records, id_prefix, info):
+    with open(path, "w") as f:
+        f.write("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        for i, (chr, pos, ref, alt) in enumerate(records):
+            record_id = "." if id_prefix == "." else "{}{}".format(id_prefix, i)
+            f.write(
+                "\t".join([chr, str(pos), record_id, ref, alt, ".", ".", info]) + "\n"
+            )
+
+
+def write_snp_database(data_dir, db, records, info):
+    """dbSNP or ClinVar VCF (chromosome names not "chr"-prefixed)"""
+    import pysam
+
+    db_dir = os.path.join(data_dir, db)
+    os.makedirs(db_dir, exist_ok=True)
+
+    vcf = os.path.join(db_dir, "{}.indel.vcf".format(db))
+    records = [(chr.replace("chr", ""), pos, ref, alt) for chr, pos, ref, alt in records]
+    write_vcf(vcf, records, "rs" if db == "dbsnp" else "cv", info)
+    pysam.tabix_compress(vcf, vcf + ".gz", force=True)
+    pysam.tabix_index(vcf + ".gz", preset="vcf", force=True)
+    os.remove(vcf)
+
+
+def write_models(model_dir, rs):
+    """Random forests fitted to random data in place of the trained models"""
+    from sklearn.ensemble import RandomForestClassifier
+
+    os.makedirs(model_dir, exist_ok=True)
+    for kind, num_of_features in (
+        ("mono", NUM_OF_MONO_FEATURES),
+        ("non_mono", NUM_OF_NON_MONO_FEATURES),
+    ):
+        for i in range(20):
+            X = rs.rand(60, num_of_features) * 10
+            y = rs.randint(0, 3, 60)
+            model = RandomForestClassifier(n_estimators=3, random_state=i).fit(X, y)
+            path = os.path.join(model_dir, "{}.{}.pkl.gz".format(kind, i))
+            with gzip.open(path, "wb") as f:
+                pickle.dump(model, f)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import AnnotationCache, cached_annotations, clear_annotation_memo
+except:
+    from ..rnaindel_lib import AnnotationCache, cached_annotations, clear_annotation_memo
+
+
+class TestAnnotationCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = AnnotationCache(os.path.join(self.tmp_dir, 'anno.db'), 200)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_get_many(self):
+        res = [('GENE1', 'NM_1', 10, 'frameshiftTruncating', 0)]
+        self.cache.put_many('fp1', {'chr1:100:1:A': res, 'chr1:200:0:T': []})
+        self.assertEqual(
+            self.cache.get_many('fp1', ['chr1:100:1:A', 'chr1:200:0:T', 'chr1:300:1:G']),
+            {'chr1:100:1:A': res, 'chr1:200:0:T': []},
+        )
+        self.assertEqual(self.cache.get_many('fp2', ['chr1:100:1:A']), {})
+
+    def test_evict(self):
+        res = [('GENE1', 'NM_1', 10, 'frameshiftTruncating', 0)]
+        self.cache.put_many('fp1', {'chr1:100:1:A': res})
+        self.cache.conn.execute('UPDATE annotation SET last_used = 0')
+        self.cache.put_many('fp1', {'chr1:{}:1:A'.format(i): res for i in range(1, 4)})
+        self.assertEqual(self.cache.get_many('fp1', ['chr1:100:1:A']), {})
+        self.assertEqual(len(self.cache.get_many('fp1', ['chr1:1:1:A', 'chr1:2:1:A'])), 2)
+
+    def test_evict_within_run(self):
+        # stored and hit in the same second: only the least recently used goes
+        res = [('GENE1', 'NM_1', 10, 'frameshiftTruncating', 0)]
+        self.cache.put_many('fp1', {'chr1:{}:1:A'.format(i): res for i in range(1, 4)})
+        self.cache.get_many('fp1', ['chr1:1:1:A'])
+        self.cache.put_many('fp1', {'chr1:4:1:A': res})
+
+        keys = ['chr1:{}:1:A'.format(i) for i in range(1, 5)]
+        self.assertEqual(
+            sorted(self.cache.get_many('fp1', keys)), ['chr1:1:1:A', 'chr1:3:1:A', 'chr1:4:1:A']
+        )
+
+
+class TestAnnotationMemo(TestCase):
+
+    def test_cached_annotations(self):
+        clear_annotation_memo()
+        called = []
+
+        def annotate(key):
+            called.append(key)
+            return [('GENE1', 'NM_1', key[1], 'inframeIns', 1)]
+
+        keys = [('chr1', 100, 1, 'AAA'), ('chr1', 200, 1, 'AAA'), ('chr1', 100, 1, 'AAA')]
+        res = cached_annotations(keys, annotate, 'refgene', 'fasta', True)
+        self.assertEqual([r[0][2] for r in res], [100, 200, 100])
+        self.assertEqual(len(called), 2)
+
+        # the postprocessor after left-alignment
+        keys = [('chr1', 99, 1, 'AAA'), ('chr1', 200, 1, 'AAA')]
+        cached_annotations(keys, annotate, 'refgene', 'fasta', True)
+        self.assertEqual(called[2:], [('chr1', 99, 1, 'AAA')])
+        clear_annotation_memo()
+
+if __name__ == '__main__':
+    from unittest import main
+    main()
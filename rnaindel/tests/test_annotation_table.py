@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+import re
+import numpy as np
+import pandas as pd
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import (
+        most_common, anno_features, len_loc, indels_per_gene, format_annotation,
+        gene_symbols
+    )
+except:
+    from ..rnaindel_lib import (
+        most_common, anno_features, len_loc, indels_per_gene, format_annotation,
+        gene_symbols
+    )
+
+MEDIAN_CDS_LEN = 1323
+
+
+# per-row versions on the annotation strings (before the annotation table)
+def row_anno_features(annotation):
+    lst = annotation.split(",")
+    truncates = [int("Truncating" in anno) for anno in lst]
+    insensitivities = [int(anno.split("|")[-1]) for anno in lst]
+    return (
+        int(any("inframe" in anno for anno in lst)),
+        most_common(truncates),
+        int(any("splice" in anno for anno in lst)),
+        most_common(insensitivities),
+    )
+
+
+def row_len_loc(annotation, d):
+    lengths, locations = [], []
+    for token in annotation.split(","):
+        info = token.split("|")
+        cds_len = d.get(info[1], MEDIAN_CDS_LEN)
+        lengths.append(cds_len)
+        locations.append(int(info[2]) * 3 / cds_len)
+    return np.median(lengths), np.median(locations)
+
+
+def row_indels_per_gene(df, d):
+    num_of_indels = len(df["equivalence_id"].unique())
+    try:
+        acc_lst = re.findall(r"NM_[0-9]+", ",".join(df["annotation"].values))
+        return np.median([num_of_indels * 1000 / d[acc] for acc in acc_lst])
+    except KeyError:
+        return num_of_indels / MEDIAN_CDS_LEN
+
+
+class TestAnnotationTable(TestCase):
+
+    def setUp(self):
+        self.anno = pd.DataFrame.from_records(
+            [
+                # tie in the isoform majority: 0
+                (0, 'GENE1', 'NM_1', 10, 'frameshiftTruncating', 1),
+                (0, 'GENE1', 'NM_2', 12, 'inframeDel', 0),
+                (1, 'GENE1', 'NM_1', 20, 'nonsenseTruncating', 1),
+                (1, 'GENE1', 'NM_2', 22, 'spliceRegion', 1),
+                (1, 'GENE1', 'NM_3', 24, 'spliceTruncating', 0),
+                # accession missing from acc_len
+                (2, 'GENE2', 'NM_9', 30, 'inframeIns', 0),
+                (3, 'GENE3', 'NM_4', 40, 'frameshiftTruncating', 1),
+                (3, 'GENE4', 'NM_5', 50, 'frameshiftTruncating', 1),
+            ],
+            columns=['indel_id', 'gene', 'accession', 'codon_pos', 'effect', 'nmd'],
+        )
+        self.acc_len = {'NM_1': 900, 'NM_2': 1200, 'NM_3': 300, 'NM_4': 600, 'NM_5': 3000}
+
+        self.annotation = {
+            i: ','.join('|'.join(str(v) for v in row[1:]) for row in g.itertuples(index=False))
+            for i, g in self.anno.groupby('indel_id')
+        }
+
+    def test_format_annotation(self):
+        self.assertEqual(format_annotation(self.anno).to_dict(), self.annotation)
+
+        # not evaluated after left-alignment
+        anno = self.anno.assign(nmd=-1)
+        self.assertEqual(format_annotation(anno)[2], 'GENE2|NM_9|30|inframeIns')
+
+    def test_anno_features(self):
+        features = anno_features(self.anno)
+        columns = ['is_inframe', 'is_truncating', 'is_splice', 'is_nmd_insensitive']
+        for i, annotation in self.annotation.items():
+            self.assertEqual(
+                tuple(features.loc[i, columns]),
+                row_anno_features(annotation),
+            )
+        self.assertEqual(features.loc[0, 'is_truncating'], 0)
+        self.assertEqual(features.loc[0, 'is_nmd_insensitive'], 0)
+
+    def test_len_loc(self):
+        ll = len_loc(self.anno, self.acc_len)
+        for i, annotation in self.annotation.items():
+            cds_length, indel_location = row_len_loc(annotation, self.acc_len)
+            self.assertAlmostEqual(ll.loc[i, 'cds_length'], cds_length)
+            self.assertAlmostEqual(ll.loc[i, 'indel_location'], indel_location)
+        self.assertEqual(ll.loc[2, 'cds_length'], MEDIAN_CDS_LEN)
+
+    def test_indels_per_gene(self):
+        genes = gene_symbols(self.anno)
+        self.assertEqual(genes[3], 'GENE3,GENE4')
+
+        df = pd.DataFrame(
+            {'indel_id': [0, 1, 2, 3], 'gene_symbol': genes.values, 'equivalence_id': [0, 1, 2, 3]}
+        )
+        df['annotation'] = df['indel_id'].map(self.annotation)
+        ipg = indels_per_gene(df, self.anno, self.acc_len)
+        for gene, g in df.groupby('gene_symbol'):
+            self.assertAlmostEqual(ipg[gene], row_indels_per_gene(g, self.acc_len))
+        self.assertAlmostEqual(ipg['GENE2'], 1 / MEDIAN_CDS_LEN)
+
+        # equivalent indels are counted once
+        df['equivalence_id'] = [0, 0, 2, 3]
+        ipg = indels_per_gene(df, self.anno, self.acc_len)
+        self.assertAlmostEqual(ipg['GENE1'], row_indels_per_gene(df[:2], self.acc_len))
+        self.assertAlmostEqual(ipg['GENE1'], 1000 / 900)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+try:
+    from rnaindel.bambino_lib import run_with_pipe, parallel_jvms, split_heap_memory
+except:
+    from ..bambino_lib import run_with_pipe, parallel_jvms, split_heap_memory
+
+
+class TestRunWithPipe(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.pipe = os.path.join(self.tmp_dir, 'bambino.0')
+        os.mkfifo(self.pipe)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_output_read(self):
+        cmd_str = "sh -c 'printf \"a\\nb\\n\" > {}'".format(self.pipe)
+        stderr, return_code, result = run_with_pipe(cmd_str, self.pipe, list)
+        self.assertEqual(return_code, 0)
+        self.assertEqual(result, ['a\n', 'b\n'])
+
+    def test_exit_without_opening_pipe(self):
+        stderr, return_code, result = run_with_pipe("sh -c 'exit 1'", self.pipe, list)
+        self.assertEqual(return_code, 1)
+        self.assertEqual(result, [])
+
+
+class TestHeapMemory(TestCase):
+
+    def test_parallel_jvms(self):
+        self.assertEqual(parallel_jvms('6000m', 4), 4)
+        self.assertEqual(parallel_jvms('6000m', 16), 6)
+        self.assertEqual(parallel_jvms('6g', 16), 6)
+        self.assertEqual(parallel_jvms('500m', 4), 1)
+
+    def test_split_within_heap(self):
+        num_of_jvms = parallel_jvms('6000m', 16)
+        self.assertEqual(split_heap_memory('6000m', num_of_jvms), '1000m')
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel import read_manifest, get_args, run
+    from rnaindel.rnaindel_lib import model_paths, write_synthetic_pileup
+    from rnaindel.rnaindel_lib import annotation_cache, call_cache, checkpoint
+except:
+    from ..rnaindel import read_manifest, get_args, run
+    from ..rnaindel_lib import model_paths, write_synthetic_pileup
+    from ..rnaindel_lib import annotation_cache, call_cache, checkpoint
+
+
+class TestBatch(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.bam = os.path.join(self.dir, 'a.bam')
+        self.vcf = os.path.join(self.dir, 'a.vcf')
+        for path in (self.bam, self.vcf):
+            open(path, 'w').close()
+
+    def write(self, text):
+        manifest = os.path.join(self.dir, 'manifest.tsv')
+        with open(manifest, 'w') as f:
+            f.write(text)
+        return manifest
+
+    def test_read_manifest(self):
+        manifest = self.write(
+            '# bam\tvcf\toutput\n'
+            '{0}\t{1}\tout1.vcf\n'
+            '\n'
+            '{0}\t-\tout2.vcf\n'
+            '{0}\t\tout3.vcf\n'.format(self.bam, self.vcf)
+        )
+        self.assertEqual(
+            read_manifest(manifest),
+            [(self.bam, self.vcf, 'out1.vcf'), (self.bam, None, 'out2.vcf'), (self.bam, None, 'out3.vcf')],
+        )
+
+    def test_malformed_line(self):
+        manifest = self.write('{}\tout.vcf\n'.format(self.bam))
+        with self.assertRaises(SystemExit):
+            read_manifest(manifest)
+
+    def test_missing_bam(self):
+        manifest = self.write('{}\t-\tout.vcf\n'.format(os.path.join(self.dir, 'b.bam')))
+        with self.assertRaises(SystemExit):
+            read_manifest(manifest)
+
+    def test_model_paths(self):
+        paths = model_paths('models', 'mono')
+        self.assertEqual(len(paths), 20)
+        self.assertEqual(paths[0], 'models/mono.0.pkl.gz')
+
+
+class TestRun(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_closed_on_failure(self):
+        fasta, bam, pos, del_seq = write_synthetic_pileup(self.tmp_dir)
+        path = lambda name: os.path.join(self.tmp_dir, name)
+        args = get_args([
+            '-b', bam, '-f', fasta, '-d', self.tmp_dir, '-o', path('out.vcf'),
+            '--caller', 'pysam', '--annotation-cache', path('annotation.sqlite'),
+            '--call-cache', path('calls'), '--checkpoint-dir', path('checkpoints'),
+        ])
+        # no refgene in the data directory
+        with self.assertRaises(FileNotFoundError):
+            run(args)
+
+        self.assertIsNone(annotation_cache._annotation_cache)
+        self.assertIsNone(call_cache._call_cache)
+        self.assertIsNone(checkpoint._checkpoints)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import tempfile
+import pandas as pd
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import BambinoIndels, CallCache
+except:
+    from ..rnaindel_lib import BambinoIndels, CallCache
+
+
+class TestCallCache(TestCase):
+
+    def setUp(self):
+        self.cache_dir = os.path.join(tempfile.mkdtemp(), 'calls')
+        self.cache = CallCache(self.cache_dir, 10 ** 6)
+        df = pd.DataFrame({'chr': ['chr1', 'chr1'], 'pos': [100, 200], 'ref': ['-', 'T'], 'alt': ['A', '-']})
+        self.shards = [('chr1', BambinoIndels(df, 5, 2)), ('chr2', BambinoIndels(df[:0], 1, 0))]
+
+    def test_get(self):
+        self.assertIsNone(self.cache.get('key1'))
+        self.cache.put('key1', ['chr1', 'chr2'], self.shards, {'caller': 'pysam'})
+
+        chrs, shards = self.cache.get('key1')
+        self.assertEqual(chrs, ['chr1', 'chr2'])
+        self.assertEqual([chr for chr, shard in shards], ['chr1', 'chr2'])
+        self.assertEqual(shards[0][1].num_of_calls, 5)
+        self.assertTrue(shards[0][1].df.equals(self.shards[0][1].df))
+        self.assertTrue(os.path.isfile(os.path.join(self.cache_dir, 'key1', 'provenance.json')))
+        self.assertEqual([name for name in os.listdir(self.cache_dir) if name.startswith('.tmp-')], [])
+
+    def test_evict(self):
+        self.cache.put('key1', ['chr1'], self.shards[:1], {})
+        self.cache.put('key2', ['chr1'], self.shards[:1], {})
+        past = time.time() - 3600
+        os.utime(os.path.join(self.cache_dir, 'key1'), (past, past))
+        os.utime(os.path.join(self.cache_dir, 'key2'), (past + 1, past + 1))
+
+        # room for two entries: key1 is the least recently used after key2 is read
+        two_entries = sum(size for last_used, size, key in self.cache.entries())
+        self.cache.max_size = int(two_entries / 0.9) + 100
+        self.cache.get('key2')
+        self.cache.put('key3', ['chr1'], self.shards[:1], {})
+        self.assertEqual(sorted(key for last_used, size, key in self.cache.entries()), ['key2', 'key3'])
+
+if __name__ == '__main__':
+    from unittest import main
+    main()
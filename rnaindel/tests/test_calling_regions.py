@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import CodingExonIndex, coding_regions, parse_exon_line, to_exon_array
+except:
+    from ..rnaindel_lib import CodingExonIndex, coding_regions, parse_exon_line, to_exon_array
+
+
+class TestCodingRegions(TestCase):
+
+    def setUp(self):
+        lines = [
+            'chr1\t100\t200\tNM_1|GENE1|1|3|1|900\t+\t-1|-1\t300|400\n',
+            'chr1\t100\t150\tNM_2|GENE1|1|2|1|600\t+\t-1|-1\t300|400\n',
+            'chr1\t300\t400\tNM_1|GENE1|2|3|102|900\t+\t100|200\t500|600\n',
+            'chr1\t1000\t1100\tNM_1|GENE1|3|3|202|900\t+\t300|400\t-1|-1\n',
+            'chr2\t10\t1100\tNM_3|GENE2|4|4|301|402\t-\t1200|1300\t-1|-1\n',
+        ]
+        self.idx = CodingExonIndex(to_exon_array([parse_exon_line(line) for line in lines]))
+
+    def test_coding_regions(self):
+        self.assertEqual(
+            coding_regions(self.idx, ('chr2', 'chr1', 'chrM'), 50),
+            [('chr2', 0, 1150), ('chr1', 50, 450), ('chr1', 950, 1150)],
+        )
+        # non-prefixed names in BAM
+        self.assertEqual(
+            coding_regions(self.idx, ('1',), 0), [('1', 100, 200), ('1', 300, 400), ('1', 1000, 1100)]
+        )
+
+if __name__ == '__main__':
+    from unittest import main
+    main()
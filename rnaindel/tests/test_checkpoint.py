@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import pandas as pd
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import Checkpoints
+except:
+    from ..rnaindel_lib import Checkpoints
+
+
+class TestCheckpoints(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.tmp_dir, 'input.txt')
+        with open(self.input_file, 'w') as f:
+            f.write('data\n')
+        self.df = pd.DataFrame({'chr': ['chr1', 'chr2'], 'pos': [100, 200], 'prob': [0.1, 0.9]}, index=[3, 7])
+        self.called = []
+
+    def stage(self):
+        self.called.append(1)
+        return self.df, True
+
+    def run_stage(self, resume):
+        checkpoints = Checkpoints(os.path.join(self.tmp_dir, 'ckpt'), resume=resume)
+        return checkpoints.run('stage1', [self.input_file, 255], self.stage)
+
+    def test_resume(self):
+        self.run_stage(False)
+        df, flag = self.run_stage(True)
+        self.assertEqual(len(self.called), 1)
+        self.assertTrue(flag)
+        pd.testing.assert_frame_equal(df, self.df, check_index_type=False)
+
+    def test_input_updated(self):
+        self.run_stage(False)
+        os.utime(self.input_file, (0, 0))
+        self.run_stage(True)
+        self.assertEqual(len(self.called), 2)
+
+    def test_not_resumed(self):
+        self.run_stage(False)
+        self.run_stage(False)
+        self.assertEqual(len(self.called), 2)
+
+    def test_objects(self):
+        # columns of python objects
+        self.df['obj'] = [object(), object()]
+        self.run_stage(False)
+        df, flag = self.run_stage(True)
+        self.assertEqual(len(self.called), 1)
+        self.assertEqual(list(df.index), [3, 7])
+
+if __name__ == '__main__':
+    from unittest import main
+    main()
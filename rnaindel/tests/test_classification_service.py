@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import time
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import http.client
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import (
+        parse_region, parse_candidates, percentile, generate_synthetic_data,
+        ClassificationService, serve_requests, open_process_profile,
+        close_process_profile
+    )
+except:
+    from ..rnaindel_lib import (
+        parse_region, parse_candidates, percentile, generate_synthetic_data,
+        ClassificationService, serve_requests, open_process_profile,
+        close_process_profile
+    )
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path):
+        http.client.HTTPConnection.__init__(self, 'localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX)
+        self.sock.connect(self.socket_path)
+
+
+class TestClassificationService(TestCase):
+
+    def test_parse_region(self):
+        self.assertEqual(parse_region('chr1:1,001-2000'), ('chr1', 1000, 2000))
+        self.assertEqual(parse_region('X:5-5'), ('X', 4, 5))
+        for region in ('chr1', 'chr1:200-100', 'chr1:0-10', 12):
+            with self.assertRaises(ValueError):
+                parse_region(region)
+
+    def test_parse_candidates(self):
+        lines = parse_candidates([{'chr': 'chr1', 'pos': 100, 'ref': 'A', 'alt': 'AT'}])
+        self.assertEqual(lines, ['chr1\t100\t.\tA\tAT\n'])
+
+        for indels in ([], [{'chr': 'chr1', 'pos': 100, 'ref': 'A'}],
+                       [{'chr': 'chr1', 'pos': '100', 'ref': 'A', 'alt': 'AT'}],
+                       [{'chr': 'chr1', 'pos': 100, 'ref': 'A', 'alt': '<DEL>'}]):
+            with self.assertRaises(ValueError):
+                parse_candidates(indels)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile([7], 95), 7)
+
+
+class TestServeRequests(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        generate_synthetic_data(self.tmp_dir, 4, depth=10, num_of_chromosomes=1, seed=3)
+        with open(os.path.join(self.tmp_dir, 'candidates.vcf')) as f:
+            records = [line.split('\t') for line in f if not line.startswith('#')]
+        self.indels = [
+            {'chr': r[0], 'pos': int(r[1]), 'ref': r[3], 'alt': r[4]} for r in records
+        ]
+        self.socket_path = os.path.join(self.tmp_dir, 'service.sock')
+        self.sigterm = signal.getsignal(signal.SIGTERM)
+
+    def tearDown(self):
+        signal.signal(signal.SIGTERM, self.sigterm)
+        close_process_profile()
+        shutil.rmtree(self.tmp_dir)
+
+    def request(self, method, path, body=None):
+        conn = UnixHTTPConnection(self.socket_path)
+        conn.request(method, path, json.dumps(body) if body is not None else None)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read().decode())
+
+    def client(self, responses):
+        while not os.path.exists(self.socket_path):
+            time.sleep(0.05)
+        try:
+            request = {
+                'bam': os.path.join(self.tmp_dir, 'sample.bam'), 'indels': self.indels
+            }
+            responses.append(self.request('POST', '/classify', request))
+            responses.append(self.request('GET', '/stats'))
+        finally:
+            # stops the service as on 'kill'
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    def test_classify_and_stats(self):
+        cprofile = os.path.join(self.tmp_dir, 'cprofile')
+        open_process_profile(cprofile)
+        service = ClassificationService(
+            os.path.join(self.tmp_dir, 'ref.fa'),
+            os.path.join(self.tmp_dir, 'data'),
+            num_of_processes=2,
+        )
+
+        responses = []
+        client = threading.Thread(target=self.client, args=(responses,))
+        client.start()
+        serve_requests(service, socket_path=self.socket_path)
+        client.join()
+        close_process_profile()
+
+        (status, classified), (stats_status, stats) = responses
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [(indel['chr'], indel['pos']) for indel in classified['indels']],
+            [(indel['chr'], indel['pos']) for indel in self.indels],
+        )
+        # filtered indels are not classified
+        predicted = [
+            indel['predicted_class'] for indel in classified['indels'] if indel['prob']
+        ]
+        self.assertTrue(predicted)
+        for predicted_class in predicted:
+            self.assertIn(predicted_class, ('somatic', 'germline', 'artifact'))
+        self.assertIn('features', classified['latency_ms']['stages'])
+
+        self.assertEqual(stats_status, 200)
+        self.assertEqual((stats['requests'], stats['errors']), (1, 0))
+        self.assertEqual(stats['indels'], len(self.indels))
+        self.assertEqual(stats['latency_ms']['last'], classified['latency_ms']['total'])
+
+        self.assertFalse(os.path.exists(self.socket_path))
+        # the workers of the service are profiled
+        workers = [f for f in os.listdir(cprofile) if f.startswith('worker.')]
+        self.assertEqual(len(workers), 2)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import CodingExonIndex, parse_exon_line, to_exon_array
+except:
+    from ..rnaindel_lib import CodingExonIndex, parse_exon_line, to_exon_array
+
+
+class TestCodingExonIndex(TestCase):
+
+    def setUp(self):
+        lines = [
+            'chr1\t100\t200\tNM_1|GENE1|1|3|1|900\t+\t-1|-1\t300|400\n',
+            'chr1\t100\t150\tNM_2|GENE1|1|2|1|600\t+\t-1|-1\t300|400\n',
+            'chr1\t300\t400\tNM_1|GENE1|2|3|102|900\t+\t100|200\t500|600\n',
+            'chr2\t1000\t1100\tNM_3|GENE2|4|4|301|402\t-\t1200|1300\t-1|-1\n',
+        ]
+        self.idx = CodingExonIndex(to_exon_array([parse_exon_line(line) for line in lines]))
+
+    def test_parse_exon_line(self):
+        rec = parse_exon_line('chr2\t1000\t1100\tNM_3|GENE2|4|4|301|402\t-\t1200|1300\t-1|-1\n')
+        self.assertEqual(rec.accession, 'NM_3')
+        self.assertEqual(rec.gene_symbol, 'GENE2')
+        self.assertEqual((rec.exon, rec.last_exon, rec.cds_start, rec.cds_len), (4, 4, 301, 402))
+        self.assertEqual((rec.prev_exon_start, rec.prev_exon_end), (1200, 1300))
+        self.assertEqual((rec.next_exon_start, rec.next_exon_end), (-1, -1))
+
+    def test_fetch(self):
+        # tabix convention: [start, end) overlaps if start < exon_end and end > exon_start
+        self.assertEqual([r.accession for r in self.idx.fetch('chr1', 140, 160)], ['NM_1', 'NM_2'])
+        self.assertEqual([r.accession for r in self.idx.fetch('chr1', 150, 160)], ['NM_1'])
+        self.assertEqual(self.idx.fetch('chr1', 200, 300), [])
+        self.assertEqual([r.exon for r in self.idx.fetch('chr1', 199, 301)], [1, 2])
+        self.assertEqual(self.idx.fetch('chrX', 0, 1000000), [])
+
+    def test_acc_len(self):
+        self.assertEqual(self.idx.acc_len(), {'NM_1': 900, 'NM_2': 600, 'NM_3': 402})
+
+    def test_has_overlap(self):
+        res = self.idx.has_overlap(
+            ['chr1', 'chr1', 'chr1', 'chr2', 'chrX'],
+            [140, 200, 399, 990, 100],
+            [160, 300, 420, 1000, 200],
+        )
+        self.assertEqual(list(res), [True, False, True, False, False])
+
+if __name__ == '__main__':
+    from unittest import main
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+import os
+import gzip
+import shutil
+import tempfile
+from unittest import TestCase
+
+try:
+    from rnaindel.version import __version__
+    from rnaindel.rnaindel_lib import (
+        StringColumn, pack_strings, generate_synthetic_data, write_snp_database,
+        compile_data_bundle,
+        load_data_bundle, unload_data_bundle, CodingExonIndex, ArraySnpDatabase,
+        TabixSnpDatabase
+    )
+except:
+    from ..version import __version__
+    from ..rnaindel_lib import (
+        StringColumn, pack_strings, generate_synthetic_data, write_snp_database,
+        compile_data_bundle,
+        load_data_bundle, unload_data_bundle, CodingExonIndex, ArraySnpDatabase,
+        TabixSnpDatabase
+    )
+
+
+class TestStringColumn(TestCase):
+
+    def test_pack_strings(self):
+        strings = ['rs1', '', 'rs22;rs333', 'CLNSIG=Pathogenic']
+        col = StringColumn(*pack_strings(strings))
+        self.assertEqual(len(col), 4)
+        self.assertEqual([col[i] for i in range(len(col))], strings)
+
+
+def add_long_deletion(data_dir, db):
+    """A 2-kb deletion spanning the first records of the database"""
+    path = os.path.join(data_dir, db, db + '.indel.vcf.gz')
+    with gzip.open(path, 'rt') as f:
+        lines = [line.split('\t') for line in f if not line.startswith('#')]
+    records = [(l[0], int(l[1]), l[3], l[4]) for l in lines]
+    chr, pos, ref, alt = records[0]
+    records.insert(0, (chr, max(pos - 100, 1), 'A' * 2000, 'A'))
+    write_snp_database(data_dir, db, records, lines[0][7].rstrip('\n'))
+
+
+class TestDataBundle(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        generate_synthetic_data(cls.tmp_dir, 40, depth=2, num_of_chromosomes=2, seed=5)
+        cls.data_dir = os.path.join(cls.tmp_dir, 'data')
+        add_long_deletion(cls.data_dir, 'clinvar')
+        compile_data_bundle(cls.data_dir, __version__)
+        cls.refgene = os.path.join(cls.data_dir, 'refgene', 'refCodingExon.bed.gz')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def setUp(self):
+        self.bundle = load_data_bundle(self.data_dir, __version__)
+        self.assertIsNotNone(self.bundle)
+
+    def tearDown(self):
+        unload_data_bundle()
+
+    def test_exons(self):
+        parsed = CodingExonIndex.from_bed(self.refgene)
+        self.assertEqual(self.bundle.exons().tolist(), parsed.exons.tolist())
+        self.assertEqual(self.bundle.acc_len(), parsed.acc_len())
+
+    def test_snp_tables(self):
+        for db in ('dbsnp', 'clinvar'):
+            path = os.path.join(self.data_dir, db, db + '.indel.vcf.gz')
+            with gzip.open(path, 'rt') as f:
+                records = [line.split('\t') for line in f if not line.startswith('#')]
+            self.assertTrue(records)
+
+            tabix = TabixSnpDatabase(path, db)
+            arrays = ArraySnpDatabase(self.bundle.snp_table(db))
+            regions = [('chr9', 0, 1000), ('chr1', 0, 1)]
+            for record in records:
+                start = int(record[1]) - 1
+                regions.extend(
+                    [
+                        (record[0], start, start + 1),
+                        (record[0], start + len(record[3]) - 1, start + len(record[3])),
+                        (record[0], start - 500, start + 500),
+                    ]
+                )
+            for chr, start, end in regions:
+                self.assertEqual(
+                    arrays.fetch(chr, start, end),
+                    tabix.fetch(chr, start, end) if chr in tabix.tabix.contigs else [],
+                )
+
+if __name__ == '__main__':
+    from unittest import main
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import pandas as pd
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import export_features, load_features
+except:
+    from ..rnaindel_lib import export_features, load_features
+
+
+class TestFeatureTable(TestCase):
+
+    def setUp(self):
+        self.out_dir = os.path.join(tempfile.mkdtemp(), 'features')
+        self.df = pd.DataFrame(
+            {'chr': ['chr1', 'chr2'], 'pos': [100, 200], 'indel_id': [0, 3], 'ipg': [0.5, 1.0]},
+            index=[0, 3],
+        )
+        self.df_filtered = pd.DataFrame({'chr': ['chr1'], 'pos': [150], 'filtered': ['lt_3_reads']})
+        self.anno = pd.DataFrame(
+            {'indel_id': [0, 3], 'gene': ['GENE1', 'GENE2'], 'accession': ['NM_1', 'NM_2'],
+             'codon_pos': [10, 20], 'effect': ['frameshiftTruncating', 'inframeIns'], 'nmd': [0, 1]}
+        )
+
+    def test_load_features(self):
+        export_features(self.out_dir, self.df, self.df_filtered, self.anno, True, 'a.bam', 'ref.fa', '1.0')
+        df, df_filtered, anno, manifest = load_features(self.out_dir, '1.0')
+
+        pd.testing.assert_frame_equal(df, self.df, check_index_type=False)
+        pd.testing.assert_frame_equal(df_filtered, self.df_filtered, check_index_type=False)
+        pd.testing.assert_frame_equal(anno, self.anno, check_index_type=False)
+        self.assertTrue(manifest['chr_prefixed'])
+        self.assertEqual(manifest['bam'], os.path.abspath('a.bam'))
+
+    def test_no_export(self):
+        with self.assertRaises(ValueError):
+            load_features(tempfile.mkdtemp(), '1.0')
+
+if __name__ == '__main__':
+    from unittest import main
+    main()
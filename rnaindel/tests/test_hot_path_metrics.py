@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import pysam
+import shutil
+import tempfile
+import multiprocessing
+from functools import partial
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import (
+        open_metrics, close_metrics, write_metrics, write_synthetic_pileup,
+        curate_indel_in_genome, curate_indel_in_pileup
+    )
+    from rnaindel.rnaindel_lib.indel_rescuer import extract_indel
+except:
+    from ..rnaindel_lib import (
+        open_metrics, close_metrics, write_metrics, write_synthetic_pileup,
+        curate_indel_in_genome, curate_indel_in_pileup
+    )
+    from ..rnaindel_lib.indel_rescuer import extract_indel
+
+
+class TestHotPathMetrics(TestCase):
+
+    def setUp(self):
+        # 200 reads, every other one with a 2-nt deletion
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fasta, self.bam, self.pos, self.del_seq = write_synthetic_pileup(
+            self.tmp_dir
+        )
+        self.bam_data = pysam.AlignmentFile(self.bam)
+
+    def tearDown(self):
+        close_metrics()
+        self.bam_data.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def curate(self, max_depth=None):
+        curate_indel_in_genome(self.fasta, 'chr1', self.pos, 0, self.del_seq, True)
+        curate_indel_in_pileup(
+            self.bam_data, 'chr1', self.pos, 0, self.del_seq, 60, True, max_depth
+        )
+
+    def test_pileup_counts(self):
+        metrics = open_metrics()
+        self.curate()
+
+        counts = metrics.counts()
+        self.assertEqual(counts['bam_fetches'], 1)
+        self.assertEqual(counts['reads_scanned'], 200)
+        self.assertEqual(counts['fasta_fetches'], 2)
+        self.assertEqual(counts['reads_sampled_out'], 0)
+
+        # 100 reads without the deletion sampled down to 5
+        self.curate(max_depth=5)
+        counts = metrics.counts()
+        self.assertEqual(counts['bam_fetches'], 2)
+        self.assertEqual(counts['reads_sampled_out'], 95)
+
+    def test_counts_from_forked_workers(self):
+        metrics = open_metrics()
+
+        rescue = partial(
+            extract_indel, fasta=self.fasta, bam=self.bam, chr='chr1', idl_type=0,
+            chr_prefixed=True
+        )
+        pool = multiprocessing.get_context('fork').Pool(2)
+        try:
+            found = pool.map(rescue, [self.pos] * 3)
+        finally:
+            pool.close()
+            pool.join()
+
+        self.assertEqual([idl.idl_seq for idl in found], [self.del_seq] * 3)
+        counts = metrics.counts()
+        self.assertEqual(counts['bam_fetches'], 3)
+        self.assertEqual(counts['reads_scanned'], 600)
+        self.assertEqual(counts['fasta_fetches'], 6)
+
+    def test_formats(self):
+        open_metrics()
+        self.curate()
+
+        path = os.path.join(self.tmp_dir, 'metrics.json')
+        write_metrics(path)
+        with open(path) as f:
+            self.assertEqual(json.load(f)['reads_scanned'], 200)
+
+        path = os.path.join(self.tmp_dir, 'rnaindel.prom')
+        write_metrics(path)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertIn('# TYPE rnaindel_bam_fetches_total counter', lines)
+        self.assertIn('rnaindel_bam_fetches_total 1', lines)
+        self.assertIn('rnaindel_pons_queries_total 0', lines)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import pysam
+import shutil
+import tempfile
+import multiprocessing
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import indel_events, call_indels, write_synthetic_pileup
+except:
+    from ..rnaindel_lib import indel_events, call_indels, write_synthetic_pileup
+
+
+class TestIndelEvents(TestCase):
+
+    def make_read(self, cigar, seq, quals):
+        header = pysam.AlignmentHeader.from_dict({'SQ': [{'SN': 'chr1', 'LN': 10000}]})
+        read = pysam.AlignedSegment(header)
+        read.reference_id = 0
+        read.reference_start = 99
+        read.cigarstring = cigar
+        read.query_sequence = seq
+        read.query_qualities = pysam.qualitystring_to_array(quals)
+        return read
+
+    def test_indel_events(self):
+        # insertion of 'GG' before the 5th base (1-based 104), deletion of 2 nt at 106
+        read = self.make_read('4M2I2M2D4M', 'ACGTGGACACGT', 'IIIIIIIIIIII')
+        self.assertEqual(indel_events(read), [(104, 1, 'GG'), (106, 0, 2)])
+
+    def test_low_quality_flanking(self):
+        read = self.make_read('4M2I2M2D4M', 'ACGTGGACACGT', 'III#IIIIIIII')
+        self.assertEqual(indel_events(read), [(106, 0, 2)])
+
+    def test_not_flanked_by_aligned_bases(self):
+        read = self.make_read('2S2I4M1000N4M', 'ACGTACGTACGT', 'IIIIIIIIIIII')
+        self.assertEqual(indel_events(read), [])
+
+
+class TestCallIndels(TestCase):
+
+    def setUp(self):
+        # 200 reads, every other one with a 2-nt deletion
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fasta, self.bam, self.pos, self.del_seq = write_synthetic_pileup(
+            self.tmp_dir
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_calls(self):
+        calls = dict(call_indels(['chr1'], self.bam, self.fasta, num_of_processes=2))
+        self.assertEqual(
+            calls['chr1'].df.values.tolist(), [['chr1', self.pos, self.del_seq, '-']]
+        )
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_workers_stopped_early(self):
+        calls = call_indels(['chr1'] * 4, self.bam, self.fasta, num_of_processes=2)
+        chr, first = next(calls)
+        self.assertTrue(multiprocessing.active_children())
+        calls.close()
+        self.assertEqual(multiprocessing.active_children(), [])
+
+if __name__ == '__main__':
+    from unittest import main
+    main()
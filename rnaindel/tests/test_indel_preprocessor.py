@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import parse_bambino_output
+except:
+    from ..rnaindel_lib import parse_bambino_output
+
+
+class TestParseBambinoOutput(TestCase):
+
+    def setUp(self):
+        header = ['NormalSample', 'TumorSample', 'Name', 'Chr', 'Pos', 'Type', 'Size',
+                  'Chr_Allele', 'Alternative_Allele']
+        calls = [
+            ['', 't.bam', 'chr1.100', 'chr1', '100', 'SNP', '1', 'T', 'C'],
+            ['', 't.bam', 'chr1.200', 'chr1', '200', 'deletion', '2', 'AG', ''],
+            ['', 't.bam', 'chrM.300', 'chrM', '300', 'insertion', '1', '', 'T'],
+            ['', 't.bam', 'chr1_gl000191_random.5', 'chr1_gl000191_random', '5', 'deletion', '1', 'C', ''],
+            ['', 't.bam', 'chrX.400', 'chrX', '400', 'insertion', '3', '', 'GGA'],
+        ]
+        self.lines = ['\t'.join(lst) + '\n' for lst in [header] + calls]
+
+    def test_parse_bambino_output(self):
+        res = parse_bambino_output(iter(self.lines), chunk_size=1)
+        self.assertEqual((res.num_of_calls, res.num_of_indels), (5, 2))
+        self.assertEqual(
+            res.df.values.tolist(), [['chr1', 200, 'AG', '-'], ['chrX', 400, '-', 'GGA']]
+        )
+
+    def test_header_only(self):
+        res = parse_bambino_output(iter(self.lines[:1]))
+        self.assertEqual((res.num_of_calls, len(res.df)), (0, 0))
+
+if __name__ == '__main__':
+    from unittest import main
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import pysam
+import shutil
+import tempfile
+import multiprocessing
+from functools import partial
+from unittest import TestCase, mock
+
+try:
+    from rnaindel.rnaindel_lib import (
+        open_locus_budget, close_locus_budget, check_budget, budgeted,
+        budgeted_rows, budgeted_call, is_over_budget, over_budget_count,
+        clear_over_budget, LocusBudgetExceeded, write_synthetic_pileup, sam_features,
+        open_metrics, close_metrics
+    )
+except:
+    from ..rnaindel_lib import (
+        open_locus_budget, close_locus_budget, check_budget, budgeted,
+        budgeted_rows, budgeted_call, is_over_budget, over_budget_count,
+        clear_over_budget, LocusBudgetExceeded, write_synthetic_pileup, sam_features,
+        open_metrics, close_metrics
+    )
+
+
+def spin(row):
+    while True:
+        check_budget()
+
+
+def quick(row):
+    check_budget()
+    return 'done'
+
+
+class TestLocusBudget(TestCase):
+
+    def tearDown(self):
+        close_locus_budget()
+
+    def test_no_budget(self):
+        self.assertIs(budgeted_rows('features', quick, None), quick)
+        with budgeted():
+            check_budget()
+        self.assertIsNone(over_budget_count())
+        self.assertEqual(is_over_budget({'chr': 'chr1', 'pos': 1, 'ref': 'A', 'alt': '-'}), 0)
+
+    def test_fallback(self):
+        open_locus_budget(0.05)
+        slow_row = {'chr': 'chr1', 'pos': 100, 'ref': '-', 'alt': 'T'}
+        quick_row = {'chr': 'chr1', 'pos': 200, 'ref': 'A', 'alt': '-'}
+
+        run = budgeted_rows('features', spin, lambda row: 'fallback')
+        self.assertEqual(run(slow_row), 'fallback')
+        self.assertEqual(budgeted_rows('features', quick, None)(quick_row), 'done')
+
+        self.assertEqual(is_over_budget(slow_row), 1)
+        self.assertEqual(is_over_budget(quick_row), 0)
+        self.assertEqual(over_budget_count(), 1)
+
+        # the budget is per candidate
+        self.assertEqual(run(slow_row), 'fallback')
+        self.assertEqual(over_budget_count(), 1)
+
+        # flagged in one analysis only
+        clear_over_budget()
+        self.assertEqual(is_over_budget(slow_row), 0)
+        self.assertEqual(over_budget_count(), 0)
+
+    def test_pool_workers(self):
+        open_locus_budget(0.001)
+        pool = multiprocessing.get_context('fork').Pool(2)
+        try:
+            with budgeted():
+                time.sleep(0.01)
+                func = budgeted_call(quick)
+                self.assertRaises(LocusBudgetExceeded, pool.map, func, range(4))
+            # no deadline outside of a candidate
+            self.assertEqual(pool.map(budgeted_call(quick), range(4)), ['done'] * 4)
+        finally:
+            pool.close()
+            pool.join()
+
+
+class TestBudgetInFeatures(TestCase):
+
+    def setUp(self):
+        # 200 reads, every other one with a 2-nt deletion
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fasta, bam, pos, del_seq = write_synthetic_pileup(self.tmp_dir)
+        self.bam_data = pysam.AlignmentFile(bam)
+
+        self.row = {
+            'chr': 'chr1', 'pos': pos, 'ref': del_seq, 'alt': '-',
+            'is_ins': 0, 'indel_seq': del_seq
+        }
+
+    def tearDown(self):
+        close_locus_budget()
+        close_metrics()
+        self.bam_data.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def budgeted_features(self, row):
+        sam = partial(
+            sam_features, fasta=self.fasta, bam_data=self.bam_data, mapq=60,
+            chr_prefixed=True
+        )
+        return budgeted_rows('features', sam, partial(sam, over_budget=True))(row)
+
+    def test_budget_spent_after_pileup(self):
+        module = sys.modules[sam_features.__module__]
+        curate_indel_in_pileup = module.curate_indel_in_pileup
+
+        def slow_pileup(*args):
+            pileup = curate_indel_in_pileup(*args)
+            time.sleep(0.1)
+            return pileup
+
+        open_locus_budget(0.05)
+        with mock.patch.object(module, 'curate_indel_in_pileup', slow_pileup):
+            features = self.budgeted_features(self.row)
+
+        # the local sequence features ran out of the budget
+        self.assertEqual(is_over_budget(self.row), 1)
+        self.assertEqual(over_budget_count(), 1)
+        self.assertEqual(features.indel_complexity, 0)
+        self.assertEqual((features.ref_count, features.alt_count), (100, 100))
+
+    def test_fallback_bounded(self):
+        module = sys.modules[sam_features.__module__]
+        # a deeper pileup than the fallback scans
+        self.bam_data.close()
+        fasta, bam, pos, del_seq = write_synthetic_pileup(self.tmp_dir, 2000)
+        self.bam_data = pysam.AlignmentFile(bam)
+
+        # spent in the first pileup
+        open_locus_budget(1e-6)
+        metrics = open_metrics()
+        with mock.patch.object(module, 'FALLBACK_READS', 500):
+            features = self.budgeted_features(self.row)
+
+        self.assertEqual(is_over_budget(self.row), 1)
+        # only the fallback scan is counted (the first one stopped at the deadline)
+        self.assertEqual(metrics.counts()['reads_scanned'], 500)
+        self.assertEqual(features.ref_count + features.alt_count, 500)
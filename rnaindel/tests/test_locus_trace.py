@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import pysam
+import shutil
+import tempfile
+import pandas as pd
+from functools import partial
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import (
+        open_locus_trace, close_locus_trace, traced_rows, write_locus_trace,
+        write_synthetic_pileup, extract_all_valid_reads, process_pool, sam_features
+    )
+    from rnaindel.rnaindel_lib.indel_rescuer import rescue_by_equivalence
+except:
+    from ..rnaindel_lib import (
+        open_locus_trace, close_locus_trace, traced_rows, write_locus_trace,
+        write_synthetic_pileup, extract_all_valid_reads, process_pool, sam_features
+    )
+    from ..rnaindel_lib.indel_rescuer import rescue_by_equivalence
+
+
+class TestLocusTrace(TestCase):
+
+    def setUp(self):
+        # 200 reads, every other one with a 2-nt deletion
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fasta, self.bam, pos, del_seq = write_synthetic_pileup(self.tmp_dir)
+        self.bam_data = pysam.AlignmentFile(self.bam)
+        self.row = pd.Series({
+            'chr': 'chr1', 'pos': pos, 'ref': del_seq, 'alt': '-',
+            'is_ins': 0, 'indel_seq': del_seq
+        })
+
+    def tearDown(self):
+        close_locus_trace()
+        self.bam_data.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def features(self, row):
+        return sam_features(row, self.fasta, self.bam_data, 60, True)
+
+    def test_features_traced(self):
+        trace = open_locus_trace()
+        features = traced_rows('features', self.features)(self.row)
+
+        record = trace.slowest(1)[0]
+        self.assertEqual(record['locus'], 'chr1:201:CA:-')
+        self.assertEqual(record['reads_fetched'], 200)
+        self.assertGreater(record['edit_distances'], 0)
+        self.assertGreater(record['pileup_s'], 0)
+        self.assertGreater(record['complexity_s'], 0)
+        # nested stages are not added to the total
+        self.assertEqual(record['total_s'], record['features_s'])
+        self.assertEqual((features.ref_count, features.alt_count), (100, 100))
+
+    def test_counts_from_workers(self):
+        trace = open_locus_trace()
+        pool = process_pool(2)
+        try:
+            rescue = partial(
+                rescue_by_equivalence, fasta=self.fasta, bam=self.bam,
+                search_window=4, pool=pool, left_aligned=False, chr_prefixed=True
+            )
+            equivalents = traced_rows('rescue', rescue)(self.row)
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(len(equivalents), 2)
+
+        # searched at pos, pos + 1 (right) and pos, pos - 1 (left)
+        pos = self.row['pos']
+        reads = sum(
+            len(extract_all_valid_reads(self.bam_data, 'chr1', i - 1, True))
+            for i in (pos, pos + 1, pos, pos - 1)
+        )
+        self.assertEqual(trace.slowest(1)[0]['reads_fetched'], reads)
+
+    def test_slowest_written(self):
+        trace = open_locus_trace()
+        for pos in (200, 201, 202):
+            row = self.row.copy()
+            row['pos'] = pos
+            traced_rows('features', self.features)(row)
+        trace.loci['chr1:200:CA:-']['total'] = 10.0
+
+        path = os.path.join(self.tmp_dir, 'trace.json')
+        write_locus_trace(path, 2)
+        with open(path) as f:
+            report = json.load(f)
+        self.assertEqual(report['num_of_loci'], 3)
+        self.assertEqual(len(report['loci']), 2)
+        self.assertEqual(report['loci'][0]['locus'], 'chr1:200:CA:-')
+
+        path = os.path.join(self.tmp_dir, 'trace.tsv')
+        write_locus_trace(path, 5)
+        df = pd.read_csv(path, sep='\t')
+        self.assertEqual(len(df), 3)
+        self.assertEqual(df['locus'][0], 'chr1:200:CA:-')
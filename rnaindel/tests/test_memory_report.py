@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import pysam
+import shutil
+import tempfile
+import subprocess
+from unittest import TestCase, skipUnless
+
+try:
+    from rnaindel.rnaindel_lib import (
+        open_memory_report, close_memory_report, memory_traced, write_memory_report,
+        write_synthetic_pileup, extract_all_valid_reads
+    )
+except:
+    from ..rnaindel_lib import (
+        open_memory_report, close_memory_report, memory_traced, write_memory_report,
+        write_synthetic_pileup, extract_all_valid_reads
+    )
+
+
+class TestMemoryReport(TestCase):
+
+    def setUp(self):
+        # 200 reads, every other one with a 2-nt deletion
+        self.tmp_dir = tempfile.mkdtemp()
+        fasta, bam, self.pos, del_seq = write_synthetic_pileup(self.tmp_dir)
+        self.bam_data = pysam.AlignmentFile(bam)
+
+    def tearDown(self):
+        close_memory_report()
+        self.bam_data.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_allocation_sites(self):
+        open_memory_report()
+        reads = memory_traced(
+            'pileup',
+            lambda: extract_all_valid_reads(self.bam_data, 'chr1', self.pos - 1, True),
+        )
+        memory_traced('empty', lambda: None)
+
+        path = os.path.join(self.tmp_dir, 'memory.json')
+        write_memory_report(path, completed=False)
+        with open(path) as f:
+            summary = json.load(f)
+
+        self.assertFalse(summary['completed'])
+        self.assertEqual([s['stage'] for s in summary['stages']], ['pileup', 'empty'])
+        pileup = summary['stages'][0]
+        self.assertGreater(pileup['traced_peak_mb'], 0)
+        self.assertTrue(
+            any('indel_curator.py' in allocation['site']
+                for allocation in pileup['top_allocations'])
+        )
+        self.assertEqual(len(reads), 200)
+
+    @skipUnless(os.path.isdir('/proc'), 'RSS of child processes sampled from /proc')
+    def test_child_rss(self):
+        report = open_memory_report()
+        memory_traced(
+            'child', lambda: subprocess.check_call(['sleep', '0.5'])
+        )
+
+        stage = report.stages[0]
+        self.assertGreater(stage['peak_children_rss_mb'], 0)
+        self.assertIn('sleep', stage['peak_children_rss_by_command_mb'])
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import (
+        benchmark_inputs, run_benchmarks, compare_with_baseline,
+        append_history, load_benchmark_run
+    )
+except:
+    from ..rnaindel_lib import (
+        benchmark_inputs, run_benchmarks, compare_with_baseline,
+        append_history, load_benchmark_run
+    )
+
+
+class TestMicroBenchmark(TestCase):
+
+    def test_reproducible_inputs(self):
+        kernel, inputs = benchmark_inputs('editdistance')
+        self.assertEqual(inputs, benchmark_inputs('editdistance')[1])
+
+        kernel, inputs = benchmark_inputs('decompose_indel_read')
+        self.assertEqual(len(inputs), 50)
+        self.assertTrue(all(len(kernel(*args)[1]) == 2 for args in inputs))
+
+        kernel, inputs = benchmark_inputs('indel_equivalence')
+        self.assertTrue(all(kernel(*args) for args in inputs))
+
+    def test_run_and_baseline(self):
+        run = run_benchmarks(['repeat', 'most_common'], repeats=1, min_time=0.001)
+        self.assertEqual(list(run['results']), ['repeat', 'most_common'])
+        self.assertGreater(run['results']['repeat']['best_us'], 0)
+
+        self.assertRaises(ValueError, run_benchmarks, ['unknown'])
+
+        baseline = {'results': {'repeat': {'best_us': run['results']['repeat']['best_us'] / 2}}}
+        changes = compare_with_baseline(run, baseline, 0.2)
+        self.assertEqual(list(changes), ['repeat'])
+        self.assertAlmostEqual(changes['repeat'][0], 1.0, places=2)
+        self.assertTrue(changes['repeat'][1])
+
+    def test_history(self):
+        path = os.path.join(tempfile.mkdtemp(), 'history.json')
+        append_history(path, {'results': {'repeat': {'best_us': 1.0}}})
+        append_history(path, {'results': {'repeat': {'best_us': 2.0}}})
+
+        self.assertEqual(load_benchmark_run(path)['results']['repeat']['best_us'], 2.0)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import os
+import pstats
+import shutil
+import tempfile
+from functools import partial
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import (
+        open_process_profile, close_process_profile, process_pool,
+        write_synthetic_pileup
+    )
+    from rnaindel.rnaindel_lib.indel_rescuer import extract_indel
+except:
+    from ..rnaindel_lib import (
+        open_process_profile, close_process_profile, process_pool,
+        write_synthetic_pileup
+    )
+    from ..rnaindel_lib.indel_rescuer import extract_indel
+
+
+class TestProcessProfile(TestCase):
+
+    def setUp(self):
+        # 200 reads, every other one with a 2-nt deletion
+        self.tmp_dir = tempfile.mkdtemp()
+        fasta, bam, self.pos, del_seq = write_synthetic_pileup(self.tmp_dir)
+        self.rescue = partial(
+            extract_indel, fasta=fasta, bam=bam, chr='chr1', idl_type=0,
+            chr_prefixed=True
+        )
+        self.out_dir = os.path.join(self.tmp_dir, 'cprofile')
+        os.mkdir(self.out_dir)
+
+    def tearDown(self):
+        close_process_profile()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_workers_merged(self):
+        # stats left by an earlier run are not merged
+        open(os.path.join(self.out_dir, 'worker.1.pstats'), 'w').close()
+
+        open_process_profile(self.out_dir)
+        pool = process_pool(2)
+        found = pool.map(self.rescue, [self.pos - 1, self.pos, self.pos + 1])
+        pool.close()
+        pool.join()
+        close_process_profile()
+        self.assertEqual(sum(idl is not None for idl in found), 1)
+
+        files = os.listdir(self.out_dir)
+        self.assertEqual(len([f for f in files if f.startswith('worker.')]), 2)
+        self.assertEqual(len([f for f in files if f.startswith('main.')]), 1)
+        self.assertIn('combined.txt', files)
+
+        stats = pstats.Stats(os.path.join(self.out_dir, 'combined.pstats'))
+        functions = [func[2] for func in stats.stats]
+        self.assertIn('get_most_common_indel_seq', functions)
+        self.assertIn('iter_valid_reads', functions)
+        self.assertIn('process_pool', functions)
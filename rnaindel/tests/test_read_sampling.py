@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import pysam
+import shutil
+import tempfile
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import (
+        write_synthetic_pileup, extract_all_valid_reads, sample_valid_reads,
+        curate_indel_in_pileup, get_most_common_indel_seq
+    )
+except:
+    from ..rnaindel_lib import (
+        write_synthetic_pileup, extract_all_valid_reads, sample_valid_reads,
+        curate_indel_in_pileup, get_most_common_indel_seq
+    )
+
+
+class TestReadSampling(TestCase):
+
+    def setUp(self):
+        # 200 reads, every other one with a 2-nt deletion at 200 (0-based)
+        self.tmp_dir = tempfile.mkdtemp()
+        fasta, bam, pos, self.del_seq = write_synthetic_pileup(self.tmp_dir)
+        self.pos = pos - 1
+        self.bam_data = pysam.AlignmentFile(bam)
+
+    def tearDown(self):
+        self.bam_data.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_sample_valid_reads(self):
+        all_reads = extract_all_valid_reads(self.bam_data, 'chr1', self.pos, True)
+
+        sampled, names = sample_valid_reads(self.bam_data, 'chr1', self.pos, True, 10)
+        self.assertEqual(names, set(read.query_name for read in all_reads))
+        self.assertEqual(sum('D' not in read.cigarstring for read in sampled), 10)
+        self.assertEqual(sum('D' in read.cigarstring for read in sampled), 100)
+
+        # seeded by the locus
+        again, names = sample_valid_reads(self.bam_data, 'chr1', self.pos, True, 10)
+        self.assertEqual(
+            [read.query_name for read in sampled], [read.query_name for read in again]
+        )
+
+        # nothing left out below the cap
+        sampled, names = sample_valid_reads(self.bam_data, 'chr1', self.pos, True, 1000)
+        self.assertEqual(
+            [read.query_name for read in sampled], [read.query_name for read in all_reads]
+        )
+
+    def test_counts_with_cap(self):
+        uncapped = curate_indel_in_pileup(
+            self.bam_data, 'chr1', self.pos + 1, 0, self.del_seq, 60, True
+        )
+        capped = curate_indel_in_pileup(
+            self.bam_data, 'chr1', self.pos + 1, 0, self.del_seq, 60, True, max_depth=5
+        )
+        self.assertEqual((uncapped.ref_count, uncapped.alt_count), (100, 100))
+        self.assertEqual((capped.ref_count, capped.alt_count), (100, 100))
+        self.assertEqual(len(capped.non_idl_flanks), 5)
+
+    def test_rescue_streamed(self):
+        # 1-based position of the deletion
+        self.assertEqual(
+            get_most_common_indel_seq(self.bam_data, 'chr1', self.pos + 1, 0, True),
+            self.del_seq,
+        )
+        self.assertIsNone(
+            get_most_common_indel_seq(self.bam_data, 'chr1', self.pos + 1, 1, True)
+        )
+        # unknown contig
+        self.assertIsNone(
+            get_most_common_indel_seq(self.bam_data, 'chr2', self.pos + 1, 0, True)
+        )
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import pysam
+import tempfile
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import (
+        generate_synthetic_data, load_synthetic_data, scaling_results,
+        write_scaling_report
+    )
+except:
+    from ..rnaindel_lib import (
+        generate_synthetic_data, load_synthetic_data, scaling_results,
+        write_scaling_report
+    )
+
+
+class TestScalingBenchmark(TestCase):
+
+    def test_synthetic_data(self):
+        out_dir = tempfile.mkdtemp()
+        manifest = generate_synthetic_data(out_dir, 7, depth=10, num_of_chromosomes=2, seed=3)
+        self.assertEqual(manifest['num_of_candidates'], 7)
+
+        synthetic = load_synthetic_data(out_dir)
+        with open(synthetic['vcf']) as f:
+            planted = [line.split('\t') for line in f if not line.startswith('#')]
+        self.assertEqual(len(planted), 7)
+
+        # sorted, indexed, spliced and carrying the planted indels
+        bam = pysam.AlignmentFile(synthetic['bam'])
+        reads = list(bam.fetch())
+        self.assertEqual(len(reads), manifest['num_of_reads'])
+        self.assertEqual(
+            [(r.reference_id, r.reference_start) for r in reads],
+            sorted((r.reference_id, r.reference_start) for r in reads),
+        )
+        self.assertTrue(any('N' in r.cigarstring for r in reads))
+        self.assertTrue(any('D' in r.cigarstring for r in reads))
+        self.assertTrue(any('I' in r.cigarstring for r in reads))
+
+        fasta = pysam.FastaFile(synthetic['fasta'])
+        chr, pos, id, ref = planted[0][:4]
+        self.assertEqual(fasta.fetch(chr, int(pos) - 1, int(pos) - 1 + len(ref)), ref)
+
+        self.assertRaises(ValueError, load_synthetic_data, tempfile.mkdtemp())
+
+    def test_scaling_results(self):
+        tmp_dir = tempfile.mkdtemp()
+        vcfs = []
+        for i, record in enumerate(['chr1\t10\t.\tA\tAT\n', 'chr1\t10\t.\tA\tAT\n', 'chr1\t10\t.\tA\tAG\n']):
+            vcfs.append(os.path.join(tmp_dir, '{}.vcf'.format(i)))
+            with open(vcfs[-1], 'w') as f:
+                f.write('##source=run{}\n#CHROM\n'.format(i) + record)
+
+        def profile(wall):
+            return {'wall_s': wall, 'cpu_s': wall, 'peak_rss_mb': 100.0, 'peak_child_rss_mb': 50.0}
+
+        results = scaling_results(
+            [(4, profile(2.5), vcfs[2]), (1, profile(8.0), vcfs[0]), (2, profile(5.0), vcfs[1])], 100
+        )
+        self.assertEqual([r['processes'] for r in results], [1, 2, 4])
+        self.assertEqual([r['speedup'] for r in results], [1.0, 1.6, 3.2])
+        self.assertEqual([r['parallel_efficiency'] for r in results], [1.0, 0.8, 0.8])
+        self.assertEqual(results[0]['candidates_per_s'], 12.5)
+        self.assertEqual([r['indels_out'] for r in results], [1, 1, 1])
+        self.assertEqual([r['identical_output'] for r in results], [True, True, False])
+
+        synthetic = {'seed': 1, 'num_of_candidates': 100, 'depth': 20,
+                     'num_of_chromosomes': 8, 'num_of_reads': 1000}
+        path = os.path.join(tmp_dir, 'scaling.json')
+        write_scaling_report(path, synthetic, results)
+        with open(path) as f:
+            self.assertEqual(json.load(f)['runs'][2]['speedup'], 3.2)
+
+        path = os.path.join(tmp_dir, 'scaling.tsv')
+        write_scaling_report(path, synthetic, results)
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 4)
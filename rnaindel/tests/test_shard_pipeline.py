@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel_lib import in_analysis_order, chromosome_rank
+except:
+    from ..rnaindel_lib import in_analysis_order, chromosome_rank
+
+
+class TestShardPipeline(TestCase):
+
+    def test_chromosome_rank(self):
+        chrs = ['chrX', 'chr10', 'chrM', 'chr2', 'chrY', 'chr1', 'chr1_random']
+        self.assertEqual(
+            sorted(chrs, key=chromosome_rank),
+            ['chr1', 'chr2', 'chr10', 'chrX', 'chrY', 'chr1_random', 'chrM'],
+        )
+        self.assertEqual(sorted(['X', '11', '3'], key=chromosome_rank), ['3', '11', 'X'])
+
+    def test_in_analysis_order(self):
+        chrs = ['chr1', 'chr10', 'chr2', 'chrX']
+        calls = [('chrX', 'x'), ('chr2', 'b'), ('chr10', 'j'), ('chr1', 'a')]
+        self.assertEqual(
+            list(in_analysis_order(chrs, calls)),
+            [('chr1', 'a'), ('chr2', 'b'), ('chr10', 'j'), ('chrX', 'x')],
+        )
+
+    def test_yields_as_preceding_shards_complete(self):
+        chrs = ['chr1', 'chr2', 'chr3']
+        received = []
+
+        def calls():
+            for chr in ['chr1', 'chr3', 'chr2']:
+                received.append(chr)
+                yield chr, chr
+
+        for chr, result in in_analysis_order(chrs, calls()):
+            if chr == 'chr1':
+                # chr1 is analyzed before the other shards are received
+                self.assertEqual(received, ['chr1'])
+
+        self.assertEqual(received, ['chr1', 'chr3', 'chr2'])
+
+    def test_whole_bam(self):
+        self.assertEqual(list(in_analysis_order([None], [(None, 'all')])), [(None, 'all')])
+
+if __name__ == '__main__':
+    from unittest import main
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import pysam
+import shutil
+import argparse
+import tempfile
+import pandas as pd
+from unittest import TestCase
+
+try:
+    from rnaindel.rnaindel import reports_written
+    from rnaindel.rnaindel_lib import (
+        open_stage_profile, close_stage_profile, profiled, write_stage_profile,
+        write_synthetic_pileup, sam_features
+    )
+except:
+    from ..rnaindel import reports_written
+    from ..rnaindel_lib import (
+        open_stage_profile, close_stage_profile, profiled, write_stage_profile,
+        write_synthetic_pileup, sam_features
+    )
+
+
+class TestStageProfile(TestCase):
+
+    def setUp(self):
+        # 200 reads, every other one with a 2-nt deletion
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fasta, bam, pos, del_seq = write_synthetic_pileup(self.tmp_dir)
+        self.bam_data = pysam.AlignmentFile(bam)
+        self.df = pd.DataFrame({
+            'chr': 'chr1', 'pos': [pos - 1, pos, pos + 1], 'is_ins': 0,
+            'indel_seq': del_seq
+        })
+
+    def tearDown(self):
+        close_stage_profile()
+        self.bam_data.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def features(self):
+        return self.df.assign(
+            sam=self.df.apply(
+                sam_features, fasta=self.fasta, bam_data=self.bam_data, mapq=60,
+                chr_prefixed=True, axis=1
+            )
+        )
+
+    def args(self, **reports):
+        args = argparse.Namespace(
+            profile_report=None, metrics=None, locus_trace=None, locus_trace_top=None,
+            cprofile=None, memory_report=None, process_num=1,
+        )
+        for name, path in reports.items():
+            setattr(args, name, os.path.join(self.tmp_dir, path))
+        return args
+
+    def test_json(self):
+        open_stage_profile(2)
+        profiled('features', len(self.df), self.features)
+        profiled('rescue', None, lambda: (self.df.head(1), self.df))
+
+        path = os.path.join(self.tmp_dir, 'report.json')
+        write_stage_profile(path, completed=False)
+        with open(path) as f:
+            report = json.load(f)
+
+        self.assertEqual(report['num_of_processes'], 2)
+        self.assertFalse(report['completed'])
+        self.assertEqual(
+            [s['stage'] for s in report['stages']], ['features', 'rescue']
+        )
+        self.assertEqual(report['stages'][0]['rows_in'], 3)
+        self.assertEqual(report['stages'][0]['rows_out'], 3)
+        self.assertEqual(report['stages'][1]['rows_in'], None)
+        self.assertEqual(report['stages'][1]['rows_out'], 1)
+
+    def test_tsv(self):
+        open_stage_profile(1)
+        profiled('features', len(self.df), self.features)
+
+        path = os.path.join(self.tmp_dir, 'report.tsv')
+        write_stage_profile(path)
+        df = pd.read_csv(path, sep='\t', comment='#')
+
+        self.assertEqual(list(df['stage']), ['features', 'total'])
+        self.assertEqual(df['rows_out'][0], 3)
+
+    def test_nothing_written_when_off(self):
+        files = sorted(os.listdir(self.tmp_dir))
+        with reports_written(self.args()):
+            features = profiled('features', len(self.df), self.features)
+
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), files)
+        self.assertEqual(features['sam'][1].alt_count, 100)
+
+    def test_written_on_early_exit(self):
+        args = self.args(profile_report='report.json', metrics='metrics.json')
+        with self.assertRaises(SystemExit):
+            with reports_written(args):
+                profiled('features', len(self.df), self.features)
+                # no indels left to analyze
+                sys.exit(0)
+
+        with open(args.profile_report) as f:
+            report = json.load(f)
+        self.assertFalse(report['completed'])
+        self.assertEqual([s['stage'] for s in report['stages']], ['features'])
+        with open(args.metrics) as f:
+            self.assertEqual(json.load(f)['bam_fetches'], 3)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import subprocess
+from unittest import TestCase
+
+package_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_python(*args):
+    return subprocess.run(
+        [sys.executable] + list(args),
+        cwd=package_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+
+class TestStartup(TestCase):
+
+    def test_no_heavy_imports(self):
+        out = run_python(
+            '-c',
+            'import sys, json, rnaindel.rnaindel; '
+            'print(json.dumps([m for m in ("pandas", "numpy", "pysam", "sklearn") if m in sys.modules]))',
+        )
+        self.assertEqual(json.loads(out.stdout), [])
+
+    def test_names_on_first_access(self):
+        out = run_python(
+            '-c',
+            'import rnaindel.rnaindel_lib as rl; print(rl.indel_classifier.__module__)',
+        )
+        self.assertEqual(out.stdout.strip(), 'rnaindel.rnaindel_lib.indel_classifier')
+
+    def test_submodule_imported_first(self):
+        out = run_python(
+            '-c',
+            'import rnaindel.rnaindel_lib.indel_classifier; import rnaindel.rnaindel_lib as rl; '
+            'print(type(rl.indel_classifier).__name__, type(rl.indel_curator).__name__)',
+        )
+        self.assertEqual(out.stdout.split(), ['function', 'module'])